@@ -1,4 +1,3 @@
-import chromadb
 import openai
 from dotenv import load_dotenv
 import logging
@@ -6,6 +5,10 @@ from icecream import ic
 import os
 import sys
 import streamlit as st
+from retrieval import retrieve_from_collections, collect_documents, collect_ids, embed_query
+from response_cache import get_response_cache
+from resources import DEFAULT_COLLECTIONS, get_collections, warmup
+from chat_service import ChatServiceBusy, ChatServiceError, get_chat_service
 
 # Print current working directory for debugging
 print("Current working directory:", os.getcwd())
@@ -44,56 +47,43 @@ if not openai_api_key:
     logging.error("OpenAI API key is missing! Check your .env file.")
     raise ValueError("OpenAI API key not found.")
 
-# Since this file is in the src folder, adjust paths to point to the project root
-news_client = chromadb.PersistentClient(path="../chromadb")
-municipalities_client = chromadb.PersistentClient(path="../chromadb/chromadb_municipalities")
-landmarks_client = chromadb.PersistentClient(path="../chromadb/chromadb_landmarks")
-
-# Function to load collections
-def load_chromadb_collection(client, collection_name):
-    try:
-        collection = client.get_collection(collection_name)
-        print(f"Successfully loaded collection: {collection_name}")
-        return collection
-    except Exception as e:
-        print(f"Error loading collection {collection_name}: {e}")
-        return None
+# Every collection lives in the single store (resources.STORE_PATH); the client
+# and collections are opened once per process and shared across reruns
+COLLECTION_SPECS = DEFAULT_COLLECTIONS
 
 # Load collections
-news_collection = load_chromadb_collection(news_client, "news_articles")
-municipalities_collection = load_chromadb_collection(municipalities_client, "municipalities")
-landmarks_collection = load_chromadb_collection(landmarks_client, "landmarks")
+warmup(COLLECTION_SPECS)
+collections = get_collections(COLLECTION_SPECS)
+news_collection = collections["news_articles"]
+municipalities_collection = collections["municipalities"]
+landmarks_collection = collections["landmarks"]
 
 # Set OpenAI API Key
 openai.api_key = openai_api_key
 
+# Cache of model replies for near-identical questions over the same context
+response_cache = get_response_cache()
+LLM_PARAMS = {"model": "o3-mini-2025-01-31"}
+# Shared async completion service: bounded concurrency and retries on 429s
+chat_service = get_chat_service(api_key=openai_api_key)
+
 # Function to perform retrieval from the collections (RAG)
-def retrieve_relevant_info(query, collection):
-    # Query the collection with the user's question to get relevant documents
-    results = collection.query(query_texts=[query], n_results=3)  # Adjust n_results as needed
-    return results
+def retrieve_relevant_info(query, query_embedding=None):
+    # Embed the query once and query all collections in parallel
+    return retrieve_from_collections(query, {
+        "municipalities": municipalities_collection,
+        "landmarks": landmarks_collection,
+        "news_articles": news_collection,
+    }, query_embedding=query_embedding)
 
 def chat_with_llm(user_input):
-    context = []
-
-    # Retrieve relevant info from each collection
-    if municipalities_collection:
-        municipalities_info = retrieve_relevant_info(user_input, municipalities_collection)
-        context.append(municipalities_info)
-    
-    if landmarks_collection:
-        landmarks_info = retrieve_relevant_info(user_input, landmarks_collection)
-        context.append(landmarks_info)
-    
-    if news_collection:
-        news_info = retrieve_relevant_info(user_input, news_collection)
-        context.append(news_info)
+    # Retrieve relevant info from every collection
+    query_embedding = embed_query(user_input)
+    results = retrieve_relevant_info(user_input, query_embedding)
+    context_ids = collect_ids(results)
 
     # Extract text from results while filtering out None values
-    combined_context = "\n".join(
-        str(doc) for docs in context if docs and "documents" in docs 
-        for doc in docs["documents"][0] if doc is not None
-    )
+    combined_context = "\n".join(collect_documents(results))
 
     # Build a new prompt that enforces the constraint:
     prompt = (
@@ -104,9 +94,12 @@ def chat_with_llm(user_input):
         "'I do not have enough information to answer this question.'"
     )
 
+    cached_reply = response_cache.get(query_embedding, context_ids, LLM_PARAMS)
+    if cached_reply is not None:
+        return cached_reply
+
     try:
-        response = openai.chat.completions.create(
-            model="o3-mini-2025-01-31",
+        model_reply = chat_service.complete(
             messages=[
                 {
                     "role": "system", 
@@ -117,12 +110,15 @@ def chat_with_llm(user_input):
                     )
                 },
                 {"role": "user", "content": prompt}
-            ]
+            ],
+            **LLM_PARAMS
         )
-        model_reply = response.choices[0].message.content
+        response_cache.put(query_embedding, context_ids, LLM_PARAMS, model_reply, query=user_input)
         return model_reply
-    except Exception as e:
-        return f"Error: {e}"
+    except ChatServiceBusy:
+        return "The assistant is very busy right now. Please try again in a few seconds."
+    except ChatServiceError:
+        return "Sorry, I could not get an answer right now. Please try again."
 
 
 
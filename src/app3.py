@@ -1,28 +1,23 @@
-import json
+import os
 import streamlit as st
-import chromadb
 import openai
-from datetime import datetime
+from retrieval import retrieve_from_collections
+from context_budget import chunks_from_results
+from conversation_memory import ConversationMemory
+from resources import DEFAULT_COLLECTIONS, get_collections, warmup
+from chat_service import ChatServiceBusy, ChatServiceError, get_chat_service
+from chat_log import get_chat_log
 
-# Load ChromaDB clients
-news_client = chromadb.PersistentClient(path="./chromadb")
-municipalities_client = chromadb.PersistentClient(path="./chromadb_municipalities")
-landmarks_client = chromadb.PersistentClient(path="./chromadb_landmarks")
-
-# Function to load collections
-def load_chromadb_collection(client, collection_name):
-    try:
-        collection = client.get_collection(collection_name)
-        print(f"Successfully loaded collection: {collection_name}")
-        return collection
-    except Exception as e:
-        print(f"Error loading collection {collection_name}: {e}")
-        return None
+# Every collection lives in the single store (resources.STORE_PATH); the client
+# and collections are opened once per process and shared across reruns
+COLLECTION_SPECS = DEFAULT_COLLECTIONS
 
 # Load collections
-news_collection = load_chromadb_collection(news_client, "news_articles")
-municipalities_collection = load_chromadb_collection(municipalities_client, "municipalities")
-landmarks_collection = load_chromadb_collection(landmarks_client, "landmarks")
+warmup(COLLECTION_SPECS)
+collections = get_collections(COLLECTION_SPECS)
+news_collection = collections["news_articles"]
+municipalities_collection = collections["municipalities"]
+landmarks_collection = collections["landmarks"]
 
 # Read API key from file
 api_key_path = "API_Key.txt"
@@ -30,78 +25,71 @@ with open(api_key_path, "r") as file:
     OPENAI_API_KEY = file.read().strip()
 
 openai.api_key = OPENAI_API_KEY
+# Shared async completion service: bounded concurrency and retries on 429s
+chat_service = get_chat_service(api_key=OPENAI_API_KEY)
 
 # Function to retrieve information from collections
-def retrieve_relevant_info(query, collection):
-    results = collection.query(query_texts=[query], n_results=3)  # Adjust as needed
-    return results
+def retrieve_relevant_info(query):
+    # Embed the query once and query all collections in parallel
+    return retrieve_from_collections(query, {
+        "municipalities": municipalities_collection,
+        "landmarks": landmarks_collection,
+        "news_articles": news_collection,
+    })
+
+# Conversation memory: the last turns verbatim plus a running summary of older
+# ones, under a hard token ceiling per request. st.session_state.messages is
+# only used to redraw the chat.
+CHAT_MODEL = "gpt-3.5-turbo"
+SYSTEM_PROMPT = "You are a helpful assistant."
+MEMORY_KEEP_TURNS = int(os.getenv("MEMORY_KEEP_TURNS", "4"))
+MEMORY_TOKEN_CEILING = int(os.getenv("MEMORY_TOKEN_CEILING", "3000"))
+
+def new_memory():
+    return ConversationMemory(chat_service, SYSTEM_PROMPT, keep_turns=MEMORY_KEEP_TURNS,
+                              token_ceiling=MEMORY_TOKEN_CEILING, model=CHAT_MODEL)
 
 # Function to maintain conversation memory and log chat history
 def chat_with_llm(user_input):
-    context = []
-
-    # Retrieve relevant info from each collection
-    if municipalities_collection:
-        municipalities_info = retrieve_relevant_info(user_input, municipalities_collection)
-        context.append(municipalities_info)
-    
-    if landmarks_collection:
-        landmarks_info = retrieve_relevant_info(user_input, landmarks_collection)
-        context.append(landmarks_info)
-    
-    if news_collection:
-        news_info = retrieve_relevant_info(user_input, news_collection)
-        context.append(news_info)
-
-    # Extract text from results
-    combined_context = "\n".join(
-        str(doc) for docs in context if docs and "documents" in docs 
-        for doc in docs["documents"][0] if doc is not None
-    )
-
-    # Add previous conversation history
-    messages = st.session_state.messages.copy()
-    messages.append({"role": "user", "content": user_input})
-    
-    # Include retrieved context as assistant response before user input
-    if combined_context:
-        messages.append({"role": "assistant", "content": f"Relevant Information:\n{combined_context}"})
+    # Retrieve relevant info from every collection
+    results = retrieve_relevant_info(user_input)
+
+    # Summary, recent turns and this turn's context, trimmed to the token ceiling
+    memory = st.session_state.memory
+    messages, _ = memory.build_messages(user_input, chunks_from_results(results))
 
     # Call OpenAI API
     try:
-        response = openai.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=messages
-        )
-        model_reply = response.choices[0].message.content
-        
+        model_reply = chat_service.complete(messages, model=CHAT_MODEL)
+
         # Append to conversation history
         st.session_state.messages.append({"role": "user", "content": user_input})
         st.session_state.messages.append({"role": "assistant", "content": model_reply})
+        memory.add_turn(user_input, model_reply)
 
         # Log the conversation
         log_chat(user_input, model_reply)
 
         return model_reply
-    except Exception as e:
-        return f"Error: {e}"
+    except ChatServiceBusy:
+        return "The assistant is very busy right now. Please try again in a few seconds."
+    except ChatServiceError:
+        return "Sorry, I could not get an answer right now. Please try again."
+
+# Function to log chat history for analysis (written in batches by a background thread)
+chat_log = get_chat_log(path="chat_logs.jsonl")
 
-# Function to log chat history for analysis
 def log_chat(user_input, model_reply):
-    chat_data = {
-        "timestamp": datetime.now().isoformat(),
-        "user_input": user_input,
-        "model_reply": model_reply
-    }
-    with open("chat_logs.jsonl", "a", encoding="utf-8") as log_file:
-        log_file.write(json.dumps(chat_data) + "\n")
+    chat_log.log_chat(user_input, model_reply)
 
 # Streamlit UI for interaction
 st.title("Chat with ChatGPT using RAG system")
 
 # Initialize session state for chat history
 if "messages" not in st.session_state:
-    st.session_state.messages = [{"role": "system", "content": "You are a helpful assistant."}]
+    st.session_state.messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+if "memory" not in st.session_state:
+    st.session_state.memory = new_memory()
 
 # Display chat history
 for msg in st.session_state.messages:
@@ -1,18 +1,20 @@
-import chromadb
-import openai
 from dotenv import load_dotenv
 import logging
-from icecream import ic
 import os
 import sys
 import streamlit as st
-import datetime
 import json
-from chromadb import Client
-# from chromadb import PresistentClient
+from response_cache import get_response_cache
+from embeddings import get_query_embedder
+from chat_pipeline import ChatPipeline
+from chat_log import get_chat_log
+from query_planner import QueryPlanner
+from metrics import configure_tracing, register_gauges, register_probe, span, start_metrics_server, trace
+from resources import DEFAULT_COLLECTIONS, get_collections, get_lexical_indexes, health_check, warmup
+from startup import StartupNotReady, get_startup
 import streamlit.components.v1 as components
-
-ic.disable()
+# chromadb and openai take seconds to import; they are loaded by the warmup
+# thread (see section 3) so the page renders before they are ready.
 
 # -------------------------
 # 1. Logging Setup
@@ -42,144 +44,171 @@ if not openai_api_key:
     logger.error("OpenAI API key is missing! Check your .env file.")
     raise ValueError("OpenAI API key not found.")
 logger.info("OpenAI API key loaded successfully.")
-openai.api_key = openai_api_key
-openai.api_type = "openai"  # Set to "azure" if you are using Azure OpenAI
-logger.info("OpenAI configuration set. API type: openai.")
+
+# Every collection lives in the single store (resources.STORE_PATH)
+COLLECTION_SPECS = DEFAULT_COLLECTIONS
 
 # -------------------------
-# 3. Setup a Single ChromaDB Client and Load Collections
+# 3. Shared ChromaDB Client and Collections
 # -------------------------
-client = chromadb.PersistentClient(path="../chromadb")
-logger.info("ChromaDB client initialized.")
+# The client, collections and embedding model are opened once per process in
+# resources.py and reused by every rerun and every session. They load on the
+# background warmup thread; the first question waits for them if needed.
+# Hybrid retrieval fuses Chroma hits with an in-process BM25 index, which
+# catches exact place names ("Añasco", "El Yunque") that embeddings miss.
+HYBRID_RETRIEVAL = os.getenv("HYBRID_RETRIEVAL", "1") != "0"
+RETRIEVAL_N_RESULTS = int(os.getenv("RETRIEVAL_N_RESULTS", "3"))
+# Municipality names in the question become metadata filters on the place collections
+# that build_index.py indexed with those fields; older stores are searched unfiltered
+QUERY_PLANNER = os.getenv("QUERY_PLANNER", "1") != "0"
+startup = get_startup()
 
-def load_chromadb_collection(client, collection_name):
-    logger.info(f"Attempting to load collection: {collection_name}")
-    try:
-        collection = client.get_collection(collection_name)
-        logger.info(f"SUCCESS: loaded collection: {collection_name}")
-        return collection
-    except Exception as e:
-        logger.error(f"ERROR: loading collection {collection_name}: {e}")
-        return None
-
-municipalities_collection = load_chromadb_collection(client, "municipalities")
-news_collection = load_chromadb_collection(client, "news_articles")
-landmarks_collection = load_chromadb_collection(client, "landmarks")
-
-if municipalities_collection is None:
-    logger.error("ERROR: municipalities_collection failed to load.")
-else:
-    logger.info("SUCCESS: municipalities_collection loaded successfully.")
-
-if news_collection is None:
-    logger.error("ERROR: news_collection failed to load.")
-else:
-    logger.info("SUCCESS: news_collection loaded successfully.")
-
-if landmarks_collection is None:
-    logger.error("ERROR: landmarks_collection failed to load.")
-else:
-    logger.info("SUCCESS: landmarks_collection loaded successfully.")
-
-if news_collection:
-    docs = news_collection.get()
-    ic(f"Documents in collection 'news_articles':", docs)
+def load_collections():
+    warmup(COLLECTION_SPECS, lexical=HYBRID_RETRIEVAL)
+    collections = get_collections(COLLECTION_SPECS)
+    for name, collection in collections.items():
+        if collection is None:
+            logger.error(f"ERROR: {name} collection failed to load.")
+    lexical_indexes = get_lexical_indexes(COLLECTION_SPECS) if HYBRID_RETRIEVAL else {}
+    return collections, lexical_indexes
+
+def load_chat_service():
+    from chat_service import get_chat_service
+
+    # Completions go through one process-wide async service: bounded concurrency,
+    # a bounded wait queue and retries on 429s.
+    return get_chat_service(
+        max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "8")),
+        max_waiting=int(os.getenv("LLM_MAX_WAITING", "32")),
+        api_key=openai_api_key,
+    )
+
+startup.add("collections", load_collections)
+startup.add("chat_service", load_chat_service)
+startup.add("query_planner", lambda: QueryPlanner.from_data("../data") if QUERY_PLANNER else None)
 
 # -------------------------
-# 4. Retrieve Relevant Information from Collections
+# 4. Semantic Response Cache
 # -------------------------
-def retrieve_relevant_info(query, collection):
-    logger.info(f"Querying collection for query: {query}")
-    results = collection.query(query_texts=[query], n_results=3)
-    logger.info(f"Query results: {results}")
-    return results
+# LLM_PARAMS (model, temperature, max_tokens...) are defined in chat_pipeline.py.
+# Retrieved chunks are deduplicated and packed into this many prompt tokens.
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+response_cache = get_response_cache(
+    path="response_cache.sqlite3",
+    similarity_threshold=float(os.getenv("RESPONSE_CACHE_THRESHOLD", "0.95")),
+    ttl_seconds=int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", str(7 * 24 * 3600))),
+    max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "5000")),
+)
+
+# Transcripts are appended in batches by a background thread and rotated by size
+chat_log = get_chat_log(path="chat_logs.jsonl", max_bytes=int(os.getenv("CHAT_LOG_MAX_BYTES", str(10 * 1024 * 1024))))
+CHAT_LOG_TAIL = int(os.getenv("CHAT_LOG_TAIL", "20"))
+BUSY_REPLY = "The travel planner is very busy right now. Please try again in a few seconds."
+STARTING_REPLY = "The travel planner is still starting up. Please try again in a few seconds."
+FAILED_REPLY = "Sorry, I could not get an answer right now. Please try again."
+
+# Per-stage latency histograms are served at http://localhost:METRICS_PORT/metrics
+# (0 disables it); TRACE_SAMPLE_RATE of the chats are traced to traces.jsonl.
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+if METRICS_PORT:
+    start_metrics_server(METRICS_PORT)
+configure_tracing(float(os.getenv("TRACE_SAMPLE_RATE", "0.1")))
+def chat_service_stats():
+    return startup.wait("chat_service").stats() if startup.done("chat_service") else {}
+
+register_gauges("rag_llm", chat_service_stats)
+register_gauges("rag_response_cache", response_cache.stats)
+register_gauges("rag_query_embedder", lambda: get_query_embedder().stats() if startup.done("collections") else {})
+# /ready answers 503 until the warmup tasks are done; /healthz only checks the process is up
+register_probe("/ready", startup.status)
+register_probe("/healthz", lambda: {"status": "ok"})
 
 # -------------------------
 # 5. Chat Function with Retrieval-Augmented Generation (RAG)
 # -------------------------
+# Retrieval, context packing, the response cache and the completion call live
+# in chat_pipeline.py, which benchmark.py times as well.
 def log_chat(user_input, model_reply):
-    chat_data = {
-        "timestamp": datetime.datetime.now().isoformat(),
-        "user_input": user_input,
-        "model_reply": model_reply
-    }
-    try:
-        with open("chat_logs.jsonl", "a", encoding="utf-8") as log_file:
-            log_file.write(json.dumps(chat_data) + "\n")
-        logger.info("Chat logged: " + json.dumps(chat_data))
-    except Exception as e:
-        logger.error("Error writing to chat_logs.jsonl: " + str(e))
+    with span("log"):
+        chat_log.log_chat(user_input, model_reply)
+
+def chat_pipeline():
+    """The pipeline over the warmed-up collections; waits for them if needed."""
+    collections, lexical_indexes = startup.wait("collections")
+    return ChatPipeline(collections, lexical_indexes, startup.wait("query_planner"), RETRIEVAL_N_RESULTS,
+                        CONTEXT_TOKEN_BUDGET, response_cache)
 
 def chat_with_llm(user_input):
+    with trace("chat"):
+        return _chat_with_llm(user_input)
+
+def _chat_with_llm(user_input):
     logger.info(f"Processing user input: {user_input}")
-    context = []
-    
-    if municipalities_collection:
-        municipalities_info = retrieve_relevant_info(user_input, municipalities_collection)
-        ic(municipalities_info)
-        context.append(municipalities_info)
-    if landmarks_collection:
-        landmarks_info = retrieve_relevant_info(user_input, landmarks_collection)
-        ic(landmarks_info)
-        context.append(landmarks_info)
-    if news_collection:
-        news_info = retrieve_relevant_info(user_input, news_collection)
-        ic(news_info)
-        context.append(news_info)
-        ic(context)
-    
-    combined_context_parts = []
-    for docs in context:
-        if docs and "documents" in docs:
-            logger.info("docs['documents'] content: " + str(docs["documents"]))
-            if isinstance(docs["documents"], list) and docs["documents"]:
-                sublist = docs["documents"][0]
-                for doc in sublist:
-                    if doc:
-                        combined_context_parts.append(str(doc))
-            else:
-                for doc in docs["documents"]:
-                    if doc:
-                        combined_context_parts.append(str(doc))
-    combined_context = "\n".join(combined_context_parts)
-    logger.info("Combined context after processing: " + combined_context)
-    
-    if combined_context.strip() == "":
-        prompt = (
-            f"{user_input}\n\n"
-            "Please answer using your travel planning expertise about Puerto Rico. "
-        )
-        system_message = "You are a helpful travel planner assistant for Puerto Rico. Use only the provided context."
-        logger.info("No context found, using general travel planning prompt.")
-    else:
-        prompt = (
-            f"{user_input}\n\n"
-            f"Context:\n{combined_context}\n\n"
-            "Answer using only the provided context."
-        )
-        system_message = "You are a helpful travel planner assistant for Puerto Rico. Use only the provided context."
-    
     try:
-        response = openai.chat.completions.create(
-            model="gpt-4o-2024-08-06",
-            messages=[
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.5, 
-            max_tokens=250,
-            top_p=1,
-            frequency_penalty=1,
-            presence_penalty=-1                         
-        )
-        model_reply = response.choices[0].message.content
-        logger.info("Received model reply: " + model_reply)
-        log_chat(user_input, model_reply)
-        ic(model_reply)
-        return model_reply
-    except Exception as e:
+        chat_service = startup.wait("chat_service")
+        pipeline = chat_pipeline()
+    except StartupNotReady as e:
+        logger.warning(f"Not ready to answer: {e}")
+        return STARTING_REPLY
+    from chat_service import ChatServiceBusy, ChatServiceError
+
+    try:
+        model_reply = pipeline.chat(chat_service, user_input)
+    except ChatServiceBusy as e:
+        logger.warning(f"Chat service busy: {e}")
+        return BUSY_REPLY
+    except ChatServiceError as e:
         logger.error(f"Error in chat_with_llm: {e}")
-        return f"Error: {e}"
+        return FAILED_REPLY
+    log_chat(user_input, model_reply)
+    return model_reply
+
+def stream_chat_with_llm(user_input):
+    """Same as chat_with_llm, but yields the reply token by token as it arrives.
+
+    The reply is cached and logged only once the stream has finished.
+    """
+    with trace("chat", stream=True):
+        yield from _stream_chat_with_llm(user_input)
+
+def _stream_chat_with_llm(user_input):
+    logger.info(f"Processing user input: {user_input}")
+    try:
+        chat_service = startup.wait("chat_service")
+        pipeline = chat_pipeline()
+        query_embedding, context_ids, messages = pipeline.prepare(user_input)
+    except StartupNotReady as e:
+        logger.warning(f"Not ready to answer: {e}")
+        yield STARTING_REPLY
+        return
+    from chat_service import ChatServiceBusy, ChatServiceError
+
+    cached_reply = pipeline.cached_reply(query_embedding, context_ids)
+    if cached_reply is not None:
+        logger.info("Serving model reply from response cache.")
+        log_chat(user_input, cached_reply)
+        yield cached_reply
+        return
+
+    reply_parts = []
+    try:
+        with span("llm", stream=True):
+            for token in chat_service.stream(messages, **pipeline.llm_params):
+                reply_parts.append(token)
+                yield token
+    except ChatServiceBusy as e:
+        logger.warning(f"Chat service busy: {e}")
+        yield BUSY_REPLY
+        return
+    except ChatServiceError as e:
+        logger.error(f"Error in stream_chat_with_llm: {e}")
+        yield FAILED_REPLY
+        return
+
+    model_reply = "".join(reply_parts)
+    logger.info(f"Received streamed model reply ({len(model_reply)} chars).")
+    pipeline.remember(user_input, query_embedding, context_ids, model_reply)
+    log_chat(user_input, model_reply)
 
 # -------------------------------------------------------------------
 # 6. Streamlit UI Setup
@@ -187,6 +216,9 @@ def chat_with_llm(user_input):
 
 st.set_page_config(page_title="Puerto Rico Travel Planner", layout="wide")
 
+# Stream tokens into the chat as they arrive; set STREAM_RESPONSES=0 to wait for the full reply
+STREAM_RESPONSES = os.getenv("STREAM_RESPONSES", "1") != "0"
+
 # Initialize chat session if not already initialized
 if "messages" not in st.session_state:
     st.session_state.messages = []
@@ -215,24 +247,58 @@ with st.container():
     if user_input:
         logger.info("User input received: " + user_input)
         st.session_state.messages.append({"role": "user", "content": user_input})
-        model_reply = chat_with_llm(user_input)
+        with st.chat_message("user"):
+            st.markdown(user_input)
+        with st.chat_message("assistant"):
+            if STREAM_RESPONSES:
+                model_reply = st.write_stream(stream_chat_with_llm(user_input))
+            else:
+                model_reply = chat_with_llm(user_input)
+                st.markdown(model_reply)
         st.session_state.messages.append({"role": "assistant", "content": model_reply})
         logger.info("Assistant reply appended to session state.")
-        with st.chat_message("assistant"):
-            st.markdown(model_reply)
 
 # Sidebar for chat logs
 with st.sidebar:
+    st.markdown("### Response Cache")
+    cache_stats = response_cache.stats()
+    st.write(
+        f"Hits: {cache_stats['hits']} | Misses: {cache_stats['misses']} | "
+        f"Hit rate: {cache_stats['hit_rate']:.0%} | Entries: {cache_stats['entries']}"
+    )
+    if not startup.ready():
+        st.info("Warming up: " + ", ".join(
+            name for name, task in startup.status()["tasks"].items() if task["state"] != "done"
+        ))
+    if startup.done("chat_service"):
+        st.markdown("### LLM Queue")
+        service_stats = chat_service_stats()
+        st.write(
+            f"In flight: {service_stats['in_flight']}/{service_stats['max_concurrency']} | "
+            f"Waiting: {service_stats['waiting']} | Rejected: {service_stats['rejected']} | "
+            f"Retries: {service_stats['retries']} | Avg wait: {service_stats['avg_wait_ms']} ms"
+        )
+    if startup.done("collections"):
+        st.markdown("### Query Embeddings")
+        embedder_stats = get_query_embedder().stats()
+        st.write(
+            f"Cache hit rate: {embedder_stats['hit_rate']:.0%} | Cached: {embedder_stats['cached']} | "
+            f"Avg batch: {embedder_stats['avg_batch_size']} | Max batch: {embedder_stats['max_batch_seen']}"
+        )
+    if st.button("Run health check"):
+        st.json(health_check(COLLECTION_SPECS))
     st.markdown("### Chat Logs")
     with st.expander("View Chat Logs", expanded=True):
         try:
-            if os.path.exists("chat_logs.jsonl"):
-                with open("chat_logs.jsonl", "r", encoding="utf-8") as log_file:
-                    logs = log_file.read()
-                st.text_area("Chat Logs", logs, height=400, max_chars=5000)
-                logger.info("Chat logs displayed in dashboard.")
+            records = chat_log.tail(CHAT_LOG_TAIL)
+            if records:
+                logs = "\n".join(json.dumps(record, ensure_ascii=False) for record in records)
+                st.text_area(f"Last {len(records)} chats", logs, height=400)
             else:
                 st.write("No chat logs found.")
         except Exception as e:
             st.error("Error loading chat logs: " + str(e))
             logger.error("Error loading chat logs: " + str(e))
+
+# Time from process start to the first complete render, see /ready
+startup.mark("first_render")
@@ -0,0 +1,254 @@
+"""Offline benchmark for retrieval and end-to-end chat latency.
+
+Replays the questions in `chat_logs.jsonl` against the Chroma collections
+and a local fake completion server (started in-process, see
+fake_llm_server.py), so no OpenAI calls are made. For every retrieval
+backend it reports recall@k on `data/benchmark_labels.json` and
+p50/p95/p99 latency; end to end it also compares the response cache on and
+off at each concurrency level, with a per-stage breakdown from the
+pipeline's spans. Results are written as JSON for regression tracking.
+
+Usage (from the src folder):
+    python benchmark.py --output ../benchmarks/baseline.json
+    python benchmark.py --backends dense --concurrency 1,8 --llm-latency 0.5
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from chat_pipeline import ChatPipeline
+from chat_service import ChatService
+from fake_llm_server import make_server
+from metrics import trace
+from resources import STORE_PATH, get_collections, get_lexical_indexes
+from response_cache import SemanticResponseCache
+from retrieval import collect_ids
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHAT_LOG = "chat_logs.jsonl"
+DEFAULT_LABELS = "../data/benchmark_labels.json"
+DEFAULT_CHROMA_PATH = STORE_PATH
+COLLECTION_NAMES = ("municipalities", "landmarks", "news_articles")
+BACKENDS = ("dense", "hybrid")
+
+
+# -------------------------
+# 1. Inputs and Statistics
+# -------------------------
+def load_queries(path, limit=None):
+    """Distinct, non-empty user questions from the chat log, in first-seen order."""
+    queries = []
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            try:
+                query = json.loads(line).get("user_input", "").strip()
+            except json.JSONDecodeError:
+                continue
+            if query:
+                queries.append(query)
+    queries = list(dict.fromkeys(queries))
+    return queries[:limit] if limit else queries
+
+
+def load_labels(path):
+    with open(path, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def percentile(sorted_values, fraction):
+    """Linear-interpolated percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def summarize(latencies_ms):
+    values = sorted(latencies_ms)
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean_ms": round(sum(values) / len(values), 2),
+        "p50_ms": round(percentile(values, 0.50), 2),
+        "p95_ms": round(percentile(values, 0.95), 2),
+        "p99_ms": round(percentile(values, 0.99), 2),
+        "max_ms": round(values[-1], 2),
+    }
+
+
+def summarize_stages(traces):
+    by_stage = {}
+    for current in traces:
+        for span in current["spans"]:
+            stage = span["stage"] if "collection" not in span else f"{span['stage']}:{span['collection']}"
+            by_stage.setdefault(stage, []).append(span["ms"])
+    return {stage: summarize(values) for stage, values in sorted(by_stage.items())}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# -------------------------
+# 2. Pipeline Under Test
+# -------------------------
+# The pipeline under test is chat_pipeline.ChatPipeline, the one app3_dan.py
+# answers with; a backend is "hybrid" when it gets the BM25 indexes.
+def recall_at_k(pipeline, labels, k):
+    """Mean share of each query's relevant `collection:id`s found in the top k per collection."""
+    recalls = []
+    for label in labels:
+        retrieved = set(collect_ids(pipeline.retrieve(label["query"], n_results=k)))
+        relevant = set(label["relevant"])
+        recalls.append(len(relevant & retrieved) / len(relevant))
+    return round(sum(recalls) / len(recalls), 4) if recalls else None
+
+
+def run_load(fn, queries, concurrency):
+    """Call `fn(query)` for every query with `concurrency` workers; time each call."""
+    latencies, traces, errors = [], [], []
+    lock = threading.Lock()
+
+    def one(query):
+        start = time.perf_counter()
+        try:
+            with trace("benchmark") as current:
+                fn(query)
+        except Exception as e:
+            with lock:
+                errors.append(f"{type(e).__name__}: {e}")
+            return
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            latencies.append(elapsed)
+            traces.append(current)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, queries))
+    wall = time.perf_counter() - start
+    return {
+        "concurrency": concurrency,
+        "requests": len(queries),
+        "errors": len(errors),
+        "sample_errors": errors[:3],
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else None,
+        "latency": summarize(latencies),
+        "stages": summarize_stages(traces),
+    }
+
+
+# -------------------------
+# 3. Benchmark Runs
+# -------------------------
+def run_benchmark(queries, labels, collections, lexical_indexes, service, backends=BACKENDS,
+                  concurrency_levels=(1, 8), repeat=2, k=3, n_results=3):
+    report = {"retrieval": {}, "end_to_end": {}}
+    for backend in backends:
+        pipeline = ChatPipeline(collections, lexical_indexes if backend == "hybrid" else {}, n_results=n_results)
+        logger.info(f"[{backend}] retrieval: recall@{k} on {len(labels)} labels, latency on {len(queries)} queries")
+        report["retrieval"][backend] = {
+            f"recall@{k}": recall_at_k(pipeline, labels, k),
+            **run_load(lambda query: pipeline.retrieve(query), queries, 1),
+        }
+
+        for use_cache in (False, True):
+            for concurrency in concurrency_levels:
+                with tempfile.TemporaryDirectory() as cache_dir:
+                    cache = SemanticResponseCache(path=os.path.join(cache_dir, "cache.sqlite3")) if use_cache else None
+                    pipeline.cache = cache
+                    name = f"{backend}/cache-{'on' if use_cache else 'off'}/c{concurrency}"
+                    logger.info(f"[{name}] end to end, {len(queries) * repeat} requests")
+                    result = run_load(lambda query: pipeline.chat(service, query), queries * repeat, concurrency)
+                    if cache is not None:
+                        result["cache"] = cache.stats()
+                        cache.close()
+                    report["end_to_end"][name] = result
+        pipeline.cache = None
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark retrieval and end-to-end chat latency offline.")
+    parser.add_argument("--chat-log", default=DEFAULT_CHAT_LOG, help="JSONL whose user_input fields are replayed")
+    parser.add_argument("--labels", default=DEFAULT_LABELS, help="labeled queries for recall@k")
+    parser.add_argument("--chroma-path", default=DEFAULT_CHROMA_PATH)
+    parser.add_argument("--backends", default=",".join(BACKENDS), help="comma-separated: dense, hybrid")
+    parser.add_argument("--concurrency", default="1,8", help="comma-separated concurrency levels")
+    parser.add_argument("--limit", type=int, default=None, help="replay at most this many distinct queries")
+    parser.add_argument("--repeat", type=int, default=2, help="times each query is replayed end to end")
+    parser.add_argument("--k", type=int, default=3, help="k for recall@k")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="seconds the fake LLM takes per reply")
+    parser.add_argument("--llm-rate-limit", type=float, default=0.0, help="share of fake LLM replies that are 429s")
+    parser.add_argument("--output", default=None, help="write the JSON report here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s",
+                        datefmt="%Y-%m-%d %H:%M:%S")
+    backends = [b.strip() for b in args.backends.split(",") if b.strip()]
+    unknown = set(backends) - set(BACKENDS)
+    if unknown:
+        parser.error(f"unknown backends: {', '.join(sorted(unknown))}")
+    concurrency_levels = [int(c) for c in args.concurrency.split(",")]
+
+    queries = load_queries(args.chat_log, args.limit)
+    labels = load_labels(args.labels)
+    specs = {name: (args.chroma_path, name) for name in COLLECTION_NAMES}
+    collections = get_collections(specs)
+    lexical_indexes = get_lexical_indexes(specs) if "hybrid" in backends else {}
+
+    server = make_server(port=0, latency=args.llm_latency, rate_limit=args.llm_rate_limit)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    service = ChatService(max_concurrency=max(concurrency_levels), max_waiting=sum(concurrency_levels) * 4,
+                          base_url=f"http://127.0.0.1:{server.server_port}/v1", api_key="benchmark")
+    try:
+        report = run_benchmark(queries, labels, collections, lexical_indexes, service, backends,
+                               concurrency_levels, args.repeat, args.k)
+    finally:
+        service.close()
+        server.shutdown()
+
+    report["meta"] = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_commit": git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "queries": len(queries),
+        "labels": len(labels),
+        "collections": {name: (c.count() if c is not None else None) for name, c in collections.items()},
+        "llm_latency_s": args.llm_latency,
+        "llm_rate_limit": args.llm_rate_limit,
+        "llm_service": service.stats(),
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(output + "\n")
+        logger.info(f"Benchmark report written to {args.output}")
+    else:
+        print(output)
+
+    for name, result in report["end_to_end"].items():
+        latency = result["latency"]
+        logger.info(f"{name:24s} p50={latency.get('p50_ms')}ms p95={latency.get('p95_ms')}ms "
+                    f"p99={latency.get('p99_ms')}ms {result['throughput_rps']} req/s errors={result['errors']}")
+
+
+if __name__ == "__main__":
+    main()
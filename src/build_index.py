@@ -0,0 +1,274 @@
+"""Incremental, batched builder for the Chroma collections.
+
+Reads `data/landmarks_corrected.json`, `data/municipalities_corrected.json`
+and the El Mundo news chunks written by chunk_news.py (falling back to the
+whole front pages when that table has not been built), embeds documents in
+batches and upserts them by stable id. Documents whose content hash is
+unchanged since the last run are skipped, so fixing one landmark only
+re-embeds that landmark. The model is the EMBEDDING_BACKEND of
+embeddings.py; switching it rebuilds the collections.
+
+Usage (from the src folder):
+    python build_index.py
+    python build_index.py --only landmarks --batch-size 128
+    python build_index.py --store ../chromadb --prune
+    EMBEDDING_BACKEND=onnx python build_index.py
+    python build_index.py --only news_articles --prune   # after chunk_news.py
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+from places import assign_municipalities, description_text, load_places, municipality_key, place_id, record_coordinates
+from text_normalization import normalize_text
+from resources import STORE_PATH, get_client
+from embeddings import DEFAULT_MODEL_ID, embedding_model_id, get_embedding_function
+from query_planner import FILTER_FIELDS_KEY
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STORE = STORE_PATH
+DEFAULT_DATA_DIR = "../data"
+DEFAULT_NEWS_DIR = "../data/elmundo_chunked_es_page1_40years"
+DEFAULT_NEWS_CHUNKS = "../datasets/pai-personal-52ec7/travel_planner/data.parquet"
+DEFAULT_BATCH_SIZE = 64
+COLLECTIONS = ("municipalities", "landmarks", "news_articles")
+# Metadata fields place_documents writes, which query_planner.py may filter on
+PLACE_FILTER_FIELDS = ("category", "municipality", "latitude", "longitude")
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+NEWS_FILE_PATTERN = re.compile(r"^(\d{4})(\d{2})(\d{2})_(\d+)\.txt$")
+
+
+def content_hash(text, metadata):
+    payload = json.dumps({"text": text, "metadata": metadata}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def count_tokens(text):
+    """Approximate token count (words and punctuation marks)."""
+    return len(TOKEN_PATTERN.findall(text))
+
+
+# -------------------------
+# 1. Document Sources
+# -------------------------
+def place_documents(records, municipality_of=None):
+    """Yield (id, text, metadata) for landmark or municipality records.
+
+    `municipality_of` maps a landmark's id to its municipality key (see
+    places.assign_municipalities); municipalities are their own. Together
+    with category and coordinates it lets queries filter with `where`.
+    """
+    for record in records:
+        metadata = {
+            "name": record["name"],
+            "category": record["category"],
+            "source_file": record["source_file"],
+        }
+        if record["category"] == "Municipality":
+            metadata["municipality"] = municipality_key(record)
+        elif municipality_of and place_id(record) in municipality_of:
+            metadata["municipality"] = municipality_of[place_id(record)]
+        coordinates = record_coordinates(record)
+        if coordinates:
+            metadata["latitude"], metadata["longitude"] = coordinates
+        text = normalize_text(f"{record['name']}. {description_text(record)}")
+        yield place_id(record), text, metadata
+
+
+def news_documents(news_dir):
+    """Yield (id, text, metadata) for every front page, reading files lazily."""
+    for filename in sorted(os.listdir(news_dir)):
+        match = NEWS_FILE_PATTERN.match(filename)
+        if not match:
+            continue
+        year, month, day, page = match.groups()
+        with open(os.path.join(news_dir, filename), "r", encoding="utf-8", errors="replace") as file:
+            text = file.read()
+        metadata = {
+            "source_file": filename,
+            "date": f"{year}-{month}-{day}",
+            "year": int(year),
+            "page": int(page),
+        }
+        yield os.path.splitext(filename)[0], text, metadata
+
+
+def news_chunk_documents(parquet_path, read_batch_size=1000):
+    """Yield (id, text, metadata) for every chunk of the chunk_news.py table, one record batch at a time."""
+    columns = ["chunk_id", "text", "filename", "date", "year", "page", "chunk_index"]
+    for batch in pq.ParquetFile(parquet_path).iter_batches(batch_size=read_batch_size, columns=columns):
+        for row in batch.to_pylist():
+            metadata = {
+                "source_file": row["filename"],
+                "date": row["date"],
+                "year": row["year"],
+                "page": row["page"],
+                "chunk_index": row["chunk_index"],
+            }
+            yield row["chunk_id"], row["text"], metadata
+
+
+def news_source(news_dir, news_chunks):
+    """Chunked news when the parquet table exists, whole pages otherwise."""
+    if not news_chunks:
+        return news_documents(news_dir)
+    if not os.path.exists(news_chunks):
+        logger.warning(f"{news_chunks} not found (run chunk_news.py); indexing whole news pages.")
+    elif pq is None:
+        logger.warning("pyarrow is not installed; indexing whole news pages instead of chunks.")
+    else:
+        logger.info(f"Indexing news chunks from {news_chunks}.")
+        return news_chunk_documents(news_chunks)
+    return news_documents(news_dir)
+
+
+def iter_batches(documents, batch_size):
+    batch = []
+    for document in documents:
+        batch.append(document)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# -------------------------
+# 2. Incremental Upsert
+# -------------------------
+def index_documents(collection, documents, embedding_function, batch_size=DEFAULT_BATCH_SIZE,
+                    force=False, prune=False):
+    """Embed and upsert new or changed documents; return throughput stats."""
+    stats = {"documents": 0, "embedded": 0, "skipped": 0, "pruned": 0, "tokens": 0, "embed_seconds": 0.0}
+    seen_ids = set()
+    start = time.perf_counter()
+
+    for batch in iter_batches(documents, batch_size):
+        ids = [doc_id for doc_id, _, _ in batch]
+        seen_ids.update(ids)
+        stats["documents"] += len(batch)
+        existing = {}
+        if not force:
+            found = collection.get(ids=ids, include=["metadatas"])
+            existing = {
+                doc_id: (metadata or {}).get("content_hash")
+                for doc_id, metadata in zip(found["ids"], found["metadatas"])
+            }
+
+        changed_ids, changed_texts, changed_metadatas = [], [], []
+        for doc_id, text, metadata in batch:
+            digest = content_hash(text, metadata)
+            if existing.get(doc_id) == digest:
+                stats["skipped"] += 1
+                continue
+            changed_ids.append(doc_id)
+            changed_texts.append(text)
+            changed_metadatas.append(dict(metadata, content_hash=digest))
+        if not changed_ids:
+            continue
+
+        embed_start = time.perf_counter()
+        embeddings = embedding_function(changed_texts)
+        collection.upsert(ids=changed_ids, embeddings=embeddings, documents=changed_texts,
+                          metadatas=changed_metadatas)
+        stats["embed_seconds"] += time.perf_counter() - embed_start
+        stats["embedded"] += len(changed_ids)
+        stats["tokens"] += sum(count_tokens(text) for text in changed_texts)
+        logger.info(f"{collection.name}: upserted {stats['embedded']} documents so far.")
+
+    if prune:
+        stale_ids = [doc_id for doc_id in collection.get(include=[])["ids"] if doc_id not in seen_ids]
+        if stale_ids:
+            collection.delete(ids=stale_ids)
+        stats["pruned"] = len(stale_ids)
+
+    elapsed = stats["embed_seconds"]
+    stats["total_seconds"] = round(time.perf_counter() - start, 2)
+    stats["embed_seconds"] = round(elapsed, 2)
+    stats["docs_per_second"] = round(stats["embedded"] / elapsed, 1) if elapsed else 0.0
+    stats["tokens_per_second"] = round(stats["tokens"] / elapsed, 1) if elapsed else 0.0
+    return stats
+
+
+def open_collection(client, name, model_id):
+    """Get or create `name`, recreating it if it was indexed with a different embedding model.
+
+    Vectors of two models are not comparable (nor usually the same size), so
+    a backend switch empties the collection and everything is re-embedded.
+    """
+    collection = client.get_or_create_collection(name, metadata={"embedding_model": model_id})
+    indexed_with = (collection.metadata or {}).get("embedding_model", DEFAULT_MODEL_ID)
+    if indexed_with == model_id:
+        return collection
+    if collection.count():
+        logger.warning(f"{name} was indexed with {indexed_with}; recreating it for {model_id}.")
+        client.delete_collection(name)
+        return client.get_or_create_collection(name, metadata={"embedding_model": model_id})
+    collection.modify(metadata=dict(collection.metadata or {}, embedding_model=model_id))
+    return collection
+
+
+def record_filter_fields(collection, fields):
+    """Note in the collection metadata that its records carry `fields`, so queries may filter on them."""
+    value = ",".join(fields)
+    if (collection.metadata or {}).get(FILTER_FIELDS_KEY) != value:
+        collection.modify(metadata=dict(collection.metadata or {}, **{FILTER_FIELDS_KEY: value}))
+
+
+def build_index(store=DEFAULT_STORE, data_dir=DEFAULT_DATA_DIR, news_dir=DEFAULT_NEWS_DIR,
+                collections=COLLECTIONS, batch_size=DEFAULT_BATCH_SIZE, force=False, prune=False,
+                news_chunks=DEFAULT_NEWS_CHUNKS):
+    client = get_client(store)
+    embedding_function = get_embedding_function()
+    model_id = embedding_model_id(embedding_function)
+    landmarks, municipalities = load_places(data_dir)
+    sources = {
+        "municipalities": lambda: place_documents(municipalities),
+        "landmarks": lambda: place_documents(landmarks, assign_municipalities(landmarks, municipalities)),
+        "news_articles": lambda: news_source(news_dir, news_chunks),
+    }
+
+    report = {}
+    for name in collections:
+        collection = open_collection(client, name, model_id)
+        report[name] = index_documents(collection, sources[name](), embedding_function,
+                                       batch_size=batch_size, force=force, prune=prune)
+        if name in ("municipalities", "landmarks"):
+            record_filter_fields(collection, PLACE_FILTER_FIELDS)
+        logger.info(f"{name}: {report[name]}")
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Embed and upsert places and news into the Chroma store.")
+    parser.add_argument("--store", default=DEFAULT_STORE, help="path of the Chroma PersistentClient")
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR, help="folder with the *_corrected.json files")
+    parser.add_argument("--news-dir", default=DEFAULT_NEWS_DIR, help="folder with the El Mundo page files")
+    parser.add_argument("--news-chunks", default=DEFAULT_NEWS_CHUNKS,
+                        help="parquet table written by chunk_news.py; pass '' to index whole pages")
+    parser.add_argument("--only", choices=COLLECTIONS, action="append", help="index only this collection (repeatable)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="documents per embedding call")
+    parser.add_argument("--force", action="store_true", help="re-embed every document, ignoring content hashes")
+    parser.add_argument("--prune", action="store_true", help="delete documents whose source no longer exists")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s",
+                        datefmt="%Y-%m-%d %H:%M:%S")
+    report = build_index(args.store, args.data_dir, args.news_dir, tuple(args.only or COLLECTIONS),
+                         args.batch_size, args.force, args.prune, args.news_chunks)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
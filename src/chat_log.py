@@ -0,0 +1,196 @@
+"""Buffered, rotating JSONL sink for chat transcripts.
+
+`write()` only enqueues the record; a background thread appends batches to
+a file it keeps open, flushing every `flush_interval` seconds or
+`batch_size` records. When the file passes `max_bytes` or `max_age_seconds`
+it is rotated to `<path>.<timestamp>.gz` and the oldest archives beyond
+`backup_count` are deleted. `tail()` reads only the end of the current file
+and does not wait for queued records; call `flush()` first for that.
+"""
+import atexit
+import datetime
+import glob
+import gzip
+import json
+import logging
+import os
+import queue
+import shutil
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOG_PATH = "chat_logs.jsonl"
+DEFAULT_FLUSH_INTERVAL = 1.0
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 5
+DEFAULT_QUEUE_SIZE = 10000
+TAIL_BLOCK_SIZE = 8192
+DEFAULT_FLUSH_TIMEOUT = 2.0
+# Queued by flush() so the writer stops filling the current batch and writes it now
+_FLUSH = object()
+
+
+def tail_lines(path, n, block_size=TAIL_BLOCK_SIZE):
+    """Return the last `n` lines of a text file, reading backwards in blocks."""
+    if n <= 0 or not os.path.exists(path):
+        return []
+    with open(path, "rb") as file:
+        file.seek(0, os.SEEK_END)
+        position = file.tell()
+        data = b""
+        # n lines need n newlines before them (plus the trailing one)
+        while position > 0 and data.count(b"\n") <= n:
+            step = min(block_size, position)
+            position -= step
+            file.seek(position)
+            data = file.read(step) + data
+    lines = data.decode("utf-8", errors="replace").splitlines()
+    if position > 0:
+        lines = lines[1:]  # the first line may be partial
+    return lines[-n:]
+
+
+class ChatLogSink:
+    def __init__(self, path=DEFAULT_LOG_PATH, flush_interval=DEFAULT_FLUSH_INTERVAL, batch_size=DEFAULT_BATCH_SIZE,
+                 max_bytes=DEFAULT_MAX_BYTES, max_age_seconds=None, backup_count=DEFAULT_BACKUP_COUNT,
+                 queue_size=DEFAULT_QUEUE_SIZE):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.backup_count = backup_count
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._file = None
+        self._opened_at = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="chat-log-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # -------------------------
+    # 1. Producer API
+    # -------------------------
+    def write(self, record):
+        """Queue a record for writing; never blocks the caller."""
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            logger.warning(f"Chat log queue full; dropped {self.dropped} records so far.")
+
+    def log_chat(self, user_input, model_reply, **extra):
+        self.write({
+            "timestamp": datetime.datetime.now().isoformat(),
+            "user_input": user_input,
+            "model_reply": model_reply,
+            **extra,
+        })
+
+    def flush(self, timeout=DEFAULT_FLUSH_TIMEOUT):
+        """Wake the writer and wait up to `timeout` seconds for the queue to drain.
+
+        Returns False on timeout (e.g. while other sessions keep writing).
+        """
+        try:
+            self._queue.put_nowait(_FLUSH)
+        except queue.Full:
+            pass
+        deadline = time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._queue.all_tasks_done.wait(remaining):
+                    return False
+        return True
+
+    def tail(self, n=20):
+        """Last `n` records already written to the current file, oldest first."""
+        records = []
+        for line in tail_lines(self.path, n):
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+        return records
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+
+    # -------------------------
+    # 2. Writer Thread
+    # -------------------------
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    record = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if record is None:
+                    self._queue.task_done()
+                    stopping = True
+                    break
+                if record is _FLUSH:
+                    self._queue.task_done()
+                    break
+                batch.append(record)
+            if batch:
+                try:
+                    self._write_batch(batch)
+                except Exception as e:
+                    logger.error(f"Error writing to {self.path}: {e}")
+                for _ in batch:
+                    self._queue.task_done()
+        if self._file is not None:
+            self._file.close()
+
+    def _write_batch(self, batch):
+        if self._file is not None and self._should_rotate():
+            self._rotate()
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+            self._opened_at = time.time()
+        self._file.write("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in batch))
+        self._file.flush()
+
+    def _should_rotate(self):
+        if self.max_bytes and self._file.tell() >= self.max_bytes:
+            return True
+        return bool(self.max_age_seconds) and time.time() - self._opened_at >= self.max_age_seconds
+
+    def _rotate(self):
+        self._file.close()
+        self._file = None
+        archive = f"{self.path}.{datetime.datetime.now().strftime('%Y%m%d-%H%M%S-%f')}.gz"
+        with open(self.path, "rb") as source, gzip.open(archive, "wb") as target:
+            shutil.copyfileobj(source, target)
+        os.remove(self.path)
+        archives = sorted(glob.glob(glob.escape(self.path) + ".*.gz"))
+        for old in archives[:-self.backup_count] if self.backup_count else archives:
+            os.remove(old)
+        logger.info(f"Rotated {self.path} -> {archive}")
+
+
+_default_sink = None
+_default_sink_lock = threading.Lock()
+
+
+def get_chat_log(**kwargs):
+    """Return the process-wide sink, so every Streamlit session shares one writer."""
+    global _default_sink
+    with _default_sink_lock:
+        if _default_sink is None:
+            _default_sink = ChatLogSink(**kwargs)
+    return _default_sink
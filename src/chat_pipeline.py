@@ -0,0 +1,118 @@
+"""The retrieve -> pack -> complete steps of a chat turn.
+
+app3_dan.py answers with a ChatPipeline over the shared collections, and
+benchmark.py times the same object against a fake completion server, so
+the benchmark follows any change to retrieval, prompt or caching.
+"""
+import logging
+
+from context_budget import DEFAULT_TOKEN_BUDGET, chunks_from_results, pack_context
+from metrics import span
+from retrieval import DEFAULT_N_RESULTS, embed_query, hybrid_retrieve, retrieve_from_collections
+
+logger = logging.getLogger(__name__)
+
+LLM_PARAMS = {
+    "model": "gpt-4o-2024-08-06",
+    "temperature": 0.5,
+    "max_tokens": 250,
+    "top_p": 1,
+    "frequency_penalty": 1,
+    "presence_penalty": -1,
+}
+SYSTEM_MESSAGE = "You are a helpful travel planner assistant for Puerto Rico. Use only the provided context."
+
+
+def build_messages(user_input, context):
+    """System and user messages for `user_input`, with the packed `context` if there is any."""
+    if context.strip() == "":
+        prompt = (
+            f"{user_input}\n\n"
+            "Please answer using your travel planning expertise about Puerto Rico. "
+        )
+        logger.info("No context found, using general travel planning prompt.")
+    else:
+        prompt = (
+            f"{user_input}\n\n"
+            f"Context:\n{context}\n\n"
+            "Answer using only the provided context."
+        )
+    return [
+        {"role": "system", "content": SYSTEM_MESSAGE},
+        {"role": "user", "content": prompt}
+    ]
+
+
+class ChatPipeline:
+    """Retrieval, context packing, response cache and completion over one set of collections.
+
+    With `lexical_indexes`, retrieval is hybrid (dense + BM25); a
+    `query_planner` narrows the collections and adds municipality filters
+    to those indexed with the fields they use.
+    `cache` is a SemanticResponseCache, or None to always call the model.
+    """
+
+    def __init__(self, collections, lexical_indexes=None, query_planner=None, n_results=DEFAULT_N_RESULTS,
+                 token_budget=DEFAULT_TOKEN_BUDGET, cache=None, llm_params=LLM_PARAMS):
+        self.collections = collections
+        self.lexical_indexes = lexical_indexes or {}
+        self.query_planner = query_planner
+        self.n_results = n_results
+        self.token_budget = token_budget
+        self.cache = cache
+        self.llm_params = llm_params
+
+    def retrieve(self, query, query_embedding=None, n_results=None):
+        n_results = n_results or self.n_results
+        targets, where = self.collections, None
+        if self.query_planner is not None:
+            plan = self.query_planner.plan(query)
+            targets = plan.select(self.collections)
+            where = plan.where_for(targets)
+        if self.lexical_indexes:
+            results, _ = hybrid_retrieve(query, targets, self.lexical_indexes, n_results=n_results,
+                                         query_embedding=query_embedding, where=where)
+        else:
+            results = retrieve_from_collections(query, targets, n_results=n_results,
+                                                query_embedding=query_embedding, where=where)
+        logger.info(f"Retrieved {sum(len(docs['ids'][0]) for docs in results.values() if docs)} "
+                    f"documents from {len(results)} collections.")
+        return results
+
+    def prepare(self, user_input):
+        """Retrieve and pack the context; returns (query_embedding, context_ids, messages)."""
+        query_embedding = embed_query(user_input)
+        results = self.retrieve(user_input, query_embedding)
+        with span("context"):
+            context_parts, context_ids, report = pack_context(
+                chunks_from_results(results), self.token_budget, model=self.llm_params["model"]
+            )
+        logger.info(f"Context: {report['tokens_out']} tokens from {len(context_ids)} chunks "
+                    f"({report['tokens_saved']} saved, {report['duplicates_removed']} duplicates removed).")
+        return query_embedding, context_ids, build_messages(user_input, "\n".join(context_parts))
+
+    def cached_reply(self, query_embedding, context_ids):
+        if self.cache is None:
+            return None
+        with span("cache_lookup"):
+            return self.cache.get(query_embedding, context_ids, self.llm_params)
+
+    def remember(self, user_input, query_embedding, context_ids, reply):
+        if self.cache is not None:
+            self.cache.put(query_embedding, context_ids, self.llm_params, reply, query=user_input)
+
+    def chat(self, service, user_input):
+        """Answer `user_input` from the cache or through `service` (a ChatService).
+
+        ChatServiceBusy and ChatServiceError propagate to the caller.
+        """
+        query_embedding, context_ids, messages = self.prepare(user_input)
+        reply = self.cached_reply(query_embedding, context_ids)
+        if reply is not None:
+            logger.info("Serving model reply from response cache.")
+            return reply
+        with span("llm"):
+            reply = service.complete(messages, **self.llm_params)
+        logger.info(f"Received model reply ({len(reply)} chars).")
+        self.remember(user_input, query_embedding, context_ids, reply)
+        return reply
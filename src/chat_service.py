@@ -0,0 +1,284 @@
+"""Asyncio chat completion service shared by the Streamlit and Flask apps.
+
+One event loop runs in a background thread and owns a pooled AsyncOpenAI
+client. Every completion goes through a global semaphore, so at most
+`max_concurrency` calls are in flight per process; callers beyond that wait,
+and once `max_waiting` are queued new calls are refused with ChatServiceBusy
+instead of piling up. Rate limits (429), timeouts and 5xx responses are
+retried with jittered exponential backoff, honouring Retry-After; any other
+failure is raised as ChatServiceError too. Replies are capped at
+`max_tokens` unless the call passes its own cap.
+
+Sync code calls `complete()` / `stream()`, or `submit()` to get a Future
+without blocking; async code can await `acomplete()` / iterate `astream()`
+directly. Point OPENAI_BASE_URL at fake_llm_server.py to exercise it
+without the real API.
+"""
+import asyncio
+import logging
+import queue
+import random
+import threading
+import time
+from contextlib import asynccontextmanager
+
+import httpx
+from openai import (APIConnectionError, APIStatusError, AsyncOpenAI, DefaultAsyncHttpxClient,
+                    InternalServerError, OpenAIError, RateLimitError)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_MAX_WAITING = 32
+DEFAULT_MAX_RETRIES = 4
+DEFAULT_BASE_DELAY = 0.5
+DEFAULT_MAX_DELAY = 20.0
+DEFAULT_TIMEOUT = 60.0
+# Reply cap for calls that do not pass one. o-series models name it
+# max_completion_tokens and count their hidden reasoning against it, so they get more.
+DEFAULT_MAX_TOKENS = 500
+TOKEN_CAP_PARAMS = ("max_tokens", "max_completion_tokens")
+REASONING_MODEL_PREFIXES = ("o1", "o3", "o4")
+REASONING_TOKEN_FACTOR = 4
+
+# APIConnectionError also covers APITimeoutError
+RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, InternalServerError)
+_END_OF_STREAM = object()
+
+
+class ChatServiceBusy(Exception):
+    """Too many requests are already waiting; the caller should try again later."""
+
+
+class ChatServiceError(Exception):
+    """The completion failed, after retries when the error was transient."""
+
+
+def _capped(params, max_tokens):
+    """`params` with a reply token cap, unless the caller already set one."""
+    if max_tokens is None or any(key in params for key in TOKEN_CAP_PARAMS):
+        return params
+    if str(params.get("model", "")).startswith(REASONING_MODEL_PREFIXES):
+        return {**params, "max_completion_tokens": max_tokens * REASONING_TOKEN_FACTOR}
+    return {**params, "max_tokens": max_tokens}
+
+
+def _retry_after(error):
+    """Seconds the server asked us to wait, if it said so."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class ChatService:
+    def __init__(self, max_concurrency=DEFAULT_MAX_CONCURRENCY, max_waiting=DEFAULT_MAX_WAITING,
+                 max_retries=DEFAULT_MAX_RETRIES, base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY,
+                 timeout=DEFAULT_TIMEOUT, base_url=None, api_key=None, max_tokens=DEFAULT_MAX_TOKENS):
+        self.max_concurrency = max_concurrency
+        self.max_tokens = max_tokens
+        self.max_waiting = max_waiting
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._counters = {
+            "in_flight": 0, "waiting": 0, "max_waiting_seen": 0, "completed": 0, "failed": 0,
+            "rejected": 0, "retries": 0, "rate_limited": 0, "total_wait_seconds": 0.0,
+        }
+        self._lock = threading.Lock()
+
+        # The client retries nothing itself; _call() owns the retry policy.
+        # Built before the loop thread starts, so a missing API key leaks nothing.
+        try:
+            self._client = AsyncOpenAI(
+                base_url=base_url,
+                api_key=api_key,
+                max_retries=0,
+                timeout=timeout,
+                http_client=DefaultAsyncHttpxClient(
+                    limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency)
+                ),
+            )
+        except OpenAIError as e:
+            raise ChatServiceError(f"Could not create the OpenAI client: {e}") from e
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="chat-service", daemon=True)
+        self._thread.start()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    # -------------------------
+    # 1. Admission and Metrics
+    # -------------------------
+    def _count(self, key, amount=1):
+        with self._lock:
+            self._counters[key] += amount
+
+    @asynccontextmanager
+    async def _slot(self):
+        """Hold one of the `max_concurrency` slots, queueing for it if needed."""
+        with self._lock:
+            if self._counters["waiting"] >= self.max_waiting:
+                self._counters["rejected"] += 1
+                raise ChatServiceBusy(f"{self._counters['waiting']} requests already waiting")
+            self._counters["waiting"] += 1
+            self._counters["max_waiting_seen"] = max(self._counters["max_waiting_seen"], self._counters["waiting"])
+        start = time.perf_counter()
+        try:
+            await self._semaphore.acquire()
+        finally:
+            with self._lock:
+                self._counters["waiting"] -= 1
+                self._counters["total_wait_seconds"] += time.perf_counter() - start
+        self._count("in_flight")
+        try:
+            yield
+        finally:
+            self._count("in_flight", -1)
+            self._semaphore.release()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        finished = stats["completed"] + stats["failed"]
+        stats["avg_wait_ms"] = round(stats.pop("total_wait_seconds") / finished * 1000, 1) if finished else 0.0
+        stats["max_concurrency"] = self.max_concurrency
+        return stats
+
+    # -------------------------
+    # 2. Retries
+    # -------------------------
+    async def _backoff(self, attempt, error):
+        """Sleep before retry number `attempt`, or raise if retries are exhausted.
+
+        The slot is kept while sleeping, so a rate-limited process sends fewer
+        requests instead of letting the queue rush in.
+        """
+        if isinstance(error, RateLimitError):
+            self._count("rate_limited")
+        if attempt >= self.max_retries:
+            raise ChatServiceError(f"Gave up after {attempt + 1} attempts: {error}") from error
+        delay = _retry_after(error)
+        if delay is None:
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        self._count("retries")
+        logger.warning(f"Chat completion failed ({type(error).__name__}), retrying in {delay:.2f}s.")
+        await asyncio.sleep(delay)
+
+    async def acomplete(self, messages, **params):
+        """Return the reply text for `messages`."""
+        params = _capped(params, self.max_tokens)
+        async with self._slot():
+            try:
+                for attempt in range(self.max_retries + 1):
+                    try:
+                        response = await self._client.chat.completions.create(messages=messages, **params)
+                        self._count("completed")
+                        return response.choices[0].message.content
+                    except RETRYABLE_ERRORS as e:
+                        await self._backoff(attempt, e)
+                    except APIStatusError as e:
+                        raise ChatServiceError(str(e)) from e
+            except ChatServiceError:
+                self._count("failed")
+                raise
+            except Exception as e:
+                # Anything else (other OpenAIErrors, httpx, bad parameters) fails this call only
+                self._count("failed")
+                raise ChatServiceError(f"Unexpected {type(e).__name__}: {e}") from e
+
+    async def astream(self, messages, **params):
+        """Yield reply tokens as they arrive.
+
+        Transient errors are only retried before the first token; after that
+        a partial reply cannot be resumed, so the error is raised.
+        """
+        params = _capped(params, self.max_tokens)
+        async with self._slot():
+            started = False
+            try:
+                for attempt in range(self.max_retries + 1):
+                    try:
+                        stream = await self._client.chat.completions.create(messages=messages, stream=True, **params)
+                        async for chunk in stream:
+                            if not chunk.choices:
+                                continue
+                            token = chunk.choices[0].delta.content
+                            if token:
+                                started = True
+                                yield token
+                        self._count("completed")
+                        return
+                    except RETRYABLE_ERRORS as e:
+                        if started:
+                            raise ChatServiceError(f"Stream interrupted: {e}") from e
+                        await self._backoff(attempt, e)
+                    except APIStatusError as e:
+                        raise ChatServiceError(str(e)) from e
+            except ChatServiceError:
+                self._count("failed")
+                raise
+            except Exception as e:
+                # Anything else (other OpenAIErrors, httpx, bad parameters) fails this call only
+                self._count("failed")
+                raise ChatServiceError(f"Unexpected {type(e).__name__}: {e}") from e
+
+    # -------------------------
+    # 3. Sync Facade
+    # -------------------------
+    def complete(self, messages, **params):
+        """Blocking wrapper around `acomplete()` for Streamlit and Flask."""
+        return self.submit(messages, **params).result()
+
+    def submit(self, messages, **params):
+        """Start `acomplete()` without waiting; returns a concurrent.futures.Future."""
+        return asyncio.run_coroutine_threadsafe(self.acomplete(messages, **params), self._loop)
+
+    def stream(self, messages, **params):
+        """Blocking generator wrapper around `astream()`."""
+        tokens = queue.Queue()
+
+        async def pump():
+            try:
+                async for token in self.astream(messages, **params):
+                    tokens.put(token)
+            except Exception as e:
+                tokens.put(e)
+            finally:
+                tokens.put(_END_OF_STREAM)
+
+        future = asyncio.run_coroutine_threadsafe(pump(), self._loop)
+        try:
+            while True:
+                item = tokens.get()
+                if item is _END_OF_STREAM:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # The consumer went away early (e.g. the Streamlit session ended)
+            future.cancel()
+
+    def close(self):
+        asyncio.run_coroutine_threadsafe(self._client.close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+
+_default_service = None
+_default_service_lock = threading.Lock()
+
+
+def get_chat_service(**kwargs):
+    """Return the process-wide service, so every session shares one semaphore and pool.
+
+    Raises ChatServiceError when the client cannot be created (e.g. OPENAI_API_KEY is unset).
+    """
+    global _default_service
+    with _default_service_lock:
+        if _default_service is None:
+            _default_service = ChatService(**kwargs)
+    return _default_service
@@ -0,0 +1,345 @@
+"""Streaming chunker for the El Mundo front pages.
+
+Turns `data/elmundo_chunked_es_page1_40years/*.txt` (one OCR'd front page
+per file) into the parquet table described by
+`datasets/pai-personal-52ec7/travel_planner/schema.yaml`, with one row per
+retrieval-sized chunk instead of one per page:
+
+- masthead lines ("DIARIO DE LA MAÑANA", "AÑO XIX.", postal notices) and
+  OCR debris are dropped, as are short lines repeated on several pages of
+  the same year,
+- paragraphs are packed into chunks of about `--chunk-chars` characters;
+  long paragraphs are split at sentence ends, and consecutive chunks share
+  up to `--overlap-chars` characters of whole sentences,
+- chunks whose normalized text was already seen are dropped.
+
+Years are processed in parallel. Each worker reads its pages one at a time
+and writes its own part file in row groups, and the parts are then merged
+row group by row group, so memory stays bounded by a row group rather than
+the corpus.
+
+Usage (from the src folder):
+    python chunk_news.py
+    python chunk_news.py --years 1937,1938 --workers 2
+    python chunk_news.py --chunk-chars 1200 --overlap-chars 200 --output /tmp/news.parquet
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from places import fold_accents
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_NEWS_DIR = "../data/elmundo_chunked_es_page1_40years"
+DEFAULT_OUTPUT = "../datasets/pai-personal-52ec7/travel_planner/data.parquet"
+DEFAULT_CHUNK_CHARS = 1000
+DEFAULT_OVERLAP_CHARS = 200
+DEFAULT_ROW_GROUP_SIZE = 2000
+MIN_CHUNK_CHARS = 80
+# A short line on this many pages of one year is masthead, not news
+REPEATED_LINE_MIN_PAGES = 3
+REPEATED_LINE_MAX_CHARS = 80
+MIN_LETTER_RATIO = 0.6
+
+NEWS_FILE_PATTERN = re.compile(r"^(\d{4})(\d{2})(\d{2})_(\d+)\.txt$")
+BOILERPLATE_PATTERNS = [re.compile(pattern) for pattern in (
+    r"^(diario de )?la manana$",
+    r"^diario de$",
+    r"^el m\w{2,3}do$",  # "el mundo" and its OCR variants ("el mondo", "el nando")
+    r"^elm\w{2,3}do$",
+    r"^san juan puerto rico$",
+    r"^excepto los domingos$",
+    r"^\w+ centavos$",
+    r"^compendio de noticias$",
+    r"^ano [ivxlc]+$",
+    r"^numero \d+$",
+    r"^\d+ secciones \d+ paginas",
+    r"^(published and distributed|entered as second class)",
+    r"^oficinas\b",
+    r"^p o box\b",
+)]
+SENTENCE_END_PATTERN = re.compile(r"(?<=[.!?»”\"])\s+(?=[¿¡“\"(]?[A-ZÁÉÍÓÚÑ])")
+ENTITY_PATTERN = re.compile(
+    r"\b[A-ZÁÉÍÓÚÑ][a-záéíóúñü]+(?:\s+(?:de|del|la|las|los|y)?\s*[A-ZÁÉÍÓÚÑ][a-záéíóúñü]+)+"
+)
+# Capitalized sentence openers that are not part of a name
+ENTITY_STOPWORDS = {"El", "La", "Los", "Las", "Un", "Una", "En", "Por", "Para", "Con", "Del", "Al", "Y", "Se", "Es"}
+
+SCHEMA = pa.schema([
+    ("chunk_id", pa.string()),
+    ("filename", pa.string()),
+    ("date", pa.string()),
+    ("year", pa.int32()),
+    ("page", pa.int32()),
+    ("chunk_index", pa.int32()),
+    ("text", pa.string()),
+    ("text_length", pa.int64()),
+    ("named_entities", pa.string()),
+    ("normalized_text", pa.string()),
+])
+
+
+# -------------------------
+# 1. Text Cleaning
+# -------------------------
+def fold_for_dedup(text):
+    """Accent-folded, lowercase text with punctuation removed, used for deduplication."""
+    return " ".join(re.sub(r"[^\w\s]", " ", fold_accents(text)).split())
+
+
+def letter_ratio(line):
+    visible = [c for c in line if not c.isspace()]
+    return sum(c.isalpha() for c in visible) / len(visible) if visible else 0.0
+
+
+def is_boilerplate(line, repeated=frozenset()):
+    normalized = fold_for_dedup(line)
+    if not normalized or normalized in repeated:
+        return True
+    if any(pattern.search(normalized) for pattern in BOILERPLATE_PATTERNS):
+        return True
+    # OCR debris from photos and ads: "rl I", "■ j KkM^' . ¿^9b ' ifl"
+    return len(normalized) < 20 and (letter_ratio(line) < MIN_LETTER_RATIO or len(normalized.split()) < 3)
+
+
+def extract_named_entities(text):
+    """Capitalized multi-word names ("Puerto Rico", "Federación Americana del Trabajo"), in order."""
+    entities = []
+    for match in ENTITY_PATTERN.finditer(text):
+        words = match.group(0).split()
+        while words and words[0] in ENTITY_STOPWORDS:
+            words.pop(0)
+        if len(words) > 1:
+            entities.append(" ".join(words))
+    return list(dict.fromkeys(entities))
+
+
+# -------------------------
+# 2. Chunking
+# -------------------------
+def read_paragraphs(path, repeated=frozenset()):
+    """Yield the non-boilerplate lines (paragraphs) of a page file."""
+    with open(path, "r", encoding="utf-8", errors="replace") as file:
+        for line in file:
+            line = " ".join(line.split())
+            if line and not is_boilerplate(line, repeated):
+                yield line
+
+
+def split_units(paragraph, max_chars):
+    """A paragraph as one unit, or as sentences (hard-wrapped if still too long)."""
+    if len(paragraph) <= max_chars:
+        yield paragraph
+        return
+    for sentence in SENTENCE_END_PATTERN.split(paragraph):
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            yield sentence[:cut]
+            sentence = sentence[cut:].lstrip()
+        if sentence:
+            yield sentence
+
+
+def chunk_paragraphs(paragraphs, max_chars=DEFAULT_CHUNK_CHARS, overlap_chars=DEFAULT_OVERLAP_CHARS):
+    """Pack paragraphs into chunks of at most `max_chars`, overlapping by whole trailing units."""
+    current, size, fresh = [], 0, 0
+    for paragraph in paragraphs:
+        for unit in split_units(paragraph, max_chars):
+            if current and size + 1 + len(unit) > max_chars:
+                if fresh:
+                    yield " ".join(current)
+                # Carry the trailing units that fit in the overlap into the next chunk
+                carried, carried_size = [], 0
+                room = min(overlap_chars, max_chars - len(unit) - 1)
+                for previous in reversed(current):
+                    if carried_size + len(previous) + 1 > room:
+                        break
+                    carried.insert(0, previous)
+                    carried_size += len(previous) + 1
+                current, size, fresh = carried, max(carried_size - 1, 0), 0
+            current.append(unit)
+            size += len(unit) + (1 if size else 0)
+            fresh += 1
+    if current and fresh:
+        yield " ".join(current)
+
+
+# -------------------------
+# 3. Per-year Workers
+# -------------------------
+def group_pages_by_year(news_dir, years=None):
+    groups = {}
+    for filename in sorted(os.listdir(news_dir)):
+        match = NEWS_FILE_PATTERN.match(filename)
+        if match and (not years or int(match.group(1)) in years):
+            groups.setdefault(int(match.group(1)), []).append(filename)
+    return groups
+
+
+def repeated_lines(news_dir, filenames):
+    """Short normalized lines that appear on several of the given pages."""
+    pages_with_line = Counter()
+    for filename in filenames:
+        with open(os.path.join(news_dir, filename), "r", encoding="utf-8", errors="replace") as file:
+            pages_with_line.update({
+                fold_for_dedup(line) for line in file
+                if 0 < len(line.strip()) <= REPEATED_LINE_MAX_CHARS
+            })
+    return frozenset(line for line, pages in pages_with_line.items() if pages >= REPEATED_LINE_MIN_PAGES)
+
+
+def chunk_year(news_dir, year, filenames, part_path, chunk_chars=DEFAULT_CHUNK_CHARS,
+               overlap_chars=DEFAULT_OVERLAP_CHARS, row_group_size=DEFAULT_ROW_GROUP_SIZE):
+    """Chunk one year's pages into `part_path`; return counts for the report."""
+    stats = {"year": year, "pages": 0, "chunks": 0, "duplicates": 0, "bytes_in": 0, "chars_out": 0}
+    repeated = repeated_lines(news_dir, filenames)
+    seen = set()
+    rows = {name: [] for name in SCHEMA.names}
+
+    with pq.ParquetWriter(part_path, SCHEMA) as writer:
+        for filename in filenames:
+            _, month, day, page = NEWS_FILE_PATTERN.match(filename).groups()
+            stats["pages"] += 1
+            stats["bytes_in"] += os.path.getsize(os.path.join(news_dir, filename))
+            chunk_index = 0
+            paragraphs = read_paragraphs(os.path.join(news_dir, filename), repeated)
+            for text in chunk_paragraphs(paragraphs, chunk_chars, overlap_chars):
+                if len(text) < MIN_CHUNK_CHARS:
+                    continue
+                normalized = fold_for_dedup(text)
+                digest = hashlib.blake2b(normalized.encode("utf-8"), digest_size=16).digest()
+                if digest in seen:
+                    stats["duplicates"] += 1
+                    continue
+                seen.add(digest)
+                stem = os.path.splitext(filename)[0]
+                row = {
+                    "chunk_id": f"{stem}-{chunk_index:04d}",
+                    "filename": filename,
+                    "date": f"{year}-{month}-{day}",
+                    "year": year,
+                    "page": int(page),
+                    "chunk_index": chunk_index,
+                    "text": text,
+                    "text_length": len(text),
+                    "named_entities": json.dumps(extract_named_entities(text), ensure_ascii=False),
+                    "normalized_text": normalized,
+                }
+                for name, value in row.items():
+                    rows[name].append(value)
+                chunk_index += 1
+                stats["chunks"] += 1
+                stats["chars_out"] += len(text)
+                if len(rows["chunk_id"]) >= row_group_size:
+                    writer.write_table(pa.table(rows, schema=SCHEMA))
+                    rows = {name: [] for name in SCHEMA.names}
+        if rows["chunk_id"]:
+            writer.write_table(pa.table(rows, schema=SCHEMA))
+    return stats
+
+
+# -------------------------
+# 4. Merge
+# -------------------------
+def merge_parts(part_paths, output, row_group_size=DEFAULT_ROW_GROUP_SIZE):
+    """Concatenate the part files, dropping chunks already seen in an earlier year."""
+    seen = set()
+    duplicates = 0
+    with pq.ParquetWriter(output, SCHEMA) as writer:
+        for part_path in part_paths:
+            part = pq.ParquetFile(part_path)
+            for batch in part.iter_batches(batch_size=row_group_size):
+                keep = []
+                for normalized in batch.column("normalized_text").to_pylist():
+                    digest = hashlib.blake2b(normalized.encode("utf-8"), digest_size=16).digest()
+                    keep.append(digest not in seen)
+                    seen.add(digest)
+                duplicates += keep.count(False)
+                table = pa.Table.from_batches([batch], schema=SCHEMA).filter(pa.array(keep))
+                if table.num_rows:
+                    writer.write_table(table)
+    return duplicates
+
+
+def chunk_news(news_dir=DEFAULT_NEWS_DIR, output=DEFAULT_OUTPUT, years=None, workers=None,
+               chunk_chars=DEFAULT_CHUNK_CHARS, overlap_chars=DEFAULT_OVERLAP_CHARS,
+               row_group_size=DEFAULT_ROW_GROUP_SIZE):
+    start = time.perf_counter()
+    groups = group_pages_by_year(news_dir, years)
+    if not groups:
+        logger.warning(f"No page files found in {news_dir}.")
+        return {}
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    parts_dir = tempfile.mkdtemp(prefix=".chunk_news_", dir=os.path.dirname(os.path.abspath(output)))
+    report = {"years": {}}
+    try:
+        part_paths = {year: os.path.join(parts_dir, f"part-{year}.parquet") for year in groups}
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(chunk_year, news_dir, year, filenames, part_paths[year],
+                                chunk_chars, overlap_chars, row_group_size)
+                for year, filenames in groups.items()
+            ]
+            for future in futures:
+                stats = future.result()
+                report["years"][stats["year"]] = stats
+                logger.info(f"{stats['year']}: {stats['pages']} pages -> {stats['chunks']} chunks "
+                            f"({stats['duplicates']} duplicates dropped).")
+        # Temporary name until complete, so readers never see a half-written table
+        partial = output + ".partial"
+        cross_year_duplicates = merge_parts([part_paths[year] for year in sorted(groups)], partial, row_group_size)
+        os.replace(partial, output)
+    finally:
+        shutil.rmtree(parts_dir, ignore_errors=True)
+
+    per_year = report.pop("years")
+    report = {
+        "pages": sum(stats["pages"] for stats in per_year.values()),
+        "chunks": sum(stats["chunks"] for stats in per_year.values()) - cross_year_duplicates,
+        "duplicates": sum(stats["duplicates"] for stats in per_year.values()) + cross_year_duplicates,
+        "bytes_in": sum(stats["bytes_in"] for stats in per_year.values()),
+        "chars_out": sum(stats["chars_out"] for stats in per_year.values()),
+        "years": len(per_year),
+        "output": output,
+        "seconds": round(time.perf_counter() - start, 2),
+    }
+    logger.info(f"Wrote {report['chunks']} chunks from {report['pages']} pages to {output} "
+                f"in {report['seconds']}s.")
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Chunk and deduplicate the El Mundo pages into a parquet table.")
+    parser.add_argument("--news-dir", default=DEFAULT_NEWS_DIR, help="folder with the El Mundo page files")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="parquet file to write")
+    parser.add_argument("--years", default=None, help="comma-separated years to chunk (default: all)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--chunk-chars", type=int, default=DEFAULT_CHUNK_CHARS, help="maximum characters per chunk")
+    parser.add_argument("--overlap-chars", type=int, default=DEFAULT_OVERLAP_CHARS,
+                        help="characters of whole sentences repeated from the previous chunk")
+    parser.add_argument("--row-group-size", type=int, default=DEFAULT_ROW_GROUP_SIZE)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s",
+                        datefmt="%Y-%m-%d %H:%M:%S")
+    years = {int(year) for year in args.years.split(",")} if args.years else None
+    report = chunk_news(args.news_dir, args.output, years, args.workers, args.chunk_chars,
+                        args.overlap_chars, args.row_group_size)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""Context assembly: normalize, deduplicate and pack retrieved chunks into a token budget.
+
+Retrieved documents are cleaned of the literal byte escapes left by scraping
+(`\\xc3\\xa1` -> `á`, see text_normalization.py), near-duplicates are
+dropped with 64-bit SimHash, and the highest-scoring chunks are packed until
+the budget is used up. Tokens are counted with tiktoken when it is
+available, otherwise approximated.
+"""
+import hashlib
+import logging
+import re
+
+from text_normalization import normalize_texts
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOKEN_BUDGET = 1500
+DEFAULT_MODEL = "gpt-4o"
+SIMHASH_BITS = 64
+NEAR_DUPLICATE_DISTANCE = 3
+MIN_TRUNCATED_TOKENS = 50
+
+APPROX_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+SHINGLE_PATTERN = re.compile(r"\w+")
+
+
+# -------------------------
+# 1. Token Counting
+# -------------------------
+class TokenCounter:
+    """Counts and truncates by tokens with tiktoken, or an approximation without it."""
+
+    def __init__(self, model=DEFAULT_MODEL):
+        self.encoding = None
+        try:
+            import tiktoken
+            try:
+                self.encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                self.encoding = tiktoken.get_encoding("o200k_base")
+        except Exception as e:
+            logger.warning(f"tiktoken unavailable ({e}); approximating token counts.")
+
+    def count(self, text):
+        if self.encoding is not None:
+            return len(self.encoding.encode(text))
+        return len(APPROX_TOKEN_PATTERN.findall(text))
+
+    def truncate(self, text, max_tokens):
+        if self.encoding is not None:
+            return self.encoding.decode(self.encoding.encode(text)[:max_tokens])
+        tokens = list(APPROX_TOKEN_PATTERN.finditer(text))
+        if len(tokens) <= max_tokens:
+            return text
+        return text[:tokens[max_tokens - 1].end()]
+
+
+_counters = {}
+
+
+def get_token_counter(model=DEFAULT_MODEL):
+    if model not in _counters:
+        _counters[model] = TokenCounter(model)
+    return _counters[model]
+
+
+# -------------------------
+# 2. Near-duplicate Detection
+# -------------------------
+def simhash(text, shingle_size=3):
+    words = SHINGLE_PATTERN.findall(text.lower())
+    shingles = [" ".join(words[i:i + shingle_size]) for i in range(max(1, len(words) - shingle_size + 1))]
+    weights = [0] * SIMHASH_BITS
+    for shingle in shingles:
+        value = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+
+# -------------------------
+# 3. Packing
+# -------------------------
+def chunks_from_results(results):
+    """Turn Chroma-shaped results into (score, id, text) chunks, higher score = better.
+
+    Uses fused scores when present (hybrid retrieval), otherwise converts
+    distances to similarities.
+    """
+    chunks = []
+    for name, docs in results.items():
+        if not docs or not docs.get("ids"):
+            continue
+        ids = docs["ids"][0]
+        documents = docs["documents"][0] if docs.get("documents") else [None] * len(ids)
+        if docs.get("scores"):
+            scores = docs["scores"][0]
+        elif docs.get("distances"):
+            scores = [1.0 / (1.0 + d) for d in docs["distances"][0]]
+        else:
+            scores = [1.0 / rank for rank in range(1, len(ids) + 1)]
+        for doc_id, document, score in zip(ids, documents, scores):
+            if document:
+                chunks.append((score, f"{name}:{doc_id}", str(document)))
+    return chunks
+
+
+def pack_context(chunks, token_budget=DEFAULT_TOKEN_BUDGET, model=DEFAULT_MODEL, truncate=True):
+    """Pack the best chunks into `token_budget` tokens.
+
+    `chunks` is a list of (score, id, text). Returns (texts, ids, report),
+    where the report says how many tokens and chunks were saved.
+    """
+    counter = get_token_counter(model)
+    report = {"chunks_in": len(chunks), "duplicates_removed": 0, "chunks_dropped": 0,
+              "tokens_in": 0, "tokens_out": 0}
+    texts, ids, fingerprints = [], [], []
+    remaining = token_budget
+
+    ranked = sorted(chunks, key=lambda chunk: chunk[0], reverse=True)
+    for (score, doc_id, raw), text in zip(ranked, normalize_texts([chunk[2] for chunk in ranked])):
+        report["tokens_in"] += counter.count(raw)
+        if not text:
+            continue
+        fingerprint = simhash(text)
+        if any(hamming_distance(fingerprint, seen) <= NEAR_DUPLICATE_DISTANCE for seen in fingerprints):
+            report["duplicates_removed"] += 1
+            continue
+        tokens = counter.count(text)
+        if tokens > remaining:
+            if not truncate or remaining < MIN_TRUNCATED_TOKENS:
+                report["chunks_dropped"] += 1
+                continue
+            text = counter.truncate(text, remaining)
+            tokens = counter.count(text)
+        fingerprints.append(fingerprint)
+        texts.append(text)
+        ids.append(doc_id)
+        remaining -= tokens
+        report["tokens_out"] += tokens
+
+    report["tokens_saved"] = report["tokens_in"] - report["tokens_out"]
+    logger.info(f"Context packed: {report}")
+    return texts, ids, report
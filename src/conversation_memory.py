@@ -0,0 +1,158 @@
+"""Bounded conversation memory: recent turns verbatim, older turns as a summary.
+
+Every request is built from the system prompt, a running summary of the
+older conversation, the last `keep_turns` exchanges verbatim, and the new
+question together with this turn's retrieved context. Context is never
+stored in the history, so it does not pile up across turns.
+
+When a turn falls out of the window it is folded into the summary by a
+background completion (ChatService.submit), so the user never waits for it.
+Until the fold finishes the turn is kept verbatim. The whole request is
+held under `token_ceiling` tokens: the recent turns may use what the
+question and summary leave over, minus a share kept for the context, and
+the oldest turns are dropped first when they do not fit. The context is
+packed into the rest.
+"""
+import logging
+import threading
+
+from context_budget import DEFAULT_MODEL, DEFAULT_TOKEN_BUDGET, get_token_counter, pack_context
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_KEEP_TURNS = 4
+DEFAULT_TOKEN_CEILING = 3000
+DEFAULT_SUMMARY_TOKENS = 200
+# Per-message overhead of the chat format (role and separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a conversation between a traveler and a Puerto Rico "
+    "travel planner assistant. Update the summary with the new exchanges. Keep the traveler's "
+    "plans, preferences, dates and the places already discussed; drop small talk. "
+    "Answer with the summary only, in at most {max_words} words."
+)
+
+
+class ConversationMemory:
+    def __init__(self, service, system_prompt, keep_turns=DEFAULT_KEEP_TURNS, token_ceiling=DEFAULT_TOKEN_CEILING,
+                 context_budget=DEFAULT_TOKEN_BUDGET, summary_tokens=DEFAULT_SUMMARY_TOKENS, model=DEFAULT_MODEL,
+                 summary_params=None):
+        self.service = service
+        self.system_prompt = system_prompt
+        self.keep_turns = keep_turns
+        self.token_ceiling = token_ceiling
+        self.context_budget = context_budget
+        self.summary_tokens = summary_tokens
+        self.counter = get_token_counter(model)
+        self.model = model
+        self.summary_params = summary_params or {"model": model, "temperature": 0.2, "max_tokens": summary_tokens}
+        self.summary = ""
+        self.turns = []  # (user, assistant) pairs not yet folded into the summary
+        self.summarized_turns = 0
+        self._pending = None
+        self._lock = threading.RLock()  # a finished summary may fold inside add_turn()
+
+    # -------------------------
+    # 1. Request Assembly
+    # -------------------------
+    def _tokens(self, message):
+        return self.counter.count(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+
+    def build_messages(self, user_input, chunks=()):
+        """Messages for the next request, and the ids of the context chunks used.
+
+        `chunks` are (score, id, text) tuples, see context_budget.chunks_from_results.
+        """
+        with self._lock:
+            summary, turns = self.summary, list(self.turns)
+
+        system = self.system_prompt
+        if summary:
+            system += f"\n\nSummary of the earlier conversation:\n{summary}"
+        head = [{"role": "system", "content": system}]
+        question = {"role": "user", "content": user_input}
+        fixed = sum(self._tokens(message) for message in head + [question])
+        room = self.token_ceiling - fixed
+        # History may not take the half of the room kept for this turn's context
+        context_reserve = min(self.context_budget, room // 2) if chunks else 0
+
+        # Newest turns first, until the history allowance is used up
+        history, history_tokens = [], 0
+        for user, assistant in reversed(turns):
+            pair = [{"role": "user", "content": user}, {"role": "assistant", "content": assistant}]
+            tokens = sum(self._tokens(message) for message in pair)
+            if history_tokens + tokens > room - context_reserve:
+                logger.info(f"Dropped {len(turns) - len(history) // 2} older turns to stay under "
+                            f"{self.token_ceiling} tokens.")
+                break
+            history[:0] = pair
+            history_tokens += tokens
+
+        context_ids = []
+        budget = min(self.context_budget, room - history_tokens - MESSAGE_OVERHEAD_TOKENS)  # the header line
+        if chunks and budget > 0:
+            texts, context_ids, _ = pack_context(list(chunks), budget, model=self.model)
+            if texts:
+                question = {"role": "user", "content": f"{user_input}\n\nRelevant information:\n" + "\n".join(texts)}
+        if room < 0:
+            logger.warning(f"The question and summary alone take {fixed} tokens, above the "
+                           f"{self.token_ceiling} ceiling.")
+        return head + history + [question], context_ids
+
+    # -------------------------
+    # 2. Rolling Summary
+    # -------------------------
+    def add_turn(self, user_input, reply):
+        """Record a finished exchange; fold turns beyond the window in the background."""
+        with self._lock:
+            self.turns.append((user_input, reply))
+            self._maybe_summarize()
+
+    def _maybe_summarize(self):
+        if self._pending is not None or len(self.turns) <= self.keep_turns:
+            return
+        folded = self.turns[:len(self.turns) - self.keep_turns]
+        transcript = "\n".join(f"Traveler: {user}\nAssistant: {assistant}" for user, assistant in folded)
+        messages = [
+            {"role": "system", "content": SUMMARY_PROMPT.format(max_words=int(self.summary_tokens * 0.7))},
+            {"role": "user", "content": f"Current summary:\n{self.summary or '(none)'}\n\nNew exchanges:\n{transcript}"},
+        ]
+        try:
+            self._pending = self.service.submit(messages, **self.summary_params)
+        except Exception as e:
+            logger.error(f"Could not start the conversation summary: {e}")
+            return
+        self._pending.add_done_callback(lambda future: self._fold(future, len(folded)))
+
+    def _fold(self, future, count):
+        with self._lock:
+            self._pending = None
+            try:
+                summary = future.result()
+            except Exception as e:
+                # Keep the turns verbatim; the next turn tries again
+                logger.warning(f"Conversation summary failed, keeping {count} turns verbatim: {e}")
+                return
+            self.summary = self.counter.truncate((summary or "").strip(), self.summary_tokens)
+            del self.turns[:count]
+            self.summarized_turns += count
+            logger.info(f"Folded {count} turns into the conversation summary ({self.summarized_turns} in total).")
+            self._maybe_summarize()
+
+    def wait(self, timeout=None):
+        """Block until a running summary finishes (for scripts and benchmarks)."""
+        pending = self._pending
+        if pending is not None:
+            try:
+                pending.result(timeout)
+            except Exception:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                "verbatim_turns": len(self.turns),
+                "summarized_turns": self.summarized_turns,
+                "summary_tokens": self.counter.count(self.summary) if self.summary else 0,
+                "summarizing": self._pending is not None,
+            }
@@ -0,0 +1,324 @@
+"""Pluggable embedding backends, plus a cached, micro-batched query embedder.
+
+`EMBEDDING_BACKEND` selects the model used both by build_index.py and at
+query time:
+
+- `default`: Chroma's built-in all-MiniLM-L6-v2 (English only),
+- `onnx`: a local multilingual sentence-transformers model exported to
+  ONNX (e.g. paraphrase-multilingual-MiniLM-L12-v2), run on the CPU with
+  int8 weights. The Spanish news and the English landmarks share one vector
+  space and no network call is made,
+- `openai`: OpenAI's embedding API (`EMBEDDING_OPENAI_MODEL`).
+
+The collections must be indexed with the backend that queries them; the
+model id is stored in the collection metadata (see build_index.py).
+
+The `onnx` model folder holds `model.onnx` and `tokenizer.json`. An int8
+copy (`model_int8.onnx`) is made on first load when onnxruntime's
+quantization tools (and the `onnx` package) are installed.
+
+Query time goes through `QueryEmbedder`: repeated questions are served from
+an LRU cache, and concurrent misses are embedded together in one model call.
+
+Usage (from the src folder):
+    EMBEDDING_BACKEND=onnx python embeddings.py            # load, quantize, time a few queries
+    python embeddings.py --backend onnx --model-dir ../models/multilingual-minilm
+"""
+import argparse
+import logging
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("default", "onnx", "openai")
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "default")
+EMBEDDING_MODEL_DIR = os.getenv("EMBEDDING_MODEL_DIR", "../models/paraphrase-multilingual-MiniLM-L12-v2")
+EMBEDDING_OPENAI_MODEL = os.getenv("EMBEDDING_OPENAI_MODEL", "text-embedding-3-small")
+# 0 lets ONNX Runtime use every core; a Streamlit server shares them with other work
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))
+DEFAULT_MODEL_ID = "default:all-MiniLM-L6-v2"
+
+DEFAULT_MAX_LENGTH = 128
+DEFAULT_BATCH_SIZE = 32
+DEFAULT_CACHE_SIZE = 1024
+DEFAULT_MAX_WAIT_MS = 2.0
+
+
+# -------------------------
+# 1. Local ONNX Sentence Model
+# -------------------------
+class OnnxSentenceEmbedding:
+    """Mean-pooled, L2-normalized sentence embeddings from an ONNX transformer.
+
+    Callable like a Chroma embedding function: a list of texts in, a list of
+    float32 vectors out. Texts are sorted by length before batching so each
+    batch is padded only to its own longest text.
+    """
+
+    def __init__(self, model_dir=EMBEDDING_MODEL_DIR, quantize=True, max_length=DEFAULT_MAX_LENGTH,
+                 batch_size=DEFAULT_BATCH_SIZE, intra_op_threads=EMBEDDING_THREADS, inter_op_threads=1):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        self.model_dir = model_dir
+        self.batch_size = batch_size
+        self.model_path = self._model_path(quantize)
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        pad_token = "<pad>" if self.tokenizer.token_to_id("<pad>") is not None else "[PAD]"
+        self.tokenizer.enable_padding(pad_id=self.tokenizer.token_to_id(pad_token) or 0, pad_token=pad_token)
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = inter_op_threads
+        options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(self.model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+        logger.info(f"ONNX embedding model loaded from {self.model_path} "
+                    f"({intra_op_threads or 'all'} intra-op threads).")
+
+    @property
+    def model_id(self):
+        precision = "int8" if self.model_path.endswith("_int8.onnx") else "fp32"
+        return f"onnx:{os.path.basename(os.path.normpath(self.model_dir))}:{precision}"
+
+    def _model_path(self, quantize):
+        fp32_path = os.path.join(self.model_dir, "model.onnx")
+        int8_path = os.path.join(self.model_dir, "model_int8.onnx")
+        if not quantize or os.path.exists(int8_path):
+            return int8_path if quantize else fp32_path
+        # Quantize to a temporary name so a failed run never leaves a broken int8 model behind
+        start = time.perf_counter()
+        partial_path = f"{int8_path}.{os.getpid()}.partial"
+        try:
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            quantize_dynamic(fp32_path, partial_path, weight_type=QuantType.QInt8)
+            os.replace(partial_path, int8_path)
+        except Exception as e:
+            logger.warning(f"Cannot quantize {fp32_path} ({e}); using the fp32 model.")
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            return fp32_path
+        logger.info(f"Quantized {fp32_path} to int8 in {time.perf_counter() - start:.1f}s.")
+        return int8_path
+
+    def __call__(self, input):
+        texts = list(input)
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        embeddings = [None] * len(texts)
+        for offset in range(0, len(order), self.batch_size):
+            batch = order[offset:offset + self.batch_size]
+            for i, vector in zip(batch, self._embed_batch([texts[i] for i in batch])):
+                embeddings[i] = vector
+        return embeddings
+
+    def _embed_batch(self, texts):
+        encoded = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encoded], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encoded], dtype=np.int64)
+        feed = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feed["token_type_ids"] = np.zeros_like(input_ids)
+        last_hidden_state = self.session.run(None, feed)[0]
+        mask = attention_mask[:, :, None].astype(np.float32)
+        pooled = (last_hidden_state * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return list(pooled.astype(np.float32))
+
+
+def create_embedding_function(backend=EMBEDDING_BACKEND, **kwargs):
+    """Build the embedding function for `backend` (one of BACKENDS)."""
+    if backend == "onnx":
+        return OnnxSentenceEmbedding(**kwargs)
+    if backend == "openai":
+        from chromadb.utils.embedding_functions import OpenAIEmbeddingFunction
+
+        function = OpenAIEmbeddingFunction(api_key=os.getenv("OPENAI_API_KEY"),
+                                           model_name=kwargs.get("model_name", EMBEDDING_OPENAI_MODEL))
+        function.model_id = f"openai:{kwargs.get('model_name', EMBEDDING_OPENAI_MODEL)}"
+        return function
+    if backend == "default":
+        from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
+
+        return DefaultEmbeddingFunction()
+    raise ValueError(f"Unknown embedding backend {backend!r}; expected one of {', '.join(BACKENDS)}.")
+
+
+def embedding_model_id(embedding_function):
+    """Identifier stored with a collection, so a backend switch can be detected."""
+    return getattr(embedding_function, "model_id", DEFAULT_MODEL_ID)
+
+
+# -------------------------
+# 2. Cached, Micro-batched Query Embedding
+# -------------------------
+class QueryEmbedder:
+    """Embeds single queries through an LRU cache and a batching worker thread.
+
+    A miss is queued; the worker takes the first waiting query, collects any
+    others that arrive within `max_wait_ms` (up to `max_batch_size`), and
+    embeds them in a single call, so concurrent sessions share one model run.
+    """
+
+    def __init__(self, embedding_function, cache_size=DEFAULT_CACHE_SIZE, max_batch_size=DEFAULT_BATCH_SIZE,
+                 max_wait_ms=DEFAULT_MAX_WAIT_MS):
+        self.embedding_function = embedding_function
+        self.cache_size = cache_size
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self.hits = 0
+        self.misses = 0
+        self.batches = 0
+        self.batched_queries = 0
+        self.max_batch_seen = 0
+        self._worker = threading.Thread(target=self._run, name="query-embedder", daemon=True)
+        self._worker.start()
+
+    def embed(self, query):
+        key = " ".join(query.split())
+        with self._lock:
+            embedding = self._cache.get(key)
+            if embedding is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return embedding
+            self.misses += 1
+        future = Future()
+        self._queue.put((key, future))
+        embedding = future.result()
+        with self._lock:
+            self._cache[key] = embedding
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return embedding
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)  # finish this batch, then stop
+                    break
+                batch.append(item)
+            self._embed_batch(batch)
+
+    def _embed_batch(self, batch):
+        texts = list(dict.fromkeys(key for key, _ in batch))
+        try:
+            vectors = dict(zip(texts, self.embedding_function(texts)))
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for key, future in batch:
+            future.set_result(vectors[key])
+        with self._lock:
+            self.batches += 1
+            self.batched_queries += len(batch)
+            self.max_batch_seen = max(self.max_batch_seen, len(batch))
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "cached": len(self._cache),
+                "batches": self.batches,
+                "avg_batch_size": round(self.batched_queries / self.batches, 2) if self.batches else 0.0,
+                "max_batch_seen": self.max_batch_seen,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def close(self):
+        self._queue.put(None)
+        self._worker.join(timeout=5)
+
+
+_embedding_function = None
+_query_embedder = None
+_init_lock = threading.Lock()
+
+
+def get_embedding_function():
+    """Return the process-wide embedding function of the configured backend."""
+    global _embedding_function
+    with _init_lock:
+        if _embedding_function is None:
+            _embedding_function = create_embedding_function()
+            logger.info(f"Embedding function initialized ({embedding_model_id(_embedding_function)}).")
+        return _embedding_function
+
+
+def get_query_embedder(**kwargs):
+    """Return the process-wide QueryEmbedder over get_embedding_function()."""
+    global _query_embedder
+    embedding_function = get_embedding_function()
+    with _init_lock:
+        if _query_embedder is None:
+            _query_embedder = QueryEmbedder(embedding_function, **kwargs)
+        return _query_embedder
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load an embedding backend and time a few queries.")
+    parser.add_argument("--backend", choices=BACKENDS, default=EMBEDDING_BACKEND)
+    parser.add_argument("--model-dir", default=EMBEDDING_MODEL_DIR, help="ONNX model folder (onnx backend)")
+    parser.add_argument("--no-quantize", action="store_true", help="run the fp32 ONNX model")
+    parser.add_argument("--threads", type=int, default=EMBEDDING_THREADS, help="ONNX intra-op threads (0 = all)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s",
+                        datefmt="%Y-%m-%d %H:%M:%S")
+    kwargs = {}
+    if args.backend == "onnx":
+        kwargs = {"model_dir": args.model_dir, "quantize": not args.no_quantize, "intra_op_threads": args.threads}
+    start = time.perf_counter()
+    embedding_function = create_embedding_function(args.backend, **kwargs)
+    logger.info(f"{embedding_model_id(embedding_function)} loaded in {time.perf_counter() - start:.2f}s.")
+
+    queries = ["Best beaches near Rincón", "¿Qué hacer en el Viejo San Juan?", "El Yunque hiking trails",
+               "Historia de Ponce", "Where can I see bioluminescent bays?"]
+    embedding_function(queries[:1])  # first call pays for lazy initialization
+    start = time.perf_counter()
+    for query in queries:
+        embedding_function([query])
+    single_ms = (time.perf_counter() - start) * 1000 / len(queries)
+    start = time.perf_counter()
+    vectors = embedding_function(queries)
+    batch_ms = (time.perf_counter() - start) * 1000 / len(queries)
+    logger.info(f"dimension {len(vectors[0])}: {single_ms:.1f} ms/query one at a time, "
+                f"{batch_ms:.1f} ms/query batched.")
+
+
+if __name__ == "__main__":
+    main()
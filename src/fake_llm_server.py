@@ -0,0 +1,143 @@
+"""Local stand-in for the OpenAI chat completions endpoint.
+
+Answers POST /v1/chat/completions (plain and streamed) after a configurable
+delay, and can answer a share of requests with 429 to exercise retries and
+backpressure without spending API credits.
+
+Usage (from the src folder):
+    python fake_llm_server.py --port 8001 --latency 0.5 --rate-limit 0.2
+    OPENAI_BASE_URL=http://localhost:8001/v1 OPENAI_API_KEY=fake streamlit run app3_dan.py
+"""
+import argparse
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REPLY = "Visit El Yunque in the morning, then drive to Luquillo beach for lunch at the kioskos."
+
+
+def completion_chunks(reply):
+    """Split the reply into word-sized tokens, like a streamed completion."""
+    words = reply.split(" ")
+    return [word + (" " if i < len(words) - 1 else "") for i, word in enumerate(words)]
+
+
+class FakeCompletionHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            server.last_request = request
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        try:
+            if random.random() < server.rate_limit:
+                with server.lock:
+                    server.rate_limited += 1
+                self._send_json(429, {"error": {"message": "Rate limit reached", "type": "rate_limit_error"}},
+                                {"Retry-After": str(server.retry_after)})
+                return
+            time.sleep(server.latency)
+            completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+            model = request.get("model", "fake")
+            if request.get("stream"):
+                self._stream(completion_id, model, server.reply)
+            else:
+                self._send_json(200, {
+                    "id": completion_id,
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": server.reply}}],
+                    "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+                })
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def _stream(self, completion_id, model, reply):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        for token in completion_chunks(reply) + [None]:
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": token} if token else {},
+                             "finish_reason": None if token else "stop"}],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+
+def make_server(host="127.0.0.1", port=8001, latency=0.2, rate_limit=0.0, retry_after=0.1, reply=DEFAULT_REPLY):
+    """Build (but do not start) a fake server; `port=0` picks a free port."""
+    server = ThreadingHTTPServer((host, port), FakeCompletionHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.rate_limit = rate_limit
+    server.retry_after = retry_after
+    server.reply = reply
+    server.lock = threading.Lock()
+    server.requests = server.in_flight = server.max_in_flight = server.rate_limited = 0
+    server.last_request = None
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fake OpenAI chat completions server for local testing.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds before each reply")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="share of requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=0.1, help="Retry-After sent with 429s")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s",
+                        datefmt="%Y-%m-%d %H:%M:%S")
+    server = make_server(args.host, args.port, args.latency, args.rate_limit, args.retry_after)
+    logger.info(f"Fake completion server on http://{args.host}:{server.server_port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        logger.info(f"Served {server.requests} requests ({server.rate_limited} rate limited, "
+                    f"max {server.max_in_flight} in flight).")
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
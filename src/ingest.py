@@ -0,0 +1,283 @@
+"""Parallel, incremental HTML-to-JSON ingestion for landmarks and municipalities.
+
+Builds the same `landmarks.json` / `municipalities.json` files as the
+notebook code in setup.py, but:
+
+- parses the pages across a process pool,
+- stops parsing each page once the title and the first paragraphs are found,
+- keeps a manifest of content hashes so only new or changed files are parsed.
+
+Usage (from the src folder):
+    python ingest.py --source ../data --output ../data
+    python ingest.py --only landmarks --workers 4
+    python ingest.py --force
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from html.parser import HTMLParser
+
+from text_normalization import normalize_text, normalize_texts
+
+logger = logging.getLogger(__name__)
+
+CATEGORIES = {
+    "municipalities": "Municipality",
+    "landmarks": "Landmark",
+}
+MANIFEST_NAME = ".ingest_manifest.json"
+# Bump when the record format changes so cached records are rebuilt
+# (2: escaped bytes are decoded instead of removed)
+PARSER_VERSION = 2
+MAX_PARAGRAPHS = 3
+FEED_CHUNK_SIZE = 64 * 1024
+SKIPPED_TAGS = {"style", "script", "template"}
+
+COORDINATES_PATTERN = re.compile(
+    r'"wgCoordinates":\s*\{\s*"lat":\s*(-?\d+\.\d+),\s*"lon":\s*(-?\d+\.\d+)\s*\}'
+)
+MUNICIPALITY_PATTERN = re.compile(r"Municipality of\s+([A-Za-z\s]+)")
+
+
+# -------------------------
+# 1. Coordinates
+# -------------------------
+def extract_coordinates(html_content):
+    match = COORDINATES_PATTERN.search(html_content)
+    if match:
+        return float(match.group(1)), float(match.group(2))
+    return None, None
+
+
+# -------------------------
+# 2. Early-stopping Page Parser
+# -------------------------
+class _StopParsing(Exception):
+    pass
+
+
+class PageParser(HTMLParser):
+    """Collects the <title> and the first `max_paragraphs` <p> texts.
+
+    Text inside a paragraph is stripped piece by piece and concatenated, like
+    BeautifulSoup's get_text(strip=True), skipping <style>/<script> content.
+    Raises _StopParsing as soon as enough paragraphs have been seen, so the
+    rest of the page is never parsed.
+    """
+
+    def __init__(self, max_paragraphs=MAX_PARAGRAPHS):
+        super().__init__(convert_charrefs=True)
+        self.max_paragraphs = max_paragraphs
+        self.title = None
+        self.paragraphs = []
+        self._in_title = False
+        self._title_parts = []
+        self._paragraph_depth = 0
+        self._paragraph_parts = []
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIPPED_TAGS:
+            self._skip_depth += 1
+        elif tag == "title" and self.title is None:
+            self._in_title = True
+        elif tag == "p":
+            if self._paragraph_depth:
+                self._close_paragraph()
+            self._paragraph_depth = 1
+
+    def handle_endtag(self, tag):
+        if tag in SKIPPED_TAGS:
+            self._skip_depth = max(self._skip_depth - 1, 0)
+        elif tag == "title" and self._in_title:
+            self._in_title = False
+            self.title = "".join(self._title_parts)
+        elif tag == "p" and self._paragraph_depth:
+            self._close_paragraph()
+
+    def handle_data(self, data):
+        if self._in_title:
+            self._title_parts.append(data)
+        elif self._paragraph_depth and not self._skip_depth:
+            stripped = data.strip()
+            if stripped:
+                self._paragraph_parts.append(stripped)
+
+    def _close_paragraph(self):
+        self.paragraphs.append("".join(self._paragraph_parts))
+        self._paragraph_parts = []
+        self._paragraph_depth = 0
+        if len(self.paragraphs) >= self.max_paragraphs:
+            raise _StopParsing()
+
+
+def parse_html(html_content, max_paragraphs=MAX_PARAGRAPHS):
+    parser = PageParser(max_paragraphs)
+    try:
+        for start in range(0, len(html_content), FEED_CHUNK_SIZE):
+            parser.feed(html_content[start:start + FEED_CHUNK_SIZE])
+        parser.close()
+    except _StopParsing:
+        pass
+    return parser.title, parser.paragraphs
+
+
+# -------------------------
+# 3. Record Builders
+# -------------------------
+def build_record(file_path, category):
+    filename = os.path.basename(file_path)
+    with open(file_path, "r", encoding="utf-8") as file:
+        html_content = file.read()
+
+    title, paragraphs = parse_html(html_content)
+    # Title and paragraphs are normalized together, as one batch
+    title, *paragraphs = normalize_texts([title if title else filename.replace(".txt", "")] + paragraphs)
+    title = title.replace(" - Wikipedia", "")
+    latitude, longitude = extract_coordinates(html_content)
+
+    if category == "municipalities":
+        return {
+            "name": title,
+            "category": CATEGORIES[category],
+            "description": paragraphs,
+            "coordinates": {"latitude": latitude, "longitude": longitude},
+            "source_file": filename,
+        }
+
+    municipality = None
+    if "municipality" in html_content.lower():
+        municipality_match = MUNICIPALITY_PATTERN.search(html_content)
+        if municipality_match:
+            municipality = normalize_text(municipality_match.group(1))
+    return {
+        "name": title,
+        "category": CATEGORIES[category],
+        "description": paragraphs,
+        "coordinates": {"latitude": latitude, "longitude": longitude} if latitude and longitude else None,
+        "municipality": municipality,
+        "source_file": filename,
+    }
+
+
+def _build_record_task(args):
+    file_path, category = args
+    return build_record(file_path, category)
+
+
+# -------------------------
+# 4. Incremental Manifest
+# -------------------------
+def file_sha256(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(path):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, json.JSONDecodeError) as e:
+        logger.warning(f"Ignoring unreadable manifest {path}: {e}")
+        return {}
+
+
+def save_manifest(path, manifest):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(manifest, file, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def plan_category(folder, previous_entries, force=False):
+    """Split the folder's files into unchanged entries and files to (re)parse.
+
+    Size and mtime are checked first so unchanged files are not even hashed.
+    """
+    unchanged, to_parse = {}, {}
+    for filename in sorted(os.listdir(folder)):
+        if not filename.endswith(".txt"):
+            continue
+        file_path = os.path.join(folder, filename)
+        stat = os.stat(file_path)
+        entry = previous_entries.get(filename)
+        if not force and entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            unchanged[filename] = entry
+            continue
+        sha256 = file_sha256(file_path)
+        if not force and entry and entry["sha256"] == sha256:
+            unchanged[filename] = dict(entry, size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+            continue
+        to_parse[filename] = {"sha256": sha256, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    return unchanged, to_parse
+
+
+# -------------------------
+# 5. Pipeline
+# -------------------------
+def ingest(source_dir, output_dir, categories=tuple(CATEGORIES), workers=None, force=False):
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    manifest = load_manifest(manifest_path)
+    if manifest.get("parser_version") != PARSER_VERSION:
+        manifest = {"parser_version": PARSER_VERSION}
+    stats = {}
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for category in categories:
+            start = time.perf_counter()
+            folder = os.path.join(source_dir, category)
+            unchanged, to_parse = plan_category(folder, manifest.get(category, {}), force)
+
+            tasks = [(os.path.join(folder, filename), category) for filename in to_parse]
+            records = executor.map(_build_record_task, tasks, chunksize=8)
+            for filename, record in zip(to_parse, records):
+                to_parse[filename]["record"] = record
+
+            entries = {**unchanged, **to_parse}
+            removed = set(manifest.get(category, {})) - set(entries)
+            manifest[category] = entries
+            output_json = os.path.join(output_dir, f"{category}.json")
+            if to_parse or removed or not os.path.exists(output_json):
+                data = [entries[filename]["record"] for filename in sorted(entries)]
+                with open(output_json, "w", encoding="utf-8") as json_file:
+                    json.dump(data, json_file, indent=4, ensure_ascii=False)
+
+            stats[category] = {
+                "files": len(entries),
+                "parsed": len(to_parse),
+                "skipped": len(unchanged),
+                "seconds": round(time.perf_counter() - start, 2),
+            }
+            logger.info(f"{category}: {stats[category]} -> {output_json}")
+
+    save_manifest(manifest_path, manifest)
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build landmarks.json and municipalities.json from the raw HTML pages.")
+    parser.add_argument("--source", default="../data", help="folder containing the municipalities/ and landmarks/ folders")
+    parser.add_argument("--output", default="../data", help="folder for the JSON files and the manifest")
+    parser.add_argument("--only", choices=sorted(CATEGORIES), action="append", help="ingest only this category (repeatable)")
+    parser.add_argument("--workers", type=int, default=None, help="number of parser processes (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="re-parse every file, ignoring the manifest")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s",
+                        datefmt="%Y-%m-%d %H:%M:%S")
+    stats = ingest(args.source, args.output, tuple(args.only or CATEGORIES), args.workers, args.force)
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
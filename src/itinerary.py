@@ -0,0 +1,232 @@
+"""Local multi-stop itinerary optimizer.
+
+Orders a set of stops from a start point using a haversine distance matrix:
+nearest-neighbour construction, then 2-opt and Or-opt improvement until no
+move shortens the route. The route is then split into days by a time budget.
+Everything runs locally, so no routing API is called per permutation.
+
+Stop-to-stop distances are read from the precomputed POI matrix
+(poi_distances.py) when it is passed in; only the start row is computed.
+"""
+from functools import lru_cache
+
+import numpy as np
+
+from spatial import haversine_km
+
+# Straight-line distances underestimate roads, especially in the mountains.
+DEFAULT_ROAD_FACTOR = 1.3
+DEFAULT_SPEED_KMH = 40.0
+DEFAULT_VISIT_MINUTES = 60.0
+DEFAULT_DAY_MINUTES = 8 * 60.0
+MAX_IMPROVEMENT_ROUNDS = 100
+
+
+# -------------------------
+# 1. Distance Matrix and Route Cost
+# -------------------------
+def distance_matrix(points):
+    """Haversine distances (km) between every pair of (latitude, longitude) points."""
+    n = len(points)
+    matrix = [[0.0] * n for _ in range(n)]
+    for i in range(n):
+        for j in range(i + 1, n):
+            d = haversine_km(points[i][0], points[i][1], points[j][0], points[j][1])
+            matrix[i][j] = matrix[j][i] = d
+    return matrix
+
+
+def stops_matrix(points, stop_ids, distances):
+    """distance_matrix(points), with the stop-to-stop block read from a poi_distances.DistanceMatrix.
+
+    points[0] is the start; points[1:] are the stops named by `stop_ids`.
+    """
+    positions = [distances.position[stop_id] for stop_id in stop_ids]
+    block = distances.matrix[np.ix_(positions, positions)].astype(np.float64).tolist()
+    start = points[0]
+    first = [0.0] + [haversine_km(start[0], start[1], lat, lon) for lat, lon in points[1:]]
+    return [first] + [[first[i + 1]] + row for i, row in enumerate(block)]
+
+
+def route_length(route, matrix):
+    return sum(matrix[a][b] for a, b in zip(route, route[1:]))
+
+
+# -------------------------
+# 2. Construction and Improvement
+# -------------------------
+def nearest_neighbour_route(matrix, start=0):
+    unvisited = set(range(len(matrix))) - {start}
+    route = [start]
+    while unvisited:
+        last = route[-1]
+        nearest = min(unvisited, key=lambda i: matrix[last][i])
+        route.append(nearest)
+        unvisited.remove(nearest)
+    return route
+
+
+def two_opt(route, matrix, fixed_end=False):
+    """Reverse segments while that shortens the route. route[0] never moves;
+    route[-1] stays put as well when `fixed_end` (round trips)."""
+    route = list(route)
+    last = len(route) - 1 if fixed_end else len(route)
+    for _ in range(MAX_IMPROVEMENT_ROUNDS):
+        improved = False
+        for i in range(1, last - 1):
+            for j in range(i + 1, last):
+                a, b, c = route[i - 1], route[i], route[j]
+                before = matrix[a][b]
+                after = matrix[a][c]
+                if j + 1 < len(route):
+                    d = route[j + 1]
+                    before += matrix[c][d]
+                    after += matrix[b][d]
+                if after < before - 1e-9:
+                    route[i:j + 1] = reversed(route[i:j + 1])
+                    improved = True
+        if not improved:
+            break
+    return route
+
+
+def or_opt(route, matrix, fixed_end=False, max_segment=3):
+    """Move runs of 1..max_segment consecutive stops elsewhere while that helps.
+
+    Like two_opt, a move is scored by the edges it changes: the ones around
+    the segment, the one closing the gap and the ones at the new position.
+    """
+    route = list(route)
+    last = len(route) - 1 if fixed_end else len(route)
+    for _ in range(MAX_IMPROVEMENT_ROUNDS):
+        improved = False
+        for length in range(1, max_segment + 1):
+            for i in range(1, last - length + 1):
+                j = i + length  # first stop after the segment
+                first, end = route[i], route[j - 1]
+                before = route[i - 1]
+                removed = matrix[before][first]
+                if j < len(route):
+                    removed += matrix[end][route[j]] - matrix[before][route[j]]
+                rest = route[:i] + route[j:]
+                for k in range(1, last - length + 1):
+                    if k == i:
+                        continue
+                    a = rest[k - 1]
+                    added = matrix[a][first]
+                    if k < len(rest):
+                        b = rest[k]
+                        added += matrix[end][b] - matrix[a][b]
+                    if added < removed - 1e-9:
+                        route = rest[:k] + route[i:j] + rest[k:]
+                        improved = True
+                        break
+                if improved:
+                    break
+            if improved:
+                break
+        if not improved:
+            break
+    return route
+
+
+def optimize_route(matrix, return_to_start=False):
+    """Near-optimal visiting order of all points, starting at index 0."""
+    if len(matrix) <= 2:
+        route = list(range(len(matrix)))
+    else:
+        route = nearest_neighbour_route(matrix)
+        route = two_opt(route, matrix)
+    if return_to_start:
+        route = route + [0]
+    if len(route) > 3:
+        for _ in range(MAX_IMPROVEMENT_ROUNDS):
+            length = route_length(route, matrix)
+            route = or_opt(two_opt(route, matrix, return_to_start), matrix, return_to_start)
+            if route_length(route, matrix) >= length - 1e-9:
+                break
+    return route
+
+
+# -------------------------
+# 3. Day Splitting
+# -------------------------
+def travel_minutes(distance_km, speed_kmh=DEFAULT_SPEED_KMH, road_factor=DEFAULT_ROAD_FACTOR):
+    return distance_km * road_factor / speed_kmh * 60
+
+
+def split_into_days(route, matrix, visit_minutes=DEFAULT_VISIT_MINUTES, day_minutes=DEFAULT_DAY_MINUTES,
+                    speed_kmh=DEFAULT_SPEED_KMH, road_factor=DEFAULT_ROAD_FACTOR):
+    """Greedily cut the route into days of at most `day_minutes`.
+
+    Each stop costs the drive from the previous point plus `visit_minutes`;
+    a new day starts from the last stop of the previous day. A single stop
+    that does not fit in a day on its own still gets its own day.
+    """
+    days, current, used = [], [], 0.0
+    for previous, stop in zip(route, route[1:]):
+        drive = travel_minutes(matrix[previous][stop], speed_kmh, road_factor)
+        is_return = stop == route[0]
+        cost = drive + (0 if is_return else visit_minutes)
+        if current and used + cost > day_minutes:
+            days.append({"stops": current, "minutes": round(used, 1)})
+            current, used = [], 0.0
+        current.append({"index": stop, "drive_minutes": round(drive, 1), "distance_km": round(matrix[previous][stop], 3)})
+        used += cost
+    if current:
+        days.append({"stops": current, "minutes": round(used, 1)})
+    return days
+
+
+# -------------------------
+# 4. Planner
+# -------------------------
+@lru_cache(maxsize=512)
+def _plan(points, return_to_start, visit_minutes, day_minutes, speed_kmh, stop_ids=None, distances=None):
+    matrix = stops_matrix(points, stop_ids, distances) if distances is not None else distance_matrix(points)
+    route = optimize_route(matrix, return_to_start)
+    days = split_into_days(route, matrix, visit_minutes, day_minutes, speed_kmh)
+    return route, route_length(route, matrix), days
+
+
+def plan_itinerary(start, stops, return_to_start=False, visit_minutes=DEFAULT_VISIT_MINUTES,
+                   day_minutes=DEFAULT_DAY_MINUTES, speed_kmh=DEFAULT_SPEED_KMH, distances=None):
+    """Order `stops` from `start` and split the trip into days.
+
+    `start` is (latitude, longitude); `stops` is a list of (id, latitude,
+    longitude). With `distances` (a poi_distances.DistanceMatrix) that knows
+    every stop id, stop-to-stop distances come from it. Results are cached
+    per start point, stop set and parameters, independent of the order the
+    stops were given in.
+    """
+    stops = sorted(stops)
+    points = (tuple(start),) + tuple((lat, lon) for _, lat, lon in stops)
+    stop_ids = tuple(stop_id for stop_id, _, _ in stops)
+    if distances is not None and not all(stop_id in distances for stop_id in stop_ids):
+        distances = None
+    route, total_km, days = _plan(points, return_to_start, visit_minutes, day_minutes, speed_kmh,
+                                  stop_ids if distances is not None else None, distances)
+
+    def stop_id(index):
+        return "start" if index == 0 else stops[index - 1][0]
+
+    return {
+        "order": [stop_id(i) for i in route[1:] if i != 0],
+        "total_distance_km": round(total_km, 3),
+        "total_drive_minutes": round(travel_minutes(total_km, speed_kmh), 1),
+        "days": [
+            {
+                "day": number,
+                "minutes": day["minutes"],
+                "stops": [
+                    {"id": stop_id(s["index"]), "drive_minutes": s["drive_minutes"], "distance_km": s["distance_km"]}
+                    for s in day["stops"]
+                ],
+            }
+            for number, day in enumerate(days, start=1)
+        ],
+    }
+
+
+def cache_info():
+    return _plan.cache_info()._asdict()
@@ -0,0 +1,129 @@
+"""In-process BM25 retriever over the same documents as the Chroma collections.
+
+Text is accent-folded before tokenizing, so "Añasco", "Anasco" and "AÑASCO"
+all match, which dense embeddings often miss for proper nouns.
+"""
+import logging
+import math
+import re
+import time
+from collections import Counter, defaultdict
+
+from places import fold_accents
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"\w+")
+STOPWORDS = frozenset("""
+a an and are as at be by for from has have in is it its of on or that the to was were will with
+al con de del el en es la las lo los para por que se su sus un una y
+""".split())
+
+
+def tokenize(text):
+    return [t for t in TOKEN_PATTERN.findall(fold_accents(text)) if t not in STOPWORDS and len(t) > 1]
+
+
+def matches_where(metadata, where):
+    """Evaluate a Chroma `where` filter against one metadata dict."""
+    metadata = metadata or {}
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for operator, operand in condition.items():
+                if not _compare(value, operator, operand):
+                    return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+def _compare(value, operator, operand):
+    if operator == "$eq":
+        return value == operand
+    if operator == "$ne":
+        return value != operand
+    if operator == "$in":
+        return value in operand
+    if operator == "$nin":
+        return value not in operand
+    if value is None:
+        return False
+    if operator == "$gt":
+        return value > operand
+    if operator == "$gte":
+        return value >= operand
+    if operator == "$lt":
+        return value < operand
+    if operator == "$lte":
+        return value <= operand
+    raise ValueError(f"Unsupported where operator {operator}")
+
+
+class BM25Index:
+    """Okapi BM25 over an inverted index of accent-folded terms."""
+
+    def __init__(self, ids, documents, metadatas=None, k1=1.5, b=0.75):
+        self.ids = list(ids)
+        self.documents = list(documents)
+        self.metadatas = list(metadatas) if metadatas is not None else [None] * len(self.ids)
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(list)  # term -> [(doc index, term frequency)]
+        self.lengths = []
+        for index, document in enumerate(self.documents):
+            terms = Counter(tokenize(document or ""))
+            self.lengths.append(sum(terms.values()))
+            for term, frequency in terms.items():
+                self.postings[term].append((index, frequency))
+        self.average_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+        n = len(self.ids)
+        self.idf = {
+            term: math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in self.postings.items()
+        }
+
+    @classmethod
+    def from_collection(cls, collection):
+        """Index every document of a Chroma collection.
+
+        Older stores keep the text in the `description` metadata instead of the
+        document, so the name and description are used as a fallback.
+        """
+        start = time.perf_counter()
+        data = collection.get(include=["documents", "metadatas"])
+        documents = []
+        for document, metadata in zip(data["documents"], data["metadatas"]):
+            if not document:
+                metadata = metadata or {}
+                document = " ".join(str(metadata.get(key, "")) for key in ("name", "description")).strip()
+            documents.append(document)
+        index = cls(data["ids"], documents, data["metadatas"])
+        logger.info(f"BM25 index for {collection.name}: {len(index)} documents in {time.perf_counter() - start:.2f}s.")
+        return index
+
+    def __len__(self):
+        return len(self.ids)
+
+    def search(self, query, n_results=3, where=None):
+        """Return up to `n_results` (doc index, score), best first.
+
+        `where` is a Chroma-style metadata filter applied before ranking.
+        """
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for index, frequency in self.postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[index] / self.average_length)
+                scores[index] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+        if where:
+            scores = {index: score for index, score in scores.items() if matches_where(self.metadatas[index], where)}
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:n_results]
@@ -0,0 +1,165 @@
+import gzip
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from flask import Response
+
+from places import place_id, record_coordinates
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+MARKER_FIELDS = ("id", "name", "category", "lat", "lon")
+MIN_COMPRESS_BYTES = 1024
+# Filtered and paginated slices are compressed per response, so keep it cheap
+DYNAMIC_GZIP_LEVEL = 5
+DEFAULT_CACHE_BYTES = 8 * 1024 * 1024
+
+
+# -------------------------
+# 1. Projections and Filters
+# -------------------------
+def marker_view(record):
+    """Slim projection used by the map: what a marker needs and nothing else."""
+    latitude, longitude = record_coordinates(record) or (None, None)
+    return {
+        "id": place_id(record),
+        "name": record["name"],
+        "category": record["category"],
+        "lat": latitude,
+        "lon": longitude,
+    }
+
+
+def select_fields(record, fields):
+    return {field: record[field] for field in fields if field in record}
+
+
+def in_bbox(record, bbox):
+    """`bbox` is (min_lat, min_lon, max_lat, max_lon); places without coordinates are excluded."""
+    coordinates = record_coordinates(record)
+    if coordinates is None:
+        return False
+    min_lat, min_lon, max_lat, max_lon = bbox
+    return min_lat <= coordinates[0] <= max_lat and min_lon <= coordinates[1] <= max_lon
+
+
+def parse_bbox(value):
+    """Parse "min_lat,min_lon,max_lat,max_lon"; raises ValueError when malformed."""
+    parts = [float(part) for part in value.split(",")]
+    if len(parts) != 4 or parts[0] > parts[2] or parts[1] > parts[3]:
+        raise ValueError("bbox must be min_lat,min_lon,max_lat,max_lon")
+    return tuple(parts)
+
+
+def build_locations(landmarks, municipalities, view="full", fields=None, bbox=None, offset=0, limit=None):
+    """Apply view, bounding box, field selection and pagination to both lists."""
+    payload = {"total": {}}
+    for key, records in (("landmarks", landmarks), ("municipalities", municipalities)):
+        if view == "markers":
+            records = [r for r in records if record_coordinates(r)]
+        if bbox is not None:
+            records = [r for r in records if in_bbox(r, bbox)]
+        payload["total"][key] = len(records)
+        end = None if limit is None else offset + limit
+        records = records[offset:end]
+        if view == "markers":
+            records = [marker_view(r) for r in records]
+        else:
+            # Plain dicts, so PlaceStore places serialize like the JSON records
+            records = [dict(r) for r in records]
+        if fields:
+            records = [select_fields(r, fields) for r in records]
+        payload[key] = records
+    return payload
+
+
+# -------------------------
+# 2. Precompressed, ETagged Payloads
+# -------------------------
+class JsonPayload:
+    """A JSON body serialized once, with its ETag; gzipped per response at a cheap level."""
+
+    def __init__(self, data):
+        self.body = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self.etag = hashlib.sha1(self.body).hexdigest()
+
+    def __len__(self):
+        return len(self.body)
+
+    def encode(self, encodings):
+        """(body, encoding) for the client's accepted `encodings`."""
+        if len(self.body) >= MIN_COMPRESS_BYTES and "gzip" in encodings:
+            return gzip.compress(self.body, compresslevel=DYNAMIC_GZIP_LEVEL), "gzip"
+        return self.body, None
+
+    def to_response(self, request, max_age=300):
+        """Build a Flask response honouring If-None-Match and Accept-Encoding."""
+        if request.if_none_match.contains(self.etag):
+            response = Response(status=304)
+        else:
+            body, encoding = self.encode(request.accept_encodings)
+            response = Response(body, mimetype="application/json")
+            if encoding:
+                response.headers["Content-Encoding"] = encoding
+        response.set_etag(self.etag)
+        response.headers["Cache-Control"] = f"public, max-age={max_age}"
+        response.headers["Vary"] = "Accept-Encoding"
+        return response
+
+
+class PrecompressedPayload(JsonPayload):
+    """A JsonPayload compressed once at the highest levels; for the few views every page load asks for."""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.encoded = {}
+        if len(self.body) >= MIN_COMPRESS_BYTES:
+            self.encoded["gzip"] = gzip.compress(self.body, compresslevel=9)
+            if brotli is not None:
+                self.encoded["br"] = brotli.compress(self.body, quality=11)
+
+    def __len__(self):
+        return len(self.body) + sum(len(body) for body in self.encoded.values())
+
+    def encode(self, encodings):
+        for candidate in ("br", "gzip"):
+            if candidate in self.encoded and candidate in encodings:
+                return self.encoded[candidate], candidate
+        return self.body, None
+
+
+class PayloadCache:
+    """LRU cache of payloads bounded by their total size in bytes, not by entry count."""
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_build(self, key, build):
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is not None:
+                self._entries.move_to_end(key)
+                return payload
+        payload = build()
+        size = len(payload)
+        if size > self.max_bytes:
+            return payload
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = payload
+                self.bytes += size
+                while self.bytes > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self.bytes -= len(evicted)
+        return payload
+
+    def __len__(self):
+        return len(self._entries)
@@ -1,12 +1,17 @@
-from flask import Flask, jsonify, render_template, send_from_directory
-import json
+from flask import Flask, jsonify, render_template, request, send_from_directory
+import hmac
 import os
 import logging
 from dotenv import load_dotenv
 import sys
-from icecream import ic
-
-ic.disable()
+from places import normalize_name, record_coordinates
+from place_store import get_place_store
+from spatial import SpatialIndex, place_summary
+from itinerary import plan_itinerary
+from poi_distances import DistanceMatrix
+from location_payloads import JsonPayload, PayloadCache, PrecompressedPayload, build_locations, parse_bbox
+from startup import StartupNotReady, get_startup
+# chat_service (openai, httpx) is imported by the /chat route and the warmup thread
 
 # -------------------------
 # 1. Logging Setup
@@ -45,28 +50,159 @@ if not GOOGLE_MAPS_API_KEY:
     logging.error("Google API key is missing! Check your .env file.")
     raise ValueError("Google API key not found.")
 
-# Load landmarks from JSON files
-def load_json_file(filename):
+# Places live in a PlaceStore: coordinate arrays, slotted records,
+# hash indexes by id, name and municipality, and descriptions read lazily
+class MapData:
+    """The place store, the spatial indexes built over it and the POI distance matrix."""
+
+    def __init__(self, store, distances=None):
+        self.store = store
+        self.distances = distances
+        self.landmarks = store.landmarks
+        self.municipalities = store.municipalities
+        self.places_by_id = store.by_id
+        self.landmark_index = SpatialIndex.from_records(store.landmarks)
+        self.municipality_index = SpatialIndex.from_records(store.municipalities)
+        logger.info(f"Spatial index built: {len(self.landmark_index)} landmarks, "
+                    f"{len(self.municipality_index)} municipalities.")
+
+    def find_municipality(self, name):
+        """By accent-folded name, or by key for names that lost their accents ("Bayamn")."""
+        candidates = self.store.find_by_name(name) + self.store.in_municipality(normalize_name(name))
+        return next((place for place in candidates if place.category == "Municipality"), None)
+
+def load_distances(data_dir):
+    """The memory-mapped POI distance matrix, or None; itineraries then compute every distance."""
     try:
-        with open(filename, "r", encoding="utf-8") as file:
-            return json.load(file)
-    except FileNotFoundError:
-        logging.error(f"{filename} not found!")
-        return []
-    except json.JSONDecodeError:
-        logging.error(f"Error decoding JSON from {filename}")
-        return []
-
-# landmarks = load_json_file("../data/landmarks_corrected.json")
-# municipalities = load_json_file("../data/municipalities_corrected.json")  
-
-landmarks = load_json_file("data/landmarks_corrected.json")
-municipalities = load_json_file("data/municipalities_corrected.json")
-ic(municipalities)
+        return DistanceMatrix.load(data_dir, os.path.join(data_dir, "cache"))
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"POI distance matrix not available: {e}")
+        return None
+
+def load_map_data():
+    return MapData(get_place_store("data"), load_distances("data"))
+
+# The server starts listening right away; the JSON files, spatial indexes,
+# precomputed payloads and the chat client load on a background thread.
+# Requests that need them wait up to DATA_WAIT_SECONDS, then get a 503.
+DATA_WAIT_SECONDS = float(os.getenv("DATA_WAIT_SECONDS", "10"))
+startup = get_startup()
+
+def map_data():
+    return startup.wait("places", timeout=DATA_WAIT_SECONDS)
+
+@app.errorhandler(StartupNotReady)
+def not_ready(e):
+    return jsonify({"error": f"starting up: {e}"}), 503, {"Retry-After": "1"}
+
+DEFAULT_NEARBY_K = 5
+MAX_NEARBY_K = 50
+DEFAULT_RADIUS_KM = 10.0
+MAX_RADIUS_KM = 200.0
+
+MAX_PAGE_SIZE = 1000
+
+# The views the map asks for on every page load are precompressed once at the
+# highest gzip/brotli levels. Any other view, bbox or page is built on demand,
+# gzipped at a cheap level per response and kept in a cache bounded by bytes,
+# so arbitrary query strings cannot pile up CPU or memory.
+PRECOMPRESSED_VIEWS = ("full", "markers")
+LOCATIONS_CACHE_BYTES = int(os.getenv("LOCATIONS_CACHE_BYTES", str(8 * 1024 * 1024)))
+_fixed_payloads = {}
+_payload_cache = PayloadCache(LOCATIONS_CACHE_BYTES)
+
+def locations_payload(view="full", fields=None, bbox=None, offset=0, limit=None):
+    """Serialized /get_locations body: precompressed for the page's views, cached by size otherwise."""
+    data = map_data()
+    if view in PRECOMPRESSED_VIEWS and (fields, bbox, offset, limit) == (None, None, 0, None):
+        payload = _fixed_payloads.get(view)
+        if payload is None:
+            payload = _fixed_payloads.setdefault(
+                view, PrecompressedPayload(build_locations(data.landmarks, data.municipalities, view)))
+        return payload
+    return _payload_cache.get_or_build(
+        (view, fields, bbox, offset, limit),
+        lambda: JsonPayload(build_locations(data.landmarks, data.municipalities, view, fields, bbox, offset, limit)),
+    )
+
+def warm_chat_service():
+    from chat_service import get_chat_service
+    return get_chat_service()
+
+startup.add("places", load_map_data)
+# Precompute the payloads the map asks for on every page load
+startup.add("payloads", lambda: (locations_payload(), locations_payload("markers")))
+# Not required for readiness: the map works without the chat client
+startup.add("chat_service", warm_chat_service, required=False)
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """Liveness: the process is up and serving."""
+    return jsonify({"status": "ok"})
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    """Readiness: 200 once the data and payloads are loaded, 503 before."""
+    status = startup.status()
+    return jsonify(status), 200 if status["ready"] else 503
 
 @app.route('/get_locations', methods=['GET'])
 def get_locations():
-    return jsonify({"landmarks": landmarks, "municipalities": municipalities})
+    """Landmarks and municipalities, precompressed and ETagged.
+
+    Optional query parameters: view=full|markers, fields=name,category,...,
+    bbox=min_lat,min_lon,max_lat,max_lon, offset, limit.
+    """
+    view = request.args.get("view", default="full")
+    if view not in ("full", "markers"):
+        return jsonify({"error": "view must be 'full' or 'markers'"}), 400
+    fields = request.args.get("fields")
+    fields = tuple(f.strip() for f in fields.split(",") if f.strip()) if fields else None
+    try:
+        bbox = parse_bbox(request.args["bbox"]) if "bbox" in request.args else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    offset = request.args.get("offset", default=0, type=int)
+    limit = request.args.get("limit", type=int)
+    if offset < 0 or (limit is not None and not 0 < limit <= MAX_PAGE_SIZE):
+        return jsonify({"error": f"offset must be >= 0 and limit between 1 and {MAX_PAGE_SIZE}"}), 400
+    return locations_payload(view, fields, bbox, offset, limit).to_response(request)
+
+@app.route('/nearby', methods=['GET'])
+def nearby():
+    """k nearest landmarks (or municipalities) to ?lat=&lon=."""
+    lat = request.args.get("lat", type=float)
+    lon = request.args.get("lon", type=float)
+    k = request.args.get("k", default=DEFAULT_NEARBY_K, type=int)
+    category = request.args.get("category", default="landmarks")
+    if lat is None or lon is None or not -90 <= lat <= 90 or not -180 <= lon <= 180:
+        return jsonify({"error": "lat and lon query parameters are required"}), 400
+    if category not in ("landmarks", "municipalities"):
+        return jsonify({"error": "category must be 'landmarks' or 'municipalities'"}), 400
+    data = map_data()
+    index = data.landmark_index if category == "landmarks" else data.municipality_index
+    k = max(1, min(k, MAX_NEARBY_K))
+    results = [place_summary(record, distance) for distance, _, _, record in index.nearest(lat, lon, k)]
+    return jsonify({"lat": lat, "lon": lon, "k": k, "results": results})
+
+@app.route('/municipalities/<name>/landmarks', methods=['GET'])
+def landmarks_near_municipality(name):
+    """All landmarks within ?radius_km= of a municipality's coordinates."""
+    radius_km = request.args.get("radius_km", default=DEFAULT_RADIUS_KM, type=float)
+    if radius_km is None or not 0 < radius_km <= MAX_RADIUS_KM:
+        return jsonify({"error": f"radius_km must be between 0 and {MAX_RADIUS_KM}"}), 400
+    data = map_data()
+    municipality = data.find_municipality(name)
+    if municipality is None:
+        return jsonify({"error": f"Unknown municipality: {name}"}), 404
+    center = place_summary(municipality)
+    if center["latitude"] is None:
+        return jsonify({"error": f"No coordinates for municipality: {municipality['name']}"}), 404
+    results = [
+        place_summary(record, distance)
+        for distance, _, _, record in data.landmark_index.within(center["latitude"], center["longitude"], radius_km)
+    ]
+    return jsonify({"municipality": center, "radius_km": radius_km, "results": results})
 
 # @app.route("/")
 # def serve_index():
@@ -77,10 +213,134 @@ def get_locations():
 #     return send_from_directory(app.static_folder, "index.html")
 
 
+MAX_ITINERARY_STOPS = 60
+
+@app.route('/itinerary', methods=['POST'])
+def itinerary():
+    """Near-optimal visiting order for a set of places, split into days.
+
+    JSON body: {"start": {"lat": .., "lon": ..} or {"id": ..}, "stops": [ids],
+    "return_to_start": false, "visit_minutes": 60, "day_hours": 8, "speed_kmh": 40}
+    """
+    data = map_data()
+    places_by_id = data.places_by_id
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify({"error": "the body must be a JSON object"}), 400
+    start = body.get("start") or {}
+    if not isinstance(start, dict):
+        return jsonify({"error": "start must be {lat, lon} or {id}"}), 400
+    if "id" in start:
+        start_place = places_by_id.get(start["id"]) if isinstance(start["id"], str) else None
+        start_point = record_coordinates(start_place) if start_place else None
+    else:
+        try:
+            start_point = (float(start["lat"]), float(start["lon"]))
+        except (KeyError, TypeError, ValueError):
+            start_point = None
+    if start_point is None:
+        return jsonify({"error": "start must be {lat, lon} or the id of a place with coordinates"}), 400
+
+    stop_ids = body.get("stops") or []
+    if not isinstance(stop_ids, list) or not all(isinstance(stop_id, str) for stop_id in stop_ids):
+        return jsonify({"error": "stops must be a list of place ids"}), 400
+    stop_ids = list(dict.fromkeys(stop_ids))
+    if not stop_ids or len(stop_ids) > MAX_ITINERARY_STOPS:
+        return jsonify({"error": f"stops must list between 1 and {MAX_ITINERARY_STOPS} place ids"}), 400
+    stops, unplaced = [], []
+    for stop_id in stop_ids:
+        place = places_by_id.get(stop_id)
+        coordinates = record_coordinates(place) if place else None
+        if coordinates:
+            stops.append((stop_id, coordinates[0], coordinates[1]))
+        else:
+            unplaced.append(stop_id)
+
+    try:
+        visit_minutes = float(body.get("visit_minutes", 60))
+        day_minutes = float(body.get("day_hours", 8)) * 60
+        speed_kmh = float(body.get("speed_kmh", 40))
+    except (TypeError, ValueError):
+        return jsonify({"error": "visit_minutes, day_hours and speed_kmh must be numbers"}), 400
+    if visit_minutes < 0 or day_minutes <= 0 or speed_kmh <= 0:
+        return jsonify({"error": "visit_minutes must be >= 0, day_hours and speed_kmh > 0"}), 400
+
+    plan = plan_itinerary(start_point, stops, bool(body.get("return_to_start")), visit_minutes,
+                          day_minutes, speed_kmh, data.distances) if stops else {"order": [], "days": []}
+    plan["unplaced"] = unplaced
+    for day in plan.get("days", []):
+        for stop in day["stops"]:
+            place = places_by_id.get(stop["id"])
+            stop["name"] = place["name"] if place else "Start"
+    return jsonify(plan)
+
+CHAT_MODEL = os.getenv("CHAT_MODEL", "gpt-4o-2024-08-06")
+CHAT_MAX_TOKENS = int(os.getenv("CHAT_MAX_TOKENS", "500"))
+# /chat spends the server's OpenAI key, so it is off (503) unless CHAT_API_TOKEN
+# is set, and then requires "Authorization: Bearer <token>".
+CHAT_API_TOKEN = os.getenv("CHAT_API_TOKEN")
+MAX_CHAT_MESSAGE_CHARS = 4000
+
+def load_chat_pipeline():
+    """The app3_dan.py RAG pipeline over the shared collections, planned with the map's municipalities."""
+    from chat_pipeline import LLM_PARAMS, ChatPipeline
+    from query_planner import QueryPlanner
+    from resources import DEFAULT_COLLECTIONS, get_collections, get_lexical_indexes, warmup
+    from response_cache import get_response_cache
+
+    warmup(DEFAULT_COLLECTIONS, lexical=True)
+    return ChatPipeline(
+        get_collections(DEFAULT_COLLECTIONS), get_lexical_indexes(DEFAULT_COLLECTIONS),
+        QueryPlanner(map_data().municipalities), cache=get_response_cache(),
+        llm_params={**LLM_PARAMS, "model": CHAT_MODEL, "max_tokens": CHAT_MAX_TOKENS},
+    )
+
+if CHAT_API_TOKEN:
+    startup.add("chat_pipeline", load_chat_pipeline, required=False)
+
+def chat_authorized():
+    return hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {CHAT_API_TOKEN}")
+
+@app.route('/chat', methods=['POST'])
+def chat():
+    """Answer a travel question with the retrieval-augmented chat pipeline.
+
+    JSON body: {"message": ".."}; requires "Authorization: Bearer <CHAT_API_TOKEN>".
+    Answers 503 (with Retry-After when it is temporary) when chat is
+    disabled, still warming up, not configured or busy, and 502 when the
+    completion fails.
+    """
+    from chat_service import ChatServiceBusy, ChatServiceError, get_chat_service
+
+    if not CHAT_API_TOKEN:
+        return jsonify({"error": "chat is disabled on this server"}), 503
+    if not chat_authorized():
+        return jsonify({"error": "unauthorized"}), 401
+    body = request.get_json(silent=True)
+    message = body.get("message") if isinstance(body, dict) else None
+    if not isinstance(message, str) or not 0 < len(message.strip()) <= MAX_CHAT_MESSAGE_CHARS:
+        return jsonify({"error": f"message must be a string of 1 to {MAX_CHAT_MESSAGE_CHARS} characters"}), 400
+    try:
+        service = get_chat_service()
+    except ChatServiceError as e:
+        logging.error(f"Chat service unavailable: {e}")
+        return jsonify({"error": "chat is unavailable"}), 503, {"Retry-After": "30"}
+    pipeline = startup.wait("chat_pipeline", timeout=DATA_WAIT_SECONDS)
+    try:
+        reply = pipeline.chat(service, message.strip())
+    except ChatServiceBusy:
+        return jsonify({"error": "busy, try again shortly"}), 503, {"Retry-After": "2"}
+    except ChatServiceError as e:
+        logging.error(f"Chat completion failed: {e}")
+        return jsonify({"error": "completion failed"}), 502
+    return jsonify({"reply": reply})
+
 @app.route("/")
 def serve_index():
     # Render the template and pass the API key as a variable
     return render_template("index.html", google_maps_api_key=GOOGLE_MAPS_API_KEY)
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    startup.mark("listening")
+    # The debugger allows running code from the browser, so it is opt-in with FLASK_DEBUG=1
+    app.run(debug=os.getenv("FLASK_DEBUG") == "1")
@@ -0,0 +1,222 @@
+"""Per-stage latency spans for the RAG pipeline, exported in Prometheus text format.
+
+Wrap a stage in `span("embed")` (extra keyword arguments become labels) and
+its duration lands in the `rag_stage_seconds` histogram. Inside
+`trace("chat")` the spans are also collected per request, and a sampled
+share of requests is written as one JSON line to `traces.jsonl`.
+
+`start_metrics_server(port)` serves GET /metrics from a daemon thread; it is
+safe to call on every Streamlit rerun.
+"""
+import contextvars
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from chat_log import ChatLogSink
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+DEFAULT_METRICS_PORT = 9108
+DEFAULT_TRACE_PATH = "traces.jsonl"
+DEFAULT_TRACE_SAMPLE_RATE = 0.1
+
+
+# -------------------------
+# 1. Histograms
+# -------------------------
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by a sorted tuple of label pairs."""
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [bucket counts..., count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self._lock:
+            series = self._series.setdefault(key, [0] * len(self.buckets) + [0, 0.0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        for key, values in sorted(series.items()):
+            for bound, count in zip(self.buckets, values):
+                lines.append(f"{self.name}_bucket{_format_labels(key + (('le', repr(bound)),))} {count}")
+            lines.append(f"{self.name}_bucket{_format_labels(key + (('le', '+Inf'),))} {values[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {values[-2]}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {values[-1]:.6f}")
+        return lines
+
+
+STAGE_SECONDS = Histogram("rag_stage_seconds", "Duration of each RAG pipeline stage.")
+REQUEST_SECONDS = Histogram("rag_request_seconds", "End-to-end duration of a traced request.")
+_histograms = [STAGE_SECONDS, REQUEST_SECONDS]
+_gauge_sources = {}
+
+
+def register_gauges(prefix, source):
+    """Export the numeric values of `source()` (a dict) as `<prefix>_<key>` gauges."""
+    _gauge_sources[prefix] = source
+
+
+def render_prometheus():
+    lines = []
+    for histogram in _histograms:
+        lines.extend(histogram.render())
+    for prefix, source in list(_gauge_sources.items()):
+        try:
+            values = source()
+        except Exception as e:
+            logger.error(f"Error reading gauges {prefix}: {e}")
+            continue
+        for key, value in values.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                lines.append(f"# TYPE {prefix}_{key} gauge")
+                lines.append(f"{prefix}_{key} {value}")
+    return "\n".join(lines) + "\n"
+
+
+# -------------------------
+# 2. Spans and Sampled Traces
+# -------------------------
+_current_trace = contextvars.ContextVar("rag_trace", default=None)
+_trace_sink = None
+_trace_sample_rate = DEFAULT_TRACE_SAMPLE_RATE
+_trace_lock = threading.Lock()
+
+
+def configure_tracing(sample_rate=DEFAULT_TRACE_SAMPLE_RATE, path=DEFAULT_TRACE_PATH):
+    """Set the share of traces written to `path` (0 disables writing)."""
+    global _trace_sink, _trace_sample_rate
+    with _trace_lock:
+        _trace_sample_rate = sample_rate
+        if sample_rate > 0 and (_trace_sink is None or _trace_sink.path != path):
+            _trace_sink = ChatLogSink(path=path)
+
+
+def record_stage(stage, seconds, **labels):
+    """Record a stage timed by the caller, as if it had run inside `span()`."""
+    STAGE_SECONDS.observe(seconds, stage=stage, **labels)
+    current = _current_trace.get()
+    if current is not None:
+        current["spans"].append({"stage": stage, **labels, "ms": round(seconds * 1000, 2)})
+
+
+@contextmanager
+def span(stage, **labels):
+    """Time a stage; recorded in STAGE_SECONDS and in the current trace, if any."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start, **labels)
+
+
+@contextmanager
+def trace(name, **attributes):
+    """Collect the spans of one request; sampled traces are written as JSONL."""
+    current = {"trace_id": uuid.uuid4().hex, "name": name, "start": time.time(), **attributes, "spans": []}
+    token = _current_trace.set(current)
+    start = time.perf_counter()
+    try:
+        yield current
+    finally:
+        duration = time.perf_counter() - start
+        try:
+            _current_trace.reset(token)
+        except ValueError:  # generator resumed from another context
+            _current_trace.set(None)
+        REQUEST_SECONDS.observe(duration, name=name)
+        if _trace_sink is not None and random.random() < _trace_sample_rate:
+            current["total_ms"] = round(duration * 1000, 2)
+            _trace_sink.write(current)
+
+
+# -------------------------
+# 3. /metrics Endpoint
+# -------------------------
+class MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path in _probes:
+            self._send_probe(_probes[path])
+            return
+        if path != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_probe(self, source):
+        try:
+            status = source()
+        except Exception as e:
+            status = {"ready": False, "error": str(e)}
+        body = json.dumps(status).encode("utf-8")
+        self.send_response(200 if status.get("ready", True) else 503)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+_probes = {}
+
+
+def register_probe(path, source):
+    """Serve `source()` (a dict) as JSON at `path` next to /metrics; 503 when its "ready" is false.
+
+    Lets Streamlit apps, whose own server has no custom routes, expose
+    liveness and readiness probes.
+    """
+    _probes[path] = source
+
+
+_server = None
+_server_attempted = False
+
+
+def start_metrics_server(port=DEFAULT_METRICS_PORT, host="127.0.0.1"):
+    """Serve /metrics once per process; returns the server, or None if the port was taken."""
+    global _server, _server_attempted
+    with _trace_lock:
+        if not _server_attempted:
+            _server_attempted = True
+            try:
+                _server = ThreadingHTTPServer((host, port), MetricsHandler)
+            except OSError as e:
+                logger.warning(f"Metrics endpoint not started on port {port}: {e}")
+                return None
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+            logger.info(f"Metrics available at http://{host}:{_server.server_port}/metrics")
+    return _server
@@ -0,0 +1,122 @@
+"""Copy every collection from the legacy Chroma stores into the single store.
+
+Over time the project grew several PersistentClient directories
+(`../chromadb/chromadb_municipalities`, `./chromadb_landmarks`, ...). The
+apps now open one store, `resources.STORE_PATH`, holding all collections.
+This command copies ids, stored embeddings, documents and metadata into it,
+so nothing is re-embedded. Collections already fully present are skipped.
+
+Usage (from the src folder):
+    python migrate_store.py                  # migrate the known legacy stores
+    python migrate_store.py --dry-run        # only report what would be copied
+    python migrate_store.py --source ./old_store --target ../chromadb
+"""
+import argparse
+import logging
+import os
+import time
+
+import chromadb
+
+from resources import STORE_PATH, preload_store_files
+
+logger = logging.getLogger(__name__)
+
+# Oldest first, so newer copies of a record win when ids collide
+LEGACY_STORES = [
+    "./chromadb_municipalities",
+    "./chromadb_landmarks",
+    "./chromadb/chromadb_municipalities",
+    "./chromadb/chromadb_landmarks",
+    "./chromadb",
+    "../chromadb/chromadb_landmarks",
+    "../chromadb/chromadb_municipalities",
+]
+DEFAULT_BATCH_SIZE = 500
+
+
+def is_store(path):
+    # Opening a PersistentClient creates an empty store, so check first
+    return os.path.exists(os.path.join(path, "chroma.sqlite3"))
+
+
+def copy_collection(source, target_client, batch_size=DEFAULT_BATCH_SIZE, force=False, dry_run=False):
+    """Upsert every record of `source` into the same-named collection of `target_client`.
+
+    Returns the number of records copied (0 when skipped).
+    """
+    total = source.count()
+    if total == 0:
+        logger.info(f"{source.name}: empty, nothing to copy.")
+        return 0
+    if dry_run:
+        logger.info(f"{source.name}: would copy {total} records.")
+        return total
+
+    target = target_client.get_or_create_collection(source.name, metadata=source.metadata or None,
+                                                    embedding_function=None)
+    if not force and target.count() >= total:
+        source_ids = set(source.get(include=[])["ids"])
+        if source_ids <= set(target.get(include=[])["ids"]):
+            logger.info(f"{source.name}: all {total} records already in the target, skipping.")
+            return 0
+
+    copied = 0
+    for offset in range(0, total, batch_size):
+        batch = source.get(limit=batch_size, offset=offset, include=["embeddings", "documents", "metadatas"])
+        if not batch["ids"]:
+            break
+        target.upsert(
+            ids=batch["ids"],
+            embeddings=batch["embeddings"],
+            documents=batch["documents"] if any(doc is not None for doc in batch["documents"]) else None,
+            metadatas=batch["metadatas"] if any(batch["metadatas"]) else None,
+        )
+        copied += len(batch["ids"])
+    logger.info(f"{source.name}: copied {copied} records.")
+    return copied
+
+
+def migrate(sources, target_path=STORE_PATH, batch_size=DEFAULT_BATCH_SIZE, force=False, dry_run=False):
+    """Copy the collections of every existing store in `sources` into `target_path`."""
+    start = time.perf_counter()
+    target_client = chromadb.PersistentClient(path=target_path) if not dry_run else None
+    target_key = os.path.abspath(target_path)
+    report = {}
+    for path in sources:
+        if os.path.abspath(path) == target_key:
+            continue
+        if not is_store(path):
+            logger.info(f"{path}: no Chroma store here, skipping.")
+            continue
+        client = chromadb.PersistentClient(path=path)
+        for collection in client.list_collections():
+            if isinstance(collection, str):  # older clients return names
+                collection = client.get_collection(collection)
+            copied = copy_collection(collection, target_client, batch_size, force, dry_run)
+            report[collection.name] = report.get(collection.name, 0) + copied
+    if target_client is not None:
+        counts = {c.name: c.count() for c in target_client.list_collections()}
+        logger.info(f"Target {target_path} now holds: {counts}")
+        preload_store_files(target_path)
+    logger.info(f"Migration finished in {time.perf_counter() - start:.2f}s: {report}")
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Merge the legacy Chroma stores into the single store.")
+    parser.add_argument("--source", action="append", help="legacy store to copy from (repeatable); "
+                                                         "defaults to the known legacy locations")
+    parser.add_argument("--target", default=STORE_PATH)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--force", action="store_true", help="copy even if the target already has the records")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s",
+                        datefmt="%Y-%m-%d %H:%M:%S")
+    migrate(args.source or LEGACY_STORES, args.target, args.batch_size, args.force, args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""Memory-mapped binary snapshot of the place data.
+
+Parsing 1.4 MB of pretty-printed JSON and re-running the municipality
+assignment costs every worker a few hundred milliseconds and a private
+copy of the data. The snapshot is compiled once from the corrected JSON
+files and mapped read-only, so all workers share its pages through the OS
+page cache.
+
+Layout (little endian, sections aligned to 8 bytes):
+
+    header      magic, format version, field count, place count,
+                source fingerprint, blake2b checksum of everything after
+                the header, offset of the string table
+    latitudes   float64[count], NaN where unknown
+    longitudes  float64[count]
+    offsets     int64[fields, count + 1]; string i of field f is
+                strings[offsets[f, i]:offsets[f, i + 1]]
+    strings     UTF-8 string table (descriptions are stored as JSON)
+
+A snapshot whose version or source fingerprint does not match is stale;
+PlaceStore.load then reads the JSON files and writes a fresh one.
+
+Usage (from the src folder):
+    python place_snapshot.py build [--data-dir data]
+    python place_snapshot.py info [--data-dir data]
+"""
+import argparse
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_MAGIC = b"PRPLACES"
+SNAPSHOT_VERSION = 2
+SNAPSHOT_FILE = "places.snapshot"
+HEADER = struct.Struct("<8sHHI16s16sQ")
+STRING_FIELDS = ("id", "name", "category", "source_file", "municipality", "description")
+
+
+class SnapshotError(Exception):
+    """The snapshot is missing, stale, from another format version, or corrupt."""
+
+
+def source_fingerprint(paths):
+    """16-byte digest of the paths, sizes and modification times of the source files."""
+    key = hashlib.blake2b(digest_size=16)
+    for path in paths:
+        if os.path.exists(path):
+            stat = os.stat(path)
+            key.update(f"{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8"))
+    return key.digest()
+
+
+def _aligned(offset):
+    return (offset + 7) & ~7
+
+
+def _layout(count):
+    """Byte offsets of the latitude, longitude and offset sections, and of the string table."""
+    latitudes = _aligned(HEADER.size)
+    longitudes = latitudes + 8 * count
+    offsets = longitudes + 8 * count
+    strings = offsets + 8 * len(STRING_FIELDS) * (count + 1)
+    return latitudes, longitudes, offsets, strings
+
+
+# -------------------------
+# 1. Writing
+# -------------------------
+def write_snapshot(path, store, fingerprint):
+    """Write the places of `store` (a PlaceStore) to `path`, atomically."""
+    count = len(store)
+    columns = [
+        [place.id for place in store],
+        [place.name for place in store],
+        [place.category for place in store],
+        [place.source_file or "" for place in store],
+        [place.municipality or "" for place in store],
+        [json.dumps(store.description(place.row), ensure_ascii=False) for place in store],
+    ]
+    offsets = np.zeros((len(STRING_FIELDS), count + 1), dtype="<i8")
+    chunks, position = [], 0
+    for field, values in enumerate(columns):
+        offsets[field, 0] = position
+        for i, value in enumerate(values):
+            data = value.encode("utf-8")
+            chunks.append(data)
+            position += len(data)
+            offsets[field, i + 1] = position
+    latitude_at, _, _, strings_at = _layout(count)
+    body = b"".join([
+        bytes(latitude_at - HEADER.size),
+        np.asarray(store.latitudes, dtype="<f8").tobytes(),
+        np.asarray(store.longitudes, dtype="<f8").tobytes(),
+        offsets.tobytes(),
+        *chunks,
+    ])
+    checksum = hashlib.blake2b(body, digest_size=16).digest()
+    header = HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(STRING_FIELDS), count, fingerprint, checksum,
+                         strings_at)
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    partial = f"{path}.{os.getpid()}.partial"
+    with open(partial, "wb") as file:
+        file.write(header)
+        file.write(body)
+    os.replace(partial, path)
+    logger.info(f"Wrote place snapshot {path}: {count} places, {HEADER.size + len(body)} bytes.")
+
+
+# -------------------------
+# 2. Reading
+# -------------------------
+class PlaceSnapshot:
+    """A read-only mapping of a snapshot file; the arrays are views into the mapped pages."""
+
+    def __init__(self, path, fingerprint=None, verify=True):
+        """Map `path`; raises SnapshotError unless it matches `fingerprint` (when given) and its checksum."""
+        self.path = path
+        try:
+            with open(path, "rb") as file:
+                self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:
+            raise SnapshotError(f"cannot map {path}: {e}") from None
+        try:
+            self._check(fingerprint, verify)
+        except SnapshotError:
+            self._map.close()
+            raise
+
+    def _check(self, fingerprint, verify):
+        if len(self._map) < HEADER.size:
+            raise SnapshotError(f"{self.path} is truncated")
+        magic, version, fields, count, source, checksum, strings_at = HEADER.unpack_from(self._map)
+        if magic != SNAPSHOT_MAGIC:
+            raise SnapshotError(f"{self.path} is not a place snapshot")
+        if version != SNAPSHOT_VERSION or fields != len(STRING_FIELDS):
+            raise SnapshotError(f"{self.path} has format version {version}, expected {SNAPSHOT_VERSION}")
+        if fingerprint is not None and source != fingerprint:
+            raise SnapshotError(f"{self.path} is stale: the JSON files changed since it was built")
+        latitude_at, longitude_at, offsets_at, layout_strings_at = _layout(count)
+        if strings_at != layout_strings_at or len(self._map) < strings_at:
+            raise SnapshotError(f"{self.path} is truncated")
+        (strings_size,) = struct.unpack_from("<q", self._map, strings_at - 8)
+        if strings_at + strings_size != len(self._map):
+            raise SnapshotError(f"{self.path} is truncated")
+        if verify:
+            with memoryview(self._map) as view:
+                actual = hashlib.blake2b(view[HEADER.size:], digest_size=16).digest()
+            if actual != checksum:
+                raise SnapshotError(f"{self.path} failed its checksum")
+
+        self.count = count
+        self.fingerprint = source
+        self.latitudes = np.frombuffer(self._map, dtype="<f8", count=count, offset=latitude_at)
+        self.longitudes = np.frombuffer(self._map, dtype="<f8", count=count, offset=longitude_at)
+        self.offsets = np.frombuffer(self._map, dtype="<i8", count=fields * (count + 1),
+                                     offset=offsets_at).reshape(fields, count + 1)
+        self._strings_at = strings_at
+
+    def __len__(self):
+        return self.count
+
+    def string(self, field, index):
+        row = self.offsets[STRING_FIELDS.index(field)]
+        start, end = self._strings_at + int(row[index]), self._strings_at + int(row[index + 1])
+        return self._map[start:end].decode("utf-8")
+
+    def column(self, field):
+        """All strings of `field`, decoded."""
+        row = self.offsets[STRING_FIELDS.index(field)].tolist()
+        base = self._strings_at
+        return [self._map[base + start:base + end].decode("utf-8") for start, end in zip(row, row[1:])]
+
+    def read(self, index):
+        """The description of place `index`, parsed (PlaceStore reads descriptions through this)."""
+        return json.loads(self.string("description", index))
+
+    def close(self):
+        # NumPy views keep the buffer exported; the mapping is released once they are gone
+        try:
+            self._map.close()
+        except BufferError:
+            pass
+
+
+# -------------------------
+# 3. Command Line
+# -------------------------
+def main(argv=None):
+    from place_store import PlaceStore, snapshot_path, source_paths  # place_store imports this module
+
+    parser = argparse.ArgumentParser(description="Build or inspect the binary place snapshot.")
+    parser.add_argument("command", choices=("build", "info"))
+    parser.add_argument("--data-dir", default="data", help="folder with the corrected JSON files")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s",
+                        datefmt="%Y-%m-%d %H:%M:%S")
+    path = snapshot_path(args.data_dir)
+    if args.command == "build":
+        store = PlaceStore.from_json(args.data_dir)
+        write_snapshot(path, store, store.fingerprint)
+        store.close()
+    else:
+        snapshot = PlaceSnapshot(path)
+        categories = snapshot.column("category")
+        print(json.dumps({
+            "path": path,
+            "version": SNAPSHOT_VERSION,
+            "bytes": os.path.getsize(path),
+            "places": len(snapshot),
+            "by_category": {category: categories.count(category) for category in sorted(set(categories))},
+            "with_coordinates": int(np.count_nonzero(~np.isnan(snapshot.latitudes))),
+            "stale": snapshot.fingerprint != source_fingerprint(source_paths(args.data_dir)),
+        }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""Compact, indexed in-memory store of the landmarks and municipalities.
+
+Instead of two lists of nested dicts per worker, a PlaceStore keeps:
+
+- coordinates in float64 NumPy arrays (NaN where unknown), already
+  corrected for swapped latitude/longitude,
+- one `Place` per record with `__slots__` and interned category and
+  municipality strings,
+- dict indexes by id, by accent-folded name and by municipality key,
+- descriptions in an offset-indexed file under `data/cache/`, read on
+  first access to `Place.description`.
+
+`PlaceStore.load` maps the binary snapshot (place_snapshot.py) when it is
+current: the coordinate arrays and descriptions are then views of pages
+shared by all workers, and only the names are decoded. Otherwise it parses
+the JSON files and writes a fresh snapshot for the next start.
+
+A Place also answers `place["name"]`, `place.get("coordinates")` and
+`dict(place)` like the JSON records, so places.py, spatial.py and
+location_payloads.py work on either.
+"""
+import json
+import logging
+import os
+import sys
+import threading
+
+import numpy as np
+
+from place_snapshot import SNAPSHOT_FILE, PlaceSnapshot, SnapshotError, source_fingerprint, write_snapshot
+from places import (DATA_DIR, LANDMARKS_FILE, MUNICIPALITIES_FILE, assign_municipalities, load_json_file,
+                    municipality_key, normalize_name, place_id, record_coordinates, unique_place_ids)
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.path.join(DATA_DIR, "cache")
+RECORD_FIELDS = ("name", "category", "description", "coordinates", "source_file")
+
+
+class Place:
+    __slots__ = ("id", "name", "category", "municipality", "source_file", "row", "_store")
+
+    def __init__(self, store, row, name, category, source_file, municipality=None, id=None):
+        self._store = store
+        self.row = row
+        self.name = name
+        self.category = sys.intern(category)
+        self.source_file = source_file
+        self.id = id or place_id({"source_file": source_file})
+        self.municipality = sys.intern(municipality) if municipality else None
+
+    @property
+    def coordinates(self):
+        """(latitude, longitude) as floats, or None."""
+        return self._store.coordinates(self.row)
+
+    @property
+    def description(self):
+        """The raw description (a list of paragraphs, or its string repr), loaded on first use."""
+        return self._store.description(self.row)
+
+    # Read-only mapping protocol, matching the JSON records
+    def keys(self):
+        return RECORD_FIELDS
+
+    def __getitem__(self, key):
+        if key == "coordinates":
+            latitude, longitude = self.coordinates or (None, None)
+            return {"latitude": latitude, "longitude": longitude}
+        if key == "id" or key in RECORD_FIELDS:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def __contains__(self, key):
+        return key == "id" or key in RECORD_FIELDS
+
+    def __repr__(self):
+        return f"Place({self.id!r}, {self.name!r}, {self.category!r})"
+
+
+class DescriptionFile:
+    """Descriptions stored back to back as UTF-8 JSON; `offsets[i]:offsets[i + 1]` is record i."""
+
+    def __init__(self, path, offsets):
+        self.path = path
+        self.offsets = offsets
+        self._file = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open_or_build(cls, path, descriptions):
+        """Reuse the file at `path` if it holds `len(descriptions)` entries, else write it.
+
+        The offsets are kept next to it in `<path>.offsets.npy`. Both are
+        written under temporary names and renamed, so concurrent workers
+        never read a partial file.
+        """
+        offsets_path = path + ".offsets.npy"
+        try:
+            offsets = np.load(offsets_path)
+            if len(offsets) == len(descriptions) + 1 and offsets[-1] == os.path.getsize(path):
+                return cls(path, offsets)
+        except (OSError, ValueError):
+            pass
+
+        offsets = np.zeros(len(descriptions) + 1, dtype=np.int64)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        partial = f"{path}.{os.getpid()}.partial"
+        with open(partial, "wb") as file:
+            for i, description in enumerate(descriptions):
+                data = json.dumps(description, ensure_ascii=False).encode("utf-8")
+                file.write(data)
+                offsets[i + 1] = offsets[i] + len(data)
+        with open(f"{offsets_path}.{os.getpid()}.partial", "wb") as file:
+            np.save(file, offsets)
+        os.replace(partial, path)
+        os.replace(f"{offsets_path}.{os.getpid()}.partial", offsets_path)
+        return cls(path, offsets)
+
+    def read(self, index):
+        start, end = int(self.offsets[index]), int(self.offsets[index + 1])
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "rb")
+            self._file.seek(start)
+            data = self._file.read(end - start)
+        return json.loads(data.decode("utf-8"))
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def remove_stale_descriptions(current_path):
+    """Delete the description files (and offsets) of earlier JSON versions next to `current_path`."""
+    directory = os.path.dirname(current_path)
+    for entry in os.scandir(directory):
+        if (entry.name.startswith("place_descriptions-") and not entry.name.endswith(".partial")
+                and not entry.path.startswith(current_path)):
+            try:
+                os.remove(entry.path)
+                logger.info(f"Removed stale description cache {entry.path}")
+            except OSError as e:
+                logger.warning(f"Could not remove stale description cache {entry.path}: {e}")
+
+
+def source_paths(data_dir=DATA_DIR):
+    return [os.path.join(data_dir, name) for name in (LANDMARKS_FILE, MUNICIPALITIES_FILE)]
+
+
+def snapshot_path(data_dir=DATA_DIR):
+    return os.path.join(data_dir, "cache", SNAPSHOT_FILE)
+
+
+class PlaceStore:
+    def __init__(self, latitudes, longitudes, rows, descriptions, fingerprint=None):
+        """`rows` are (id, name, category, source_file, municipality) tuples in array order.
+
+        `descriptions` answers read(row) and close(): a DescriptionFile or a PlaceSnapshot.
+        """
+        self.latitudes = latitudes
+        self.longitudes = longitudes
+        self.places = [Place(self, row, name, category, source_file, municipality, id)
+                       for row, (id, name, category, source_file, municipality) in enumerate(rows)]
+        self._descriptions = descriptions
+        self.fingerprint = fingerprint
+        self._build_indexes()
+
+    @classmethod
+    def from_records(cls, records, municipality_of=None, description_path=None, fingerprint=None):
+        """Build the store from JSON records; `municipality_of` maps landmark ids to municipality keys."""
+        municipality_of = municipality_of or {}
+        count = len(records)
+        latitudes = np.full(count, np.nan, dtype=np.float64)
+        longitudes = np.full(count, np.nan, dtype=np.float64)
+        rows = []
+        ids = unique_place_ids(records)
+        for row, record in enumerate(records):
+            coordinates = record_coordinates(record)
+            if coordinates:
+                latitudes[row], longitudes[row] = coordinates
+            if record["category"] == "Municipality":
+                municipality = municipality_key(record)
+            else:
+                municipality = municipality_of.get(place_id(record))
+            rows.append((ids[row], record["name"], record["category"], record["source_file"], municipality))
+        descriptions = DescriptionFile.open_or_build(
+            description_path or os.path.join(CACHE_DIR, "place_descriptions.json.bin"),
+            [record.get("description") for record in records],
+        )
+        return cls(latitudes, longitudes, rows, descriptions, fingerprint)
+
+    @classmethod
+    def from_json(cls, data_dir=DATA_DIR):
+        """Parse the corrected JSON files; descriptions go to a cache file keyed by their contents."""
+        paths = source_paths(data_dir)
+        landmarks, municipalities = (load_json_file(path) for path in paths)
+        fingerprint = source_fingerprint(paths)
+        description_path = os.path.join(data_dir, "cache", f"place_descriptions-{fingerprint[:8].hex()}.json.bin")
+        store = cls.from_records(landmarks + municipalities, assign_municipalities(landmarks, municipalities),
+                                 description_path, fingerprint)
+        remove_stale_descriptions(description_path)
+        return store
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        """Wrap a PlaceSnapshot; coordinates and descriptions stay in the mapped file."""
+        rows = zip(*(snapshot.column(field) for field in ("id", "name", "category", "source_file", "municipality")))
+        rows = [(id, name, category, source_file or None, municipality or None)
+                for id, name, category, source_file, municipality in rows]
+        return cls(snapshot.latitudes, snapshot.longitudes, rows, snapshot, snapshot.fingerprint)
+
+    @classmethod
+    def load(cls, data_dir=DATA_DIR):
+        """Map the snapshot when it matches the JSON files, else parse them and rebuild the snapshot."""
+        path = snapshot_path(data_dir)
+        fingerprint = source_fingerprint(source_paths(data_dir))
+        try:
+            store = cls.from_snapshot(PlaceSnapshot(path, fingerprint))
+            source = "snapshot"
+        except SnapshotError as e:
+            logger.warning(f"Place snapshot not used ({e}); loading the JSON files.")
+            store = cls.from_json(data_dir)
+            source = "JSON"
+            try:
+                write_snapshot(path, store, fingerprint)
+            except OSError as e:
+                logger.warning(f"Could not write the place snapshot {path}: {e}")
+        logger.info(f"Place store loaded from {source}: {len(store.landmarks)} landmarks, "
+                    f"{len(store.municipalities)} municipalities, {len(store.by_municipality)} municipality keys.")
+        return store
+
+    def _build_indexes(self):
+        self.by_id = {place.id: place for place in self.places}
+        self.by_name = {}
+        self.by_municipality = {}
+        for place in self.places:
+            self.by_name.setdefault(normalize_name(place.name), []).append(place)
+            if place.municipality:
+                self.by_municipality.setdefault(place.municipality, []).append(place)
+        self.landmarks = [place for place in self.places if place.category == "Landmark"]
+        self.municipalities = [place for place in self.places if place.category == "Municipality"]
+
+    def __len__(self):
+        return len(self.places)
+
+    def __iter__(self):
+        return iter(self.places)
+
+    def get(self, place_id):
+        return self.by_id.get(place_id)
+
+    def find_by_name(self, name):
+        """Places whose accent-folded name matches, e.g. "anasco" finds "Añasco, Puerto Rico"."""
+        return list(self.by_name.get(normalize_name(name), ()))
+
+    def in_municipality(self, key):
+        return list(self.by_municipality.get(key, ()))
+
+    def coordinates(self, row):
+        latitude, longitude = self.latitudes[row], self.longitudes[row]
+        if np.isnan(latitude):
+            return None
+        return float(latitude), float(longitude)
+
+    def description(self, row):
+        return self._descriptions.read(row)
+
+    def close(self):
+        self._descriptions.close()
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_place_store(data_dir=DATA_DIR):
+    """Return the process-wide store, loaded from `data_dir` on first use, so each process maps the data once."""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = PlaceStore.load(data_dir)
+    return _default_store
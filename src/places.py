@@ -0,0 +1,180 @@
+import ast
+import json
+import logging
+import os
+import re
+import unicodedata
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = "../data"
+LANDMARKS_FILE = "landmarks_corrected.json"
+MUNICIPALITIES_FILE = "municipalities_corrected.json"
+
+
+# -------------------------
+# 1. Loading
+# -------------------------
+def load_json_file(filename):
+    try:
+        with open(filename, "r", encoding="utf-8") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        logger.error(f"{filename} not found!")
+        return []
+    except json.JSONDecodeError:
+        logger.error(f"Error decoding JSON from {filename}")
+        return []
+
+
+def load_places(data_dir=DATA_DIR):
+    """Return (landmarks, municipalities) as loaded from the corrected JSON files."""
+    landmarks = load_json_file(os.path.join(data_dir, LANDMARKS_FILE))
+    municipalities = load_json_file(os.path.join(data_dir, MUNICIPALITIES_FILE))
+    return landmarks, municipalities
+
+
+# -------------------------
+# 2. Record Helpers
+# -------------------------
+def place_id(record):
+    """Stable id of a place: its source file name without extension.
+
+    Names are not unique (e.g. two "Dos Bocas Lake" pages), source files are.
+    A record that already carries an id (a PlaceStore Place) keeps it.
+    """
+    return record.get("id") or os.path.splitext(record["source_file"])[0].lower()
+
+
+def unique_place_ids(records):
+    """place_id of each record, qualified with the category where two records share it.
+
+    Source files are only unique within a category: the landmark
+    "orocovis.txt" and the municipality "Orocovis.txt" both give "orocovis".
+    Municipalities keep the bare id and the others become e.g.
+    "landmark:orocovis", so lookups by id keep both.
+    """
+    ids = [place_id(record) for record in records]
+    counts = Counter(ids)
+    for i, record in enumerate(records):
+        if counts[ids[i]] > 1 and record["category"] != "Municipality":
+            qualified = f"{record['category'].lower()}:{ids[i]}"
+            logger.warning(f"Place id {ids[i]!r} is shared by several records; "
+                           f"{record['source_file']} ({record['category']}) is {qualified!r}.")
+            ids[i] = qualified
+    return ids
+
+
+def record_coordinates(record):
+    """Return (latitude, longitude) or None.
+
+    Some landmark records have latitude and longitude swapped; Puerto Rico is
+    north of the equator and west of Greenwich, so a negative latitude with a
+    positive longitude is flipped back.
+    """
+    coordinates = record.get("coordinates") or {}
+    latitude, longitude = coordinates.get("latitude"), coordinates.get("longitude")
+    if latitude is None or longitude is None:
+        return None
+    if latitude < 0 < longitude:
+        latitude, longitude = longitude, latitude
+    return latitude, longitude
+
+
+def description_paragraphs(record):
+    """Return the description as a list of paragraphs.
+
+    In landmarks_corrected.json the description is the string repr of a list.
+    """
+    description = record.get("description") or []
+    if isinstance(description, list):
+        return [str(p) for p in description]
+    if description.startswith("[") and description.endswith("]"):
+        try:
+            paragraphs = ast.literal_eval(description)
+            if isinstance(paragraphs, list):
+                return [str(p) for p in paragraphs]
+        except (ValueError, SyntaxError):
+            description = description[1:-1].strip("'\"")
+    return [description]
+
+
+def description_text(record):
+    return " ".join(p.strip() for p in description_paragraphs(record) if p.strip())
+
+
+def fold_accents(text):
+    """Lowercase and strip diacritics, e.g. "Añasco" -> "anasco"."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def normalize_name(name):
+    """Accent-folded place name without the ", Puerto Rico" suffix."""
+    name = fold_accents(name).strip()
+    if name.endswith(", puerto rico"):
+        name = name[: -len(", puerto rico")]
+    return name.strip()
+
+
+# -------------------------
+# 3. Municipalities
+# -------------------------
+def municipality_key(record):
+    """Folded municipality name used as `municipality` metadata, e.g. "bayamon".
+
+    Taken from the source file, because some names in the JSON lost their
+    accented letters ("Bayamn, Puerto Rico").
+    """
+    return fold_accents(os.path.splitext(record["source_file"])[0]).strip()
+
+
+MUNICIPALITY_MENTION_PATTERNS = (
+    r"\b{key}, (?:puerto rico|a municipality)",
+    r"\bmunicipality of {key}\b",
+    r"^{key} barrio-pueblo\b|\({key}\)",
+    r"\b(?:in|of|on) {key}\b",
+)
+
+
+def assign_municipalities(landmarks, municipalities, max_distance_km=20.0):
+    """Map each landmark's place_id to the key of its municipality.
+
+    The name and first paragraph are searched for mentions such as
+    "Ponce, Puerto Rico", "municipality of Ponce" or "in Ponce", strongest
+    pattern first. Landmarks that mention none get the municipality with the
+    nearest centre within `max_distance_km`; the rest are left out.
+    """
+    from spatial import SpatialIndex  # spatial imports this module
+
+    keys = sorted({municipality_key(m) for m in municipalities}, key=len, reverse=True)
+    # One alternation of all keys per pattern, so the leftmost match is the first mention
+    alternation = "|".join(re.escape(key) for key in keys)
+    patterns = []
+    for pattern in MUNICIPALITY_MENTION_PATTERNS:
+        parts = pattern.split("{key}")
+        patterns.append(re.compile(parts[0] + "".join(
+            f"(?P<key{i}>{alternation}){part}" for i, part in enumerate(parts[1:])
+        )))
+    centres = SpatialIndex(
+        (coordinates[0], coordinates[1], municipality_key(m))
+        for m in municipalities
+        if (coordinates := record_coordinates(m))
+    )
+    assignments = {}
+    for landmark in landmarks:
+        paragraphs = description_paragraphs(landmark)
+        text = fold_accents(landmark["name"]) + "\n" + (fold_accents(paragraphs[0]) if paragraphs else "")
+        for regex in patterns:
+            match = regex.search(text)
+            if match:
+                assignments[place_id(landmark)] = next(key for key in match.groupdict().values() if key)
+                break
+        else:
+            coordinates = record_coordinates(landmark)
+            if coordinates:
+                nearest = centres.nearest(coordinates[0], coordinates[1], k=1)
+                if nearest and nearest[0][0] <= max_distance_km:
+                    assignments[place_id(landmark)] = nearest[0][3]
+    return assignments
@@ -0,0 +1,188 @@
+"""Precomputed, memory-mapped haversine distance matrix over all points of interest.
+
+The matrix covers every landmark and municipality with coordinates in
+`data/*_corrected.json`. It is stored as a float32 `.npy` file next to a
+small JSON index and is rebuilt only when the source JSON changes. Loading
+maps the file read-only, so it takes milliseconds and every worker process
+shares the same pages through the OS cache.
+
+Usage (from the src folder):
+    python poi_distances.py            # build if stale, then print a summary
+    python poi_distances.py --rebuild  # force a rebuild
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import time
+
+import numpy as np
+
+from places import LANDMARKS_FILE, MUNICIPALITIES_FILE, load_places, record_coordinates, unique_place_ids
+from spatial import EARTH_RADIUS_KM
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DATA_DIR = "../data"
+DEFAULT_CACHE_DIR = "../data/cache"
+MATRIX_FILE = "poi_distances.npy"
+INDEX_FILE = "poi_distances.json"
+FORMAT_VERSION = 2
+
+
+def source_hash(data_dir):
+    digest = hashlib.sha256()
+    for filename in (LANDMARKS_FILE, MUNICIPALITIES_FILE):
+        with open(os.path.join(data_dir, filename), "rb") as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+def haversine_matrix(latitudes, longitudes):
+    """All-pairs haversine distances in km, computed with broadcasting."""
+    phi = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lam = np.radians(np.asarray(longitudes, dtype=np.float64))
+    d_phi = phi[:, None] - phi[None, :]
+    d_lam = lam[:, None] - lam[None, :]
+    a = np.sin(d_phi / 2) ** 2 + np.cos(phi)[:, None] * np.cos(phi)[None, :] * np.sin(d_lam / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+# -------------------------
+# 1. Build
+# -------------------------
+def build(data_dir=DEFAULT_DATA_DIR, cache_dir=DEFAULT_CACHE_DIR):
+    start = time.perf_counter()
+    landmarks, municipalities = load_places(data_dir)
+    ids, names, categories, latitudes, longitudes = [], [], [], [], []
+    records = municipalities + landmarks
+    for record, id in zip(records, unique_place_ids(records)):
+        coordinates = record_coordinates(record)
+        if coordinates is None:
+            continue
+        ids.append(id)
+        names.append(record["name"])
+        categories.append(record["category"])
+        latitudes.append(coordinates[0])
+        longitudes.append(coordinates[1])
+
+    matrix = haversine_matrix(latitudes, longitudes).astype(np.float32)
+    os.makedirs(cache_dir, exist_ok=True)
+    matrix_path = os.path.join(cache_dir, MATRIX_FILE)
+    index_path = os.path.join(cache_dir, INDEX_FILE)
+
+    # Write to temporary files and rename, so readers never see a half-written matrix
+    with open(matrix_path + ".tmp", "wb") as file:
+        np.save(file, matrix)
+    with open(index_path + ".tmp", "w", encoding="utf-8") as file:
+        json.dump({
+            "version": FORMAT_VERSION,
+            "source_hash": source_hash(data_dir),
+            "ids": ids,
+            "names": names,
+            "categories": categories,
+            "latitudes": latitudes,
+            "longitudes": longitudes,
+        }, file, ensure_ascii=False)
+    os.replace(matrix_path + ".tmp", matrix_path)
+    os.replace(index_path + ".tmp", index_path)
+    logger.info(f"Distance matrix {matrix.shape} built in {time.perf_counter() - start:.2f}s -> {matrix_path}")
+
+
+def is_stale(data_dir=DEFAULT_DATA_DIR, cache_dir=DEFAULT_CACHE_DIR):
+    index_path = os.path.join(cache_dir, INDEX_FILE)
+    if not os.path.exists(index_path) or not os.path.exists(os.path.join(cache_dir, MATRIX_FILE)):
+        return True
+    with open(index_path, "r", encoding="utf-8") as file:
+        index = json.load(file)
+    return index.get("version") != FORMAT_VERSION or index.get("source_hash") != source_hash(data_dir)
+
+
+# -------------------------
+# 2. Read-only API
+# -------------------------
+class DistanceMatrix:
+    """Read-only view over the memory-mapped matrix, addressed by place id."""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        with open(os.path.join(cache_dir, INDEX_FILE), "r", encoding="utf-8") as file:
+            index = json.load(file)
+        self.ids = index["ids"]
+        self.names = index["names"]
+        self.categories = np.array(index["categories"])
+        self.latitudes = np.array(index["latitudes"])
+        self.longitudes = np.array(index["longitudes"])
+        self.position = {place: i for i, place in enumerate(self.ids)}
+        self.matrix = np.load(os.path.join(cache_dir, MATRIX_FILE), mmap_mode="r")
+
+    @classmethod
+    def load(cls, data_dir=DEFAULT_DATA_DIR, cache_dir=DEFAULT_CACHE_DIR):
+        """Load the matrix, rebuilding it first if the source data changed."""
+        if is_stale(data_dir, cache_dir):
+            build(data_dir, cache_dir)
+        return cls(cache_dir)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, place):
+        return place in self.position
+
+    def row(self, place):
+        """Distances (km) from `place` to every point, in `self.ids` order."""
+        return self.matrix[self.position[place]]
+
+    def distance(self, a, b):
+        return float(self.matrix[self.position[a], self.position[b]])
+
+    def _mask(self, category):
+        if category is None:
+            return None
+        return self.categories == category
+
+    def nearest(self, place, k=5, category=None):
+        """Return up to `k` (id, distance_km) closest to `place`, excluding itself."""
+        row = np.array(self.row(place), dtype=np.float32)
+        row[self.position[place]] = np.inf
+        mask = self._mask(category)
+        if mask is not None:
+            row[~mask] = np.inf
+        k = min(k, int(np.isfinite(row).sum()))
+        if k <= 0:
+            return []
+        candidates = np.argpartition(row, k - 1)[:k]
+        candidates = candidates[np.argsort(row[candidates])]
+        return [(self.ids[i], float(row[i])) for i in candidates]
+
+    def within(self, place, radius_km, category=None):
+        """Return every (id, distance_km) within `radius_km` of `place`, closest first."""
+        row = self.row(place)
+        selected = row <= radius_km
+        selected[self.position[place]] = False
+        mask = self._mask(category)
+        if mask is not None:
+            selected &= mask
+        indices = np.flatnonzero(selected)
+        indices = indices[np.argsort(row[indices])]
+        return [(self.ids[i], float(row[i])) for i in indices]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the memory-mapped POI distance matrix.")
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR)
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--rebuild", action="store_true", help="rebuild even if the data did not change")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s",
+                        datefmt="%Y-%m-%d %H:%M:%S")
+    if args.rebuild:
+        build(args.data_dir, args.cache_dir)
+    start = time.perf_counter()
+    matrix = DistanceMatrix.load(args.data_dir, args.cache_dir)
+    logger.info(f"Loaded {len(matrix)} points in {(time.perf_counter() - start) * 1000:.1f} ms.")
+
+
+if __name__ == "__main__":
+    main()
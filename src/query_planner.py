@@ -0,0 +1,155 @@
+"""Query planner: turns locality hints in a question into Chroma `where` filters.
+
+Municipality names are matched in the accent-folded question ("bayamon",
+"Bayamón" and "BAYAMON" all match). For the place collections the plan
+keeps records tagged with a matched municipality or lying in a bounding box
+around its centre, so a landmark just across the border still qualifies.
+Words like "towns" or "landmarks" add a category filter and skip the other
+place collection. News pages carry no locality metadata and are left
+unfiltered.
+
+A filter only applies to collections whose metadata lists every field it
+uses under FILTER_FIELDS_KEY (build_index.py records them). Stores indexed
+before those fields existed would match nothing and be queried twice, so
+they are searched without the filter.
+"""
+import logging
+import re
+
+from place_store import get_place_store
+from places import DATA_DIR, fold_accents, municipality_key, record_coordinates
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RADIUS_KM = 15.0
+KM_PER_DEGREE = 111.32
+PLACE_COLLECTIONS = ("municipalities", "landmarks")
+# Collection metadata key holding the comma-separated metadata fields every record was indexed with
+FILTER_FIELDS_KEY = "filter_fields"
+CATEGORY_COLLECTIONS = {"Landmark": "landmarks", "Municipality": "municipalities"}
+CATEGORY_HINTS = {
+    "landmark": "Landmark",
+    "landmarks": "Landmark",
+    "municipality": "Municipality",
+    "municipalities": "Municipality",
+    "town": "Municipality",
+    "towns": "Municipality",
+    "pueblo": "Municipality",
+    "pueblos": "Municipality",
+}
+
+
+def indexed_fields(collection):
+    """The metadata fields `collection` was indexed with, per its FILTER_FIELDS_KEY entry."""
+    metadata = getattr(collection, "metadata", None) or {}
+    return {field for field in metadata.get(FILTER_FIELDS_KEY, "").split(",") if field}
+
+
+def where_fields(where):
+    """The metadata fields a Chroma where filter refers to."""
+    fields = set()
+    for key, value in where.items():
+        if key.startswith("$"):
+            for clause in value:
+                fields |= where_fields(clause)
+        else:
+            fields.add(key)
+    return fields
+
+
+class QueryPlan:
+    def __init__(self, municipalities=(), category=None, bbox=None, where=None):
+        self.municipalities = list(municipalities)
+        self.category = category
+        self.bbox = bbox
+        self.where = where or {}  # collection name -> Chroma where filter
+
+    def __bool__(self):
+        return bool(self.where)
+
+    def select(self, collections):
+        """Drop the place collection that cannot hold the requested category."""
+        if self.category is None:
+            return collections
+        keep = CATEGORY_COLLECTIONS[self.category]
+        return {name: c for name, c in collections.items() if name not in PLACE_COLLECTIONS or name == keep}
+
+    def where_for(self, collections):
+        """The filters of the collections indexed with every field they use."""
+        where = {}
+        for name, clause in self.where.items():
+            collection = collections.get(name)
+            if collection is None:
+                continue
+            missing = where_fields(clause) - indexed_fields(collection)
+            if missing:
+                logger.info(f"{name} was indexed without {', '.join(sorted(missing))}; not filtering it.")
+                continue
+            where[name] = clause
+        return where
+
+    def __repr__(self):
+        return f"QueryPlan(municipalities={self.municipalities}, category={self.category}, bbox={self.bbox})"
+
+
+class QueryPlanner:
+    def __init__(self, municipalities, radius_km=DEFAULT_RADIUS_KM):
+        """`municipalities` are the records of municipalities_corrected.json."""
+        self.radius_km = radius_km
+        self.centres = {}
+        for record in municipalities:
+            coordinates = record_coordinates(record)
+            self.centres[municipality_key(record)] = coordinates
+        # Longest names first, so "san juan" wins over shorter overlapping names
+        names = sorted(self.centres, key=len, reverse=True)
+        self.pattern = re.compile(r"\b(" + "|".join(re.escape(name) for name in names) + r")\b")
+        self.category_pattern = re.compile(r"\b(" + "|".join(CATEGORY_HINTS) + r")\b")
+
+    @classmethod
+    def from_data(cls, data_dir=DATA_DIR, radius_km=DEFAULT_RADIUS_KM):
+        return cls(get_place_store(data_dir).municipalities, radius_km)
+
+    def find_municipalities(self, query):
+        return list(dict.fromkeys(self.pattern.findall(fold_accents(query))))
+
+    def find_category(self, query):
+        match = self.category_pattern.search(fold_accents(query))
+        return CATEGORY_HINTS[match.group(1)] if match else None
+
+    def bounding_box(self, municipalities):
+        """(min_lat, min_lon, max_lat, max_lon) covering `radius_km` around each centre."""
+        centres = [self.centres[name] for name in municipalities if self.centres.get(name)]
+        if not centres:
+            return None
+        d_lat = self.radius_km / KM_PER_DEGREE
+        # A degree of longitude shrinks with latitude; ~0.95 at Puerto Rico's 18°N
+        d_lon = d_lat / 0.95
+        return (
+            min(lat for lat, _ in centres) - d_lat,
+            min(lon for _, lon in centres) - d_lon,
+            max(lat for lat, _ in centres) + d_lat,
+            max(lon for _, lon in centres) + d_lon,
+        )
+
+    def plan(self, query):
+        municipalities = self.find_municipalities(query)
+        category = self.find_category(query)
+        bbox = self.bounding_box(municipalities)
+        clauses = []
+        if municipalities:
+            locality = [{"municipality": {"$in": municipalities}}]
+            if bbox:
+                min_lat, min_lon, max_lat, max_lon = bbox
+                locality.append({"$and": [
+                    {"latitude": {"$gte": min_lat}}, {"latitude": {"$lte": max_lat}},
+                    {"longitude": {"$gte": min_lon}}, {"longitude": {"$lte": max_lon}},
+                ]})
+            clauses.append(locality[0] if len(locality) == 1 else {"$or": locality})
+        if category:
+            clauses.append({"category": category})
+        if not clauses:
+            return QueryPlan()
+        where = clauses[0] if len(clauses) == 1 else {"$and": clauses}
+        plan = QueryPlan(municipalities, category, bbox, {name: where for name in PLACE_COLLECTIONS})
+        logger.info(f"Query plan: {plan}")
+        return plan
@@ -0,0 +1,223 @@
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+from embeddings import DEFAULT_MODEL_ID, embedding_model_id, get_embedding_function, get_query_embedder
+from lexical import BM25Index
+
+logger = logging.getLogger(__name__)
+
+# Streamlit re-executes the app script on every interaction, but imported
+# modules stay in sys.modules, so everything cached here lives for the whole
+# process and is shared by all sessions.
+_lock = threading.RLock()
+_clients = {}
+_collections = {}
+_lexical_indexes = {}
+_warmed_up = set()
+# Specs warmup() already tried, including missing or failing collections, so
+# Streamlit reruns do not re-read the store files for them
+_warmup_attempted = set()
+
+# All collections live in one store, so each process holds a single client,
+# SQLite handle and set of HNSW files. migrate_store.py merges older stores.
+STORE_PATH = os.getenv("CHROMA_PATH", "../chromadb")
+HNSW_SEGMENT_FILES = ("header.bin", "data_level0.bin", "length.bin", "link_lists.bin")
+PRELOAD_CHUNK_BYTES = 1024 * 1024
+
+# name -> (store path, collection name), as used by the apps
+DEFAULT_COLLECTIONS = {
+    "municipalities": (STORE_PATH, "municipalities"),
+    "landmarks": (STORE_PATH, "landmarks"),
+    "news_articles": (STORE_PATH, "news_articles"),
+}
+
+
+# -------------------------
+# 1. Shared Clients and Collections
+# -------------------------
+def get_client(path):
+    """Return the process-wide PersistentClient for `path`, opening it once."""
+    key = os.path.abspath(path)
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            import chromadb  # takes about a second; deferred so importing this module is cheap
+
+            client = chromadb.PersistentClient(path=path)
+            _clients[key] = client
+            logger.info(f"ChromaDB client initialized for {key}.")
+        return client
+
+
+def get_collection(path, collection_name):
+    """Return the shared handle of a collection, or None if it cannot be loaded.
+
+    Failures are not cached, so a collection that appears later is picked up
+    on the next call.
+    """
+    key = (os.path.abspath(path), collection_name)
+    with _lock:
+        collection = _collections.get(key)
+        if collection is not None:
+            return collection
+        try:
+            collection = get_client(path).get_collection(collection_name)
+        except Exception as e:
+            logger.error(f"ERROR: loading collection {collection_name} from {path}: {e}")
+            return None
+        _collections[key] = collection
+        logger.info(f"SUCCESS: loaded collection: {collection_name}")
+        return collection
+
+
+def get_collections(specs=None):
+    """Return a name -> collection (or None) dict for `specs`."""
+    specs = specs or DEFAULT_COLLECTIONS
+    return {name: get_collection(path, collection_name) for name, (path, collection_name) in specs.items()}
+
+
+def get_lexical_index(path, collection_name):
+    """Return the shared BM25 index over a collection, building it on first use."""
+    key = (os.path.abspath(path), collection_name)
+    with _lock:
+        index = _lexical_indexes.get(key)
+        if index is not None:
+            return index
+        collection = get_collection(path, collection_name)
+        if collection is None:
+            return None
+        try:
+            index = BM25Index.from_collection(collection)
+        except Exception as e:
+            logger.error(f"ERROR: building BM25 index for {collection_name}: {e}")
+            return None
+        _lexical_indexes[key] = index
+        return index
+
+
+def get_lexical_indexes(specs=None):
+    specs = specs or DEFAULT_COLLECTIONS
+    return {name: get_lexical_index(path, collection_name) for name, (path, collection_name) in specs.items()}
+
+
+# -------------------------
+# 2. Warmup and Health Check
+# -------------------------
+def preload_store_files(path):
+    """Read the store's SQLite file and HNSW segment files once to pull them into the page cache.
+
+    Only the store's own segment directories are read, not nested legacy
+    stores. Returns the number of bytes read.
+    """
+    start = time.perf_counter()
+    files = [os.path.join(path, "chroma.sqlite3")]
+    if os.path.isdir(path):
+        for entry in os.scandir(path):
+            if entry.is_dir() and os.path.exists(os.path.join(entry.path, "header.bin")):
+                files.extend(os.path.join(entry.path, name) for name in HNSW_SEGMENT_FILES)
+    total = 0
+    for filename in files:
+        try:
+            with open(filename, "rb") as file:
+                while chunk := file.read(PRELOAD_CHUNK_BYTES):
+                    total += len(chunk)
+        except FileNotFoundError:
+            continue
+    logger.info(f"Preloaded {total / 1e6:.1f} MB of {path} in {time.perf_counter() - start:.2f}s.")
+    return total
+
+
+def warmup(specs=None, lexical=False):
+    """Open every collection and load the embedding model once per process.
+
+    Each spec is tried once per process, even when its collection is missing
+    or fails to warm up. The store files are read once to fault them into the page cache, then a
+    one-result query per collection loads the HNSW index so the first user
+    query does not pay for it. With `lexical`, the BM25 indexes
+    are built as well.
+    """
+    specs = specs or DEFAULT_COLLECTIONS
+    if lexical:
+        get_lexical_indexes(specs)
+    with _lock:
+        pending = {
+            name: spec for name, spec in specs.items()
+            if (os.path.abspath(spec[0]), spec[1]) not in _warmup_attempted
+        }
+        if not pending:
+            return
+        _warmup_attempted.update((os.path.abspath(path), name) for path, name in pending.values())
+        start = time.perf_counter()
+        for path in {spec[0] for spec in pending.values()}:
+            preload_store_files(path)
+        collections = get_collections(pending)
+        try:
+            embedding_function = get_embedding_function()
+            embedding = embedding_function(["warmup"])[0]
+        except Exception as e:
+            logger.error(f"ERROR: loading the embedding model during warmup: {e}")
+            return
+        model_id = embedding_model_id(embedding_function)
+        for name, collection in collections.items():
+            if collection is None:
+                continue
+            indexed_with = (collection.metadata or {}).get("embedding_model", DEFAULT_MODEL_ID)
+            if indexed_with != model_id:
+                logger.error(f"ERROR: {name} was indexed with {indexed_with} but queries use {model_id}; "
+                             f"re-run build_index.py with the same EMBEDDING_BACKEND.")
+            try:
+                collection.query(query_embeddings=[embedding], n_results=1)
+            except Exception as e:
+                logger.warning(f"Warmup query on {name} failed: {e}")
+                continue
+            path, collection_name = pending[name]
+            _warmed_up.add((os.path.abspath(path), collection_name))
+        logger.info(f"Resources warmed up in {time.perf_counter() - start:.2f}s.")
+
+
+def health_check(specs=None):
+    """Report whether the embedding model and each collection are usable."""
+    status = {"collections": {}}
+    try:
+        embedding_function = get_embedding_function()
+        embedding_function(["health check"])
+        status["embedding_function"] = "ok"
+        status["embedding_model"] = embedding_model_id(embedding_function)
+        status["query_embedder"] = get_query_embedder().stats()
+    except Exception as e:
+        status["embedding_function"] = f"error: {e}"
+
+    for name, collection in get_collections(specs).items():
+        if collection is None:
+            status["collections"][name] = {"status": "missing"}
+            continue
+        start = time.perf_counter()
+        try:
+            count = collection.count()
+            path, collection_name = (specs or DEFAULT_COLLECTIONS)[name]
+            status["collections"][name] = {
+                "status": "ok",
+                "count": count,
+                "warmed_up": (os.path.abspath(path), collection_name) in _warmed_up,
+                "latency_ms": round((time.perf_counter() - start) * 1000, 2),
+            }
+        except Exception as e:
+            status["collections"][name] = {"status": f"error: {e}"}
+
+    status["open_clients"] = len(_clients)
+    status["healthy"] = status["embedding_function"] == "ok" and all(
+        c["status"] == "ok" for c in status["collections"].values()
+    )
+    return status
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    warmup()
+    report = health_check()
+    print(json.dumps(report, indent=2))
+    sys.exit(0 if report["healthy"] else 1)
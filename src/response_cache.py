@@ -0,0 +1,155 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from array import array
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = "response_cache.sqlite3"
+DEFAULT_SIMILARITY_THRESHOLD = 0.95
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 5000
+# Most recently used entries scored per lookup for one context key
+DEFAULT_MAX_CANDIDATES = 256
+
+
+def _cosine_similarities(query, matrix):
+    """Cosine similarity of `query` with every row of `matrix`, 0 where a norm is 0."""
+    norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+    dots = matrix @ query
+    return np.divide(dots, norms, out=np.zeros_like(dots), where=norms > 0)
+
+
+def _context_key(context_ids, model_params):
+    """Hash of everything besides the query that determines the reply."""
+    payload = json.dumps({"context_ids": sorted(context_ids), "params": model_params}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SemanticResponseCache:
+    """SQLite-backed cache of LLM replies looked up by query similarity.
+
+    An entry is reused when it was produced from the same retrieved context
+    ids and model parameters, and its query embedding has a cosine similarity
+    of at least `similarity_threshold` with the new query. Entries expire
+    after `ttl_seconds` and the least recently used ones are evicted beyond
+    `max_entries`. A lookup scores at most `max_candidates` entries, the most
+    recently used, in one NumPy product. The database file survives
+    Streamlit restarts.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, similarity_threshold=DEFAULT_SIMILARITY_THRESHOLD,
+                 ttl_seconds=DEFAULT_TTL_SECONDS, max_entries=DEFAULT_MAX_ENTRIES,
+                 max_candidates=DEFAULT_MAX_CANDIDATES):
+        self.path = path
+        self.max_candidates = max_candidates
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " context_key TEXT NOT NULL,"
+            " embedding BLOB NOT NULL,"
+            " query TEXT,"
+            " reply TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_context_key ON responses (context_key)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON responses (last_access)")
+        self._conn.commit()
+        logger.info(f"Response cache opened at {path}.")
+
+    def get(self, query_embedding, context_ids, model_params):
+        """Return the cached reply for a similar query, or None on a miss."""
+        key = _context_key(context_ids, model_params)
+        query = np.asarray(query_embedding, dtype=np.float32)
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, embedding, reply FROM responses WHERE context_key = ? AND created_at >= ?"
+                " ORDER BY last_access DESC LIMIT ?",
+                (key, now - self.ttl_seconds, self.max_candidates),
+            ).fetchall()
+            # Entries written by an embedding model of another size cannot match
+            rows = [row for row in rows if len(row[1]) == query.nbytes]
+            best_id = None
+            if rows:
+                matrix = np.frombuffer(b"".join(blob for _, blob, _ in rows), dtype=np.float32)
+                matrix = matrix.reshape(len(rows), -1)
+                similarities = _cosine_similarities(query, matrix)
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.similarity_threshold:
+                    best_id, best_reply, best_similarity = rows[best][0], rows[best][2], float(similarities[best])
+            if best_id is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE id = ?", (now, best_id))
+            self._conn.commit()
+            self.hits += 1
+        logger.info(f"Response cache hit (similarity {best_similarity:.3f}).")
+        return best_reply
+
+    def put(self, query_embedding, context_ids, model_params, reply, query=None):
+        key = _context_key(context_ids, model_params)
+        blob = array("f", query_embedding).tobytes()
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO responses (context_key, embedding, query, reply, created_at, last_access)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, blob, query, reply, now, now),
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        self._conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+        self._conn.execute(
+            "DELETE FROM responses WHERE id IN ("
+            " SELECT id FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": size,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_response_cache(**kwargs):
+    """Return the process-wide cache so counters survive Streamlit reruns."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = SemanticResponseCache(**kwargs)
+    return _default_cache
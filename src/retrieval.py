@@ -0,0 +1,193 @@
+import contextvars
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from embeddings import get_query_embedder
+from metrics import record_stage, span
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_N_RESULTS = 3
+DEFAULT_TIMEOUT_SECONDS = 5.0
+DEFAULT_HYBRID_CANDIDATES = 10
+RRF_K = 60
+
+# One pool for the whole process; Chroma queries release the GIL while they
+# wait on SQLite / HNSW, so threads are enough to overlap them.
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="chroma-query")
+
+
+# -------------------------
+# 1. Query Embedding
+# -------------------------
+def embed_query(query, embedding_function=None):
+    """Embed one query through the shared cache and batcher, or directly with `embedding_function`."""
+    with span("embed"):
+        if embedding_function is not None:
+            return embedding_function([query])[0]
+        return get_query_embedder().embed(query)
+
+
+# -------------------------
+# 2. Parallel Fan-out over Collections
+# -------------------------
+def query_collection(collection, query_embedding, n_results=DEFAULT_N_RESULTS, where=None):
+    """Query one collection, with an optional metadata filter.
+
+    Stores indexed before the filter fields existed match nothing, so an
+    empty filtered result falls back to an unfiltered query.
+    """
+    with span("query", collection=collection.name, filtered=where is not None):
+        results = collection.query(query_embeddings=[query_embedding], n_results=n_results, where=where)
+    if where is not None and not results["ids"][0]:
+        logger.info(f"No {collection.name} records match {where}, querying without the filter.")
+        return query_collection(collection, query_embedding, n_results)
+    return results
+
+
+def retrieve_from_collections(query, collections, n_results=DEFAULT_N_RESULTS,
+                              timeout=DEFAULT_TIMEOUT_SECONDS, embedding_function=None,
+                              query_embedding=None, where=None):
+    """Embed `query` once and query every collection in parallel.
+
+    `collections` maps a name to a collection (or None if it failed to load).
+    Returns a dict with the results of the collections that answered within
+    `timeout` seconds, in the same order as `collections`; missing, failing
+    or slow collections are logged and left out. Pass `query_embedding` to
+    reuse an embedding the caller already computed, and `where` (name ->
+    metadata filter, see query_planner.py) to narrow some collections.
+    """
+    where = where or {}
+    available = {name: collection for name, collection in collections.items() if collection is not None}
+    for name in collections:
+        if name not in available:
+            logger.warning(f"Collection {name} is not loaded, skipping it.")
+    if not available:
+        return {}
+
+    if query_embedding is None:
+        query_embedding = embed_query(query, embedding_function)
+    # Each worker runs in a copy of the caller's context so its span joins the caller's trace
+    futures = {
+        name: _executor.submit(contextvars.copy_context().run, query_collection, collection, query_embedding,
+                               n_results, where.get(name))
+        for name, collection in available.items()
+    }
+    # All queries start together, so a single deadline is a per-collection timeout.
+    wait(futures.values(), timeout=timeout)
+
+    results = {}
+    for name, future in futures.items():
+        if not future.done():
+            future.cancel()
+            logger.warning(f"Collection {name} did not answer within {timeout}s, skipping it.")
+            continue
+        try:
+            results[name] = future.result()
+        except Exception as e:
+            logger.error(f"ERROR: querying collection {name}: {e}")
+    return results
+
+
+def collect_documents(results):
+    """Flatten the query results into a list of non-empty document strings."""
+    documents = []
+    for docs in results.values():
+        if not docs or not docs.get("documents"):
+            continue
+        for doc in docs["documents"][0]:
+            if doc:
+                documents.append(str(doc))
+    return documents
+
+
+def collect_ids(results):
+    """Return the ids of all retrieved documents as `collection:id` strings."""
+    ids = []
+    for name, docs in results.items():
+        if not docs or not docs.get("ids"):
+            continue
+        ids.extend(f"{name}:{doc_id}" for doc_id in docs["ids"][0])
+    return ids
+
+
+# -------------------------
+# 3. Hybrid Dense + BM25 Retrieval
+# -------------------------
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """Fuse ranked id lists: score(id) = sum over lists of 1 / (k + rank)."""
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def hybrid_retrieve(query, collections, lexical_indexes, n_results=DEFAULT_N_RESULTS,
+                    candidates=DEFAULT_HYBRID_CANDIDATES, timeout=DEFAULT_TIMEOUT_SECONDS,
+                    embedding_function=None, query_embedding=None, where=None):
+    """Dense search plus BM25 per collection, fused with reciprocal-rank fusion.
+
+    `lexical_indexes` maps a collection name to a BM25Index (or None). Each
+    stage pulls `candidates` hits and the fused top `n_results` are returned
+    in the same shape as Chroma query results, so collect_documents and
+    collect_ids work unchanged. `where` filters both stages like in
+    retrieve_from_collections. Returns (results, timings in ms).
+    """
+    where = where or {}
+    timings = {}
+    start = time.perf_counter()
+    if query_embedding is None and any(c is not None for c in collections.values()):
+        query_embedding = embed_query(query, embedding_function)
+    timings["embed_ms"] = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    dense = retrieve_from_collections(query, collections, n_results=candidates, timeout=timeout,
+                                      query_embedding=query_embedding, where=where)
+    timings["dense_ms"] = (time.perf_counter() - start) * 1000
+
+    lexical = {}
+    start = time.perf_counter()
+    for name, index in lexical_indexes.items():
+        if index is not None:
+            with span("lexical", collection=name):
+                lexical[name] = index.search(query, candidates, where=where.get(name))
+                if not lexical[name] and where.get(name):
+                    lexical[name] = index.search(query, candidates)
+    timings["lexical_ms"] = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    results = {}
+    for name in collections:
+        if name not in dense and name not in lexical:
+            continue
+        by_id = {}
+        dense_ranking = []
+        if name in dense and dense[name].get("ids"):
+            docs = dense[name]
+            for i, doc_id in enumerate(docs["ids"][0]):
+                document = docs["documents"][0][i] if docs.get("documents") else None
+                metadata = docs["metadatas"][0][i] if docs.get("metadatas") else None
+                by_id[doc_id] = (document, metadata)
+                dense_ranking.append(doc_id)
+        lexical_ranking = []
+        index = lexical_indexes.get(name)
+        for position, _ in lexical.get(name, []):
+            doc_id = index.ids[position]
+            document, metadata = by_id.get(doc_id, (None, None))
+            # Older stores have no document text; fall back to the indexed text
+            by_id[doc_id] = (document or index.documents[position], metadata or index.metadatas[position])
+            lexical_ranking.append(doc_id)
+
+        fused = reciprocal_rank_fusion([dense_ranking, lexical_ranking])[:n_results]
+        results[name] = {
+            "ids": [[doc_id for doc_id, _ in fused]],
+            "documents": [[by_id[doc_id][0] for doc_id, _ in fused]],
+            "metadatas": [[by_id[doc_id][1] for doc_id, _ in fused]],
+            "scores": [[score for _, score in fused]],
+        }
+    timings["fusion_ms"] = (time.perf_counter() - start) * 1000
+    record_stage("fusion", timings["fusion_ms"] / 1000)
+    logger.info("Hybrid retrieval timings: " + ", ".join(f"{k}={v:.1f}" for k, v in timings.items()))
+    return results, timings
@@ -23,31 +23,11 @@ import html
 # ### Functions
 
 # %%
-# Function to clean unwanted characters and fix words
-def clean_text(text):
-    # Remove unwanted characters (e.g., escape sequences like "\xc9")
-    text = re.sub(r'\\[xX][0-9A-Fa-f]{2}', '', text)  # Remove escaped Unicode characters
-    text = re.sub(r'[\r\n\t]', ' ', text)  # Remove newlines and tabs
-    text = re.sub(r'\s+', ' ', text)  # Replace multiple spaces with one
-    text = text.strip()  # Remove leading and trailing spaces
-    return text
-
-# Function to add missing characters like 'ñ'
-def add_missing_characters(text):
-    # Mapping of words that might need 'ñ' or other fixes
-    replacements = {
-        "Aguada": "Aguada",
-        "Aasco": "Añasco",
-        "Catao": "Cataño",
-        "Nio": "Niño",
-        "Peuelas": "Peñuelas"
-        # Add other common words as needed
-    }
-
-    # Replace words based on the mapping
-    for wrong_word, correct_word in replacements.items():
-        text = re.sub(rf'\b{wrong_word}\b', correct_word, text, flags=re.IGNORECASE)
-    return text
+# Text cleaning is shared with ingest.py (see text_normalization.py): escaped UTF-8
+# bytes like "\xc3\xb1" are decoded instead of removed, whitespace is
+# collapsed and words missing a character ("Aasco") are repaired.
+from text_normalization import normalize_text as clean_text
+from text_normalization import normalize_texts
 
 # Function to extract coordinates from the HTML content
 def extract_coordinates(html_content):
@@ -89,11 +69,9 @@ for filename in os.listdir(municipalities_folder):
         title = clean_text(soup.title.string) if soup.title else clean_text(filename.replace(".txt", ""))
         # Remove " - Wikipedia" from the title
         title = title.replace(" - Wikipedia", "")
-        title = add_missing_characters(title)  # Add missing characters to the title
 
         # Extract first 3 paragraphs for description
-        paragraphs = [clean_text(p.get_text(strip=True)) for p in soup.find_all("p")][:3]
-        paragraphs = [add_missing_characters(p) for p in paragraphs]  # Add missing characters to description
+        paragraphs = normalize_texts([p.get_text(strip=True) for p in soup.find_all("p")][:3])
 
         # Extract coordinates (latitude and longitude) from HTML content
         latitude, longitude = extract_coordinates(html_content)
@@ -148,7 +126,7 @@ for filename in os.listdir(landmarks_folder):
 
         # Extract first 3 paragraphs for description
         paragraphs = [p.get_text(strip=True) for p in soup.find_all("p")][:3]
-        paragraphs = [clean_text(paragraph) for paragraph in paragraphs]  # Clean description paragraphs
+        paragraphs = normalize_texts(paragraphs)  # Clean description paragraphs
 
         # Extract coordinates (if available)
         lat, lon = extract_coordinates(html_content)
@@ -0,0 +1,140 @@
+import heapq
+import math
+
+from places import place_id, record_coordinates
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _unit_vector(lat, lon):
+    phi, lam = math.radians(lat), math.radians(lon)
+    return (math.cos(phi) * math.cos(lam), math.cos(phi) * math.sin(lam), math.sin(phi))
+
+
+def _chord_to_km(chord):
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, chord / 2))
+
+
+def _km_to_chord(km):
+    return 2 * math.sin(min(km / EARTH_RADIUS_KM, math.pi) / 2)
+
+
+class SpatialIndex:
+    """KD-tree over points on the sphere, queried by haversine distance.
+
+    Points are stored as 3D unit vectors. The straight-line (chord) distance
+    between unit vectors grows with the great-circle distance, so an ordinary
+    Euclidean KD-tree gives exact haversine nearest neighbours and radius
+    searches.
+    """
+
+    def __init__(self, points):
+        """`points` is an iterable of (latitude, longitude, payload)."""
+        self.points = [(lat, lon, payload) for lat, lon, payload in points]
+        self._vectors = [_unit_vector(lat, lon) for lat, lon, _ in self.points]
+        self._root = self._build(list(range(len(self.points))), 0)
+
+    @classmethod
+    def from_records(cls, records):
+        """Index place records that have coordinates; the payload is the record."""
+        points = []
+        for record in records:
+            coordinates = record_coordinates(record)
+            if coordinates:
+                points.append((coordinates[0], coordinates[1], record))
+        return cls(points)
+
+    def __len__(self):
+        return len(self.points)
+
+    def _build(self, indices, depth):
+        if not indices:
+            return None
+        axis = depth % 3
+        indices.sort(key=lambda i: self._vectors[i][axis])
+        middle = len(indices) // 2
+        return (
+            indices[middle],
+            axis,
+            self._build(indices[:middle], depth + 1),
+            self._build(indices[middle + 1:], depth + 1),
+        )
+
+    def _squared_distance(self, index, target):
+        vector = self._vectors[index]
+        return (vector[0] - target[0]) ** 2 + (vector[1] - target[1]) ** 2 + (vector[2] - target[2]) ** 2
+
+    def nearest(self, latitude, longitude, k=5):
+        """Return up to `k` (distance_km, latitude, longitude, payload), closest first."""
+        if k <= 0:
+            return []
+        target = _unit_vector(latitude, longitude)
+        heap = []  # max-heap on squared distance via negated keys
+
+        def visit(node):
+            if node is None:
+                return
+            index, axis, left, right = node
+            distance = self._squared_distance(index, target)
+            if len(heap) < k:
+                heapq.heappush(heap, (-distance, index))
+            elif distance < -heap[0][0]:
+                heapq.heapreplace(heap, (-distance, index))
+            diff = target[axis] - self._vectors[index][axis]
+            near, far = (left, right) if diff < 0 else (right, left)
+            visit(near)
+            if len(heap) < k or diff * diff < -heap[0][0]:
+                visit(far)
+
+        visit(self._root)
+        return [self._result(index, -neg) for neg, index in sorted(heap, reverse=True)]
+
+    def within(self, latitude, longitude, radius_km):
+        """Return every (distance_km, latitude, longitude, payload) within `radius_km`, closest first."""
+        target = _unit_vector(latitude, longitude)
+        limit = _km_to_chord(radius_km) ** 2
+        found = []
+
+        def visit(node):
+            if node is None:
+                return
+            index, axis, left, right = node
+            distance = self._squared_distance(index, target)
+            if distance <= limit:
+                found.append((distance, index))
+            diff = target[axis] - self._vectors[index][axis]
+            near, far = (left, right) if diff < 0 else (right, left)
+            visit(near)
+            if diff * diff <= limit:
+                visit(far)
+
+        visit(self._root)
+        found.sort()
+        return [self._result(index, distance) for distance, index in found]
+
+    def _result(self, index, squared_chord):
+        latitude, longitude, payload = self.points[index]
+        return _chord_to_km(math.sqrt(squared_chord)), latitude, longitude, payload
+
+
+def place_summary(record, distance_km=None):
+    """Small JSON-friendly view of a place record for API responses."""
+    latitude, longitude = record_coordinates(record) or (None, None)
+    summary = {
+        "id": place_id(record),
+        "name": record["name"],
+        "category": record["category"],
+        "latitude": latitude,
+        "longitude": longitude,
+    }
+    if distance_km is not None:
+        summary["distance_km"] = round(distance_km, 3)
+    return summary
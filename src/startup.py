@@ -0,0 +1,216 @@
+"""Fast startup: background warmup tasks, a readiness probe and an import-time report.
+
+The apps import only what they need to start serving. Loading data, heavy
+libraries (chromadb, openai) and indexes is registered as named tasks that
+run in order on one background thread. A request that needs a task's
+result calls `wait(name)`, and `/ready` reports 503 until every required
+task has finished.
+
+Usage (from the src folder):
+    python startup.py importtime maps_app            # slowest imports, like python -X importtime
+    python startup.py probe -- python maps_app.py    # seconds until listening and until ready
+"""
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WAIT_SECONDS = 30.0
+
+
+def process_uptime():
+    """Seconds since the process was started (including interpreter startup on Linux)."""
+    try:
+        with open("/proc/self/stat", "r") as file:
+            start_ticks = int(file.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime", "r") as file:
+            system_uptime = float(file.read().split()[0])
+        return system_uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return time.perf_counter() - _imported_at
+
+
+_imported_at = time.perf_counter()
+
+
+class StartupNotReady(Exception):
+    """A warmup task did not finish within the caller's timeout, or it failed."""
+
+
+class Startup:
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="warmup")
+        self._lock = threading.Lock()
+        self._tasks = {}  # name -> {"future", "required", "state", "ms", "error"}
+        self._milestones = {}
+
+    def add(self, name, fn, required=True):
+        """Run `fn()` in the background once per process; later calls with the same name are ignored."""
+        with self._lock:
+            if name in self._tasks:
+                return self._tasks[name]["future"]
+            task = {"required": required, "state": "pending", "ms": None, "error": None}
+            self._tasks[name] = task
+            task["future"] = self._executor.submit(self._run, name, task, fn)
+            return task["future"]
+
+    def _run(self, name, task, fn):
+        task["state"] = "running"
+        start = time.perf_counter()
+        try:
+            result = fn()
+        except Exception as e:
+            task["state"], task["error"] = "failed", f"{type(e).__name__}: {e}"
+            logger.error(f"Warmup task {name} failed: {e}")
+            raise
+        finally:
+            task["ms"] = round((time.perf_counter() - start) * 1000, 1)
+        task["state"] = "done"
+        logger.info(f"Warmup task {name} done in {task['ms']} ms.")
+        if self.ready() and "ready" not in self._milestones:
+            self.mark("ready")
+        return result
+
+    def wait(self, name, timeout=DEFAULT_WAIT_SECONDS):
+        """Result of task `name`, waiting up to `timeout` seconds; raises StartupNotReady."""
+        with self._lock:
+            task = self._tasks.get(name)
+        if task is None:
+            raise StartupNotReady(f"no warmup task named {name}")
+        try:
+            return task["future"].result(timeout)
+        except FutureTimeoutError:
+            raise StartupNotReady(f"{name} is still warming up") from None
+        except Exception as e:
+            raise StartupNotReady(f"{name} failed to warm up: {e}") from e
+
+    def done(self, name):
+        with self._lock:
+            task = self._tasks.get(name)
+        return task is not None and task["state"] == "done"
+
+    def ready(self):
+        with self._lock:
+            return all(task["state"] == "done" for task in self._tasks.values() if task["required"])
+
+    def mark(self, milestone):
+        """Record that `milestone` (e.g. "listening") was reached, in seconds since process start."""
+        self._milestones.setdefault(milestone, round(process_uptime(), 3))
+        logger.info(f"Startup: {milestone} after {self._milestones[milestone]}s.")
+
+    def status(self):
+        with self._lock:
+            tasks = {name: {key: value for key, value in task.items() if key != "future"}
+                     for name, task in self._tasks.items()}
+        return {
+            "ready": self.ready(),
+            "uptime_s": round(process_uptime(), 3),
+            "milestones": dict(self._milestones),
+            "tasks": tasks,
+        }
+
+
+_startup = None
+_startup_lock = threading.Lock()
+
+
+def get_startup():
+    """Return the process-wide Startup, shared across Streamlit reruns."""
+    global _startup
+    with _startup_lock:
+        if _startup is None:
+            _startup = Startup()
+    return _startup
+
+
+# -------------------------
+# Startup Reports
+# -------------------------
+def import_times(module, env=None):
+    """Import `module` in a fresh interpreter under -X importtime.
+
+    Returns a list of (cumulative_us, self_us, name) sorted slowest first.
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, env=env)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((int(cumulative_us), int(self_us), name.rstrip()))
+    if result.returncode != 0:
+        logger.warning(f"import {module} exited with {result.returncode}: {result.stderr.strip().splitlines()[-1:]}")
+    return sorted(rows, reverse=True)
+
+
+def probe(command, base_url, timeout=60.0, interval=0.05):
+    """Start `command` and time how long until `/healthz` answers and `/ready` returns 200."""
+    start = time.perf_counter()
+    process = subprocess.Popen(command)
+    report = {"listening_s": None, "ready_s": None}
+    try:
+        while time.perf_counter() - start < timeout and process.poll() is None:
+            path = "/healthz" if report["listening_s"] is None else "/ready"
+            try:
+                with urllib.request.urlopen(base_url + path, timeout=1) as response:
+                    ok = response.status == 200
+            except urllib.error.HTTPError:
+                ok = False
+            except (urllib.error.URLError, OSError):
+                time.sleep(interval)
+                continue
+            elapsed = round(time.perf_counter() - start, 3)
+            if report["listening_s"] is None:
+                report["listening_s"] = elapsed
+            elif ok:
+                report["ready_s"] = elapsed
+                break
+            time.sleep(interval)
+    finally:
+        process.terminate()
+        process.wait()
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Startup time reports.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    importtime = commands.add_parser("importtime", help="slowest imports of a module")
+    importtime.add_argument("module")
+    importtime.add_argument("--top", type=int, default=25)
+    probe_parser = commands.add_parser("probe", help="time until a server listens and is ready")
+    probe_parser.add_argument("--url", default="http://127.0.0.1:5000", help="base URL of /healthz and /ready")
+    probe_parser.add_argument("--timeout", type=float, default=60.0)
+    probe_parser.add_argument("server", nargs=argparse.REMAINDER, help="command that starts the server")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s",
+                        datefmt="%Y-%m-%d %H:%M:%S")
+    if args.command == "importtime":
+        rows = import_times(args.module)
+        print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+        for cumulative_us, self_us, name in rows[:args.top]:
+            print(f"{cumulative_us / 1000:14.1f} {self_us / 1000:9.1f}  {name}")
+        total = next((cumulative for cumulative, _, name in rows if name.strip() == args.module), None)
+        if total is not None:
+            print(f"import {args.module}: {total / 1000:.1f} ms")
+    else:
+        server = [part for part in args.server if part != "--"]
+        if not server:
+            parser.error("probe needs the server command, e.g. probe -- python maps_app.py")
+        print(json.dumps(probe(server, args.url.rstrip("/"), args.timeout), indent=2))
+
+
+if __name__ == "__main__":
+    main()
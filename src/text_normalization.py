@@ -0,0 +1,176 @@
+"""Text normalization for the scraped pages and the retrieved context.
+
+The scraped HTML pages are `repr()`s of the downloaded bytes, so their text
+carries literal escapes: `Coraz\\xc3\\xb3n`, `\\n`, `\\'`. The notebook's
+`clean_text` deleted the byte escapes (leaving "Aasco") and
+`add_missing_characters` patched a few known words back, one regex
+compiled per word and per paragraph.
+
+`TextNormalizer` does the same work in three linear passes, none of them
+per word:
+
+- one precompiled alternation handles every backslash escape: runs of
+  escaped bytes are decoded as UTF-8 (Latin-1 if that fails), `\\n`, `\\t`
+  and `\\r` become spaces and `\\'` becomes `'`; the pattern starts with a
+  literal backslash, so `re` skips ahead to the next one,
+- one alternation of the damaged words of MISSING_CHARACTERS (any case),
+  run only when a lowercase substring check finds one of them,
+- whitespace is collapsed with str.split.
+
+`normalize_many` applies the same passes to each text of a column.
+
+Usage (from the src folder):
+    python text_normalization.py benchmark --source ../data
+"""
+import argparse
+import functools
+import logging
+import os
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+# Words left without their accented letter by the old escape removal
+MISSING_CHARACTERS = {
+    "Aasco": "Añasco",
+    "Catao": "Cataño",
+    "Nio": "Niño",
+    "Peuelas": "Peñuelas",
+}
+
+
+@functools.lru_cache(maxsize=4096)
+def decode_byte_escapes(escapes):
+    """`\\xc3\\xb1` -> `ñ`; sequences that are not UTF-8 are read as Latin-1."""
+    raw = bytes.fromhex(escapes.replace("\\x", "").replace("\\X", ""))
+    try:
+        return raw.decode("utf-8")
+    except UnicodeDecodeError:
+        return raw.decode("latin-1")
+
+
+ESCAPES_PATTERN = re.compile(r"\\(?:(?P<bytes>[xX][0-9A-Fa-f]{2}(?:\\[xX][0-9A-Fa-f]{2})*)|(?P<space>[nrt])|')")
+
+
+def _replace_escape(match):
+    if match.lastgroup == "bytes":
+        return decode_byte_escapes(match.group())
+    return " " if match.lastgroup == "space" else "'"
+
+
+class TextNormalizer:
+    def __init__(self, replacements=MISSING_CHARACTERS):
+        self.replacements = {wrong.lower(): correct for wrong, correct in replacements.items()}
+        words = "|".join(re.escape(word) for word in sorted(self.replacements, key=len, reverse=True))
+        self.words_pattern = re.compile(rf"\b(?:{words})\b", re.IGNORECASE) if replacements else None
+
+    def _replace_word(self, match):
+        return self.replacements[match.group().lower()]
+
+    def normalize(self, text):
+        if "\\" in text:
+            text = ESCAPES_PATTERN.sub(_replace_escape, text)
+        if self.words_pattern is not None:
+            lowered = text.lower()
+            if any(word in lowered for word in self.replacements):
+                text = self.words_pattern.sub(self._replace_word, text)
+        return " ".join(text.split())
+
+    def normalize_many(self, texts):
+        """Normalize a list of strings; items that are not strings are returned unchanged."""
+        normalize = self.normalize
+        return [normalize(text) if isinstance(text, str) else text for text in texts]
+
+
+_normalizer = TextNormalizer()
+normalize_text = _normalizer.normalize
+normalize_texts = _normalizer.normalize_many
+
+
+# -------------------------
+# Benchmark
+# -------------------------
+def legacy_clean_text(text):
+    """setup.py's clean_text, kept as the benchmark baseline."""
+    text = re.sub(r'\\[xX][0-9A-Fa-f]{2}', '', text)
+    text = re.sub(r'[\r\n\t]', ' ', text)
+    text = re.sub(r'\s+', ' ', text)
+    return text.strip()
+
+
+def legacy_add_missing_characters(text):
+    """setup.py's add_missing_characters, kept as the benchmark baseline."""
+    replacements = {
+        "Aguada": "Aguada",
+        "Aasco": "Añasco",
+        "Catao": "Cataño",
+        "Nio": "Niño",
+        "Peuelas": "Peñuelas"
+    }
+    for wrong_word, correct_word in replacements.items():
+        text = re.sub(rf'\b{wrong_word}\b', correct_word, text, flags=re.IGNORECASE)
+    return text
+
+
+def load_benchmark_texts(source_dir, max_files=None):
+    """Raw titles and paragraphs of the landmark and municipality pages, as ingest.py sees them."""
+    from ingest import CATEGORIES, parse_html  # ingest imports this module
+
+    texts = []
+    for category in CATEGORIES:
+        folder = os.path.join(source_dir, category)
+        if not os.path.isdir(folder):
+            continue
+        for filename in sorted(os.listdir(folder))[:max_files]:
+            if filename.endswith(".txt"):
+                with open(os.path.join(folder, filename), "r", encoding="utf-8") as file:
+                    title, paragraphs = parse_html(file.read())
+                texts.extend([title or filename] + paragraphs)
+    return texts
+
+
+def benchmark(texts, repeat=5):
+    """Best-of-`repeat` seconds for the legacy functions and for normalize_texts."""
+    def best(fn):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = fn()
+            timings.append(time.perf_counter() - start)
+        return min(timings), result
+
+    legacy_s, legacy = best(lambda: [legacy_add_missing_characters(legacy_clean_text(t)) for t in texts])
+    normalized_s, normalized = best(lambda: normalize_texts(texts))
+    escapes = re.compile(r"\\[xX][0-9A-Fa-f]{2}")
+    return {
+        "texts": len(texts),
+        "characters": sum(len(t) for t in texts),
+        "legacy_s": round(legacy_s, 4),
+        "normalized_s": round(normalized_s, 4),
+        "speedup": round(legacy_s / normalized_s, 1) if normalized_s else None,
+        "escapes_decoded": sum(len(escapes.findall(t)) for t in texts),
+        "escapes_left": sum(len(escapes.findall(t)) for t in normalized),
+        "characters_out_legacy": sum(len(t) for t in legacy),
+        "characters_out": sum(len(t) for t in normalized),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the text normalization against the notebook functions.")
+    parser.add_argument("command", choices=("benchmark",))
+    parser.add_argument("--source", default="../data", help="folder with the landmarks/ and municipalities/ pages")
+    parser.add_argument("--max-files", type=int, default=None, help="pages per category (default: all)")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s",
+                        datefmt="%Y-%m-%d %H:%M:%S")
+    texts = load_benchmark_texts(args.source, args.max_files)
+    logger.info(f"Loaded {len(texts)} titles and paragraphs from {args.source}.")
+    for key, value in benchmark(texts, args.repeat).items():
+        print(f"{key:>22}: {value}")
+
+
+if __name__ == "__main__":
+    main()
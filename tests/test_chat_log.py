@@ -0,0 +1,68 @@
+import glob
+import gzip
+import json
+import time
+
+import pytest
+
+from chat_log import ChatLogSink, tail_lines
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "chat_logs.jsonl")
+
+
+def test_flush_writes_queued_records_without_waiting_for_the_interval(path):
+    sink = ChatLogSink(path=path, flush_interval=60)
+    try:
+        sink.log_chat("Where is Rincón?", "On the west coast.")
+        start = time.monotonic()
+        assert sink.flush(timeout=5)
+        assert time.monotonic() - start < 1
+        assert sink.tail(5)[0]["user_input"] == "Where is Rincón?"
+    finally:
+        sink.close()
+
+
+def test_tail_does_not_block_on_the_queue(path):
+    sink = ChatLogSink(path=path, flush_interval=60)
+    try:
+        sink.write({"n": 1})
+        start = time.monotonic()
+        assert sink.tail(5) == []
+        assert time.monotonic() - start < 0.5
+    finally:
+        sink.close()
+
+
+def test_close_writes_everything(path):
+    sink = ChatLogSink(path=path, flush_interval=60)
+    for n in range(250):
+        sink.write({"n": n})
+    sink.close()
+    with open(path, encoding="utf-8") as file:
+        assert [json.loads(line)["n"] for line in file] == list(range(250))
+
+
+def test_rotates_by_size_and_keeps_backup_count_archives(path):
+    sink = ChatLogSink(path=path, batch_size=1, max_bytes=200, backup_count=2)
+    try:
+        for n in range(40):
+            sink.write({"n": n, "text": "x" * 50})
+            assert sink.flush(timeout=5)
+    finally:
+        sink.close()
+    archives = sorted(glob.glob(path + ".*.gz"))
+    assert len(archives) == 2
+    with gzip.open(archives[-1], "rt", encoding="utf-8") as file:
+        archived = [json.loads(line)["n"] for line in file]
+    with open(path, encoding="utf-8") as file:
+        current = [json.loads(line)["n"] for line in file]
+    assert archived + current == list(range(archived[0], 40))
+
+
+def test_tail_lines_reads_the_end_in_blocks(tmp_path):
+    path = tmp_path / "lines.txt"
+    path.write_text("".join(f"line {n}\n" for n in range(1000)), encoding="utf-8")
+    assert tail_lines(str(path), 3, block_size=16) == ["line 997", "line 998", "line 999"]
@@ -0,0 +1,75 @@
+import threading
+
+import pytest
+
+import chat_pipeline
+from chat_pipeline import SYSTEM_MESSAGE, ChatPipeline
+from chat_service import ChatService
+from fake_llm_server import DEFAULT_REPLY, make_server
+from query_planner import FILTER_FIELDS_KEY, QueryPlanner
+from response_cache import SemanticResponseCache
+
+QUERY = "What is there to see in Rincón?"
+
+
+class FakeCollection:
+    def __init__(self, name="landmarks", metadata=None):
+        self.name = name
+        self.metadata = metadata
+        self.filters = []
+
+    def query(self, query_embeddings, n_results, where=None):
+        self.filters.append(where)
+        return {
+            "ids": [["rincon_lighthouse"]],
+            "documents": [["The Rincón lighthouse overlooks the surf beaches."]],
+            "distances": [[0.2]],
+        }
+
+
+@pytest.fixture
+def service():
+    server = make_server(port=0, latency=0.0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    service = ChatService(base_url=f"http://127.0.0.1:{server.server_port}/v1", api_key="fake")
+    service.server = server
+    yield service
+    service.close()
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def fixed_embedding(monkeypatch):
+    # The embedding model is not available offline; retrieval only needs a vector
+    monkeypatch.setattr(chat_pipeline, "embed_query", lambda query: [0.1, 0.2, 0.3])
+
+
+def test_prepare_packs_the_retrieved_context():
+    pipeline = ChatPipeline({"landmarks": FakeCollection()})
+    _, context_ids, messages = pipeline.prepare(QUERY)
+    assert context_ids == ["landmarks:rincon_lighthouse"]
+    assert messages[0] == {"role": "system", "content": SYSTEM_MESSAGE}
+    assert "Rincón lighthouse" in messages[1]["content"]
+
+
+def test_chat_completes_once_then_answers_from_the_cache(service, tmp_path):
+    cache = SemanticResponseCache(path=str(tmp_path / "cache.sqlite3"))
+    pipeline = ChatPipeline({"landmarks": FakeCollection()}, cache=cache)
+    try:
+        assert pipeline.chat(service, QUERY) == DEFAULT_REPLY
+        assert pipeline.chat(service, QUERY) == DEFAULT_REPLY
+        assert service.server.requests == 1
+    finally:
+        cache.close()
+
+
+def test_planner_filters_only_collections_indexed_with_the_fields():
+    rincon = {"name": "Rincón, Puerto Rico", "source_file": "Rincon.txt",
+              "coordinates": {"latitude": 18.34, "longitude": -67.25}}
+    fields = {FILTER_FIELDS_KEY: "category,municipality,latitude,longitude"}
+    collections = {"landmarks": FakeCollection("landmarks", fields), "municipalities": FakeCollection("municipalities")}
+    pipeline = ChatPipeline(collections, query_planner=QueryPlanner([rincon]))
+    pipeline.retrieve(QUERY, [0.1, 0.2, 0.3])
+    assert collections["landmarks"].filters[0]["$or"][0] == {"municipality": {"$in": ["rincon"]}}
+    assert collections["municipalities"].filters == [None]
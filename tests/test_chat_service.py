@@ -0,0 +1,115 @@
+import threading
+import time
+
+import pytest
+
+from chat_service import ChatService, ChatServiceBusy, ChatServiceError
+from fake_llm_server import DEFAULT_REPLY, make_server
+
+MESSAGES = [{"role": "user", "content": "Where should I go in Rincón?"}]
+
+
+@pytest.fixture
+def fake_server():
+    server = make_server(port=0, latency=0.2)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_service(server, **kwargs):
+    return ChatService(base_url=f"http://127.0.0.1:{server.server_port}/v1", api_key="fake", **kwargs)
+
+
+def test_concurrency_is_capped(fake_server):
+    service = make_service(fake_server, max_concurrency=2)
+    try:
+        futures = [service.submit(MESSAGES, model="fake") for _ in range(6)]
+        assert [future.result(timeout=10) for future in futures] == [DEFAULT_REPLY] * 6
+    finally:
+        service.close()
+    assert fake_server.max_in_flight == 2
+    stats = service.stats()
+    assert stats["completed"] == 6 and stats["max_waiting_seen"] >= 1
+
+
+def test_refuses_when_queue_is_full(fake_server):
+    service = make_service(fake_server, max_concurrency=1, max_waiting=1)
+    try:
+        futures = [service.submit(MESSAGES, model="fake") for _ in range(4)]
+        outcomes = []
+        for future in futures:
+            try:
+                outcomes.append(future.result(timeout=10))
+            except ChatServiceBusy:
+                outcomes.append("busy")
+    finally:
+        service.close()
+    assert "busy" in outcomes and DEFAULT_REPLY in outcomes
+    assert service.stats()["rejected"] == outcomes.count("busy")
+
+
+def test_rate_limits_honour_retry_after(fake_server):
+    fake_server.rate_limit, fake_server.retry_after = 1.0, 0.3
+    # base_delay=0 leaves Retry-After as the only source of delay
+    service = make_service(fake_server, max_retries=2, base_delay=0.0)
+    start = time.perf_counter()
+    try:
+        with pytest.raises(ChatServiceError):
+            service.complete(MESSAGES, model="fake")
+    finally:
+        service.close()
+    assert time.perf_counter() - start >= 2 * 0.3
+    stats = service.stats()
+    assert stats["rate_limited"] == 3 and stats["retries"] == 2 and stats["failed"] == 1
+    assert fake_server.rate_limited == 3
+
+
+def test_retries_until_the_rate_limit_clears(fake_server):
+    fake_server.rate_limit, fake_server.retry_after = 1.0, 0.2
+
+    def clear_after_first_429():
+        while not fake_server.rate_limited:
+            time.sleep(0.01)
+        fake_server.rate_limit = 0.0
+
+    threading.Thread(target=clear_after_first_429, daemon=True).start()
+    service = make_service(fake_server, max_retries=3, base_delay=0.0)
+    try:
+        assert service.complete(MESSAGES, model="fake") == DEFAULT_REPLY
+    finally:
+        service.close()
+    assert service.stats()["retries"] >= 1
+
+
+def test_missing_api_key_raises_chat_service_error(monkeypatch):
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    with pytest.raises(ChatServiceError):
+        ChatService()
+
+
+def test_replies_are_capped_by_default(fake_server):
+    service = make_service(fake_server, max_tokens=123)
+    try:
+        service.complete(MESSAGES, model="fake")
+        assert fake_server.last_request["max_tokens"] == 123
+        service.complete(MESSAGES, model="o3-mini")
+        assert fake_server.last_request["max_completion_tokens"] == 123 * 4
+        service.complete(MESSAGES, model="fake", max_tokens=7)
+        assert fake_server.last_request["max_tokens"] == 7
+    finally:
+        service.close()
+
+
+def test_unexpected_errors_become_chat_service_errors(fake_server):
+    service = make_service(fake_server)
+    try:
+        with pytest.raises(ChatServiceError):
+            service.complete(MESSAGES, model="fake", not_a_parameter=1)
+        with pytest.raises(ChatServiceError):
+            list(service.stream(MESSAGES, model="fake", not_a_parameter=1))
+    finally:
+        service.close()
+    assert service.stats()["failed"] == 2
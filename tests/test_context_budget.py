@@ -0,0 +1,36 @@
+from context_budget import chunks_from_results, get_token_counter, hamming_distance, pack_context, simhash
+
+YUNQUE = ("El Yunque National Forest has trails to waterfalls such as La Mina, and the El Portal visitor "
+          "center explains the ecology of the rain forest and its coqui frogs.")
+
+
+def test_case_and_punctuation_do_not_change_the_simhash():
+    assert hamming_distance(simhash(YUNQUE), simhash(YUNQUE.upper().replace(",", ""))) == 0
+    assert hamming_distance(simhash(YUNQUE), simhash("Rincón is a surf town on the west coast.")) > 3
+
+
+def test_duplicates_are_removed_and_best_chunks_come_first():
+    chunks = [(0.5, "a", "Rincón is a surf town on the west coast."), (0.9, "b", YUNQUE), (0.8, "c", YUNQUE.upper())]
+    texts, ids, report = pack_context(chunks, token_budget=1000)
+    assert ids == ["b", "a"]
+    assert report["duplicates_removed"] == 1
+
+
+def test_budget_is_a_ceiling():
+    counter = get_token_counter("gpt-4o")
+    chunks = [(1.0 - i / 100, f"doc{i}", f"Paragraph {i}: " + YUNQUE.replace("El", f"Trail {i}"))
+              for i in range(20)]
+    texts, ids, report = pack_context(chunks, token_budget=120)
+    assert report["tokens_out"] == sum(counter.count(text) for text in texts) <= 120
+    assert report["tokens_saved"] > 0 and len(ids) < 20
+
+
+def test_escapes_are_decoded_before_packing():
+    texts, _, _ = pack_context([(1.0, "a", "Coraz\\xc3\\xb3n de Puerto Rico")])
+    assert texts == ["Corazón de Puerto Rico"]
+
+
+def test_chunks_from_results_prefers_fused_scores():
+    results = {"landmarks": {"ids": [["x", "y"]], "documents": [["X", None]], "scores": [[0.03, 0.02]]},
+               "news_articles": {"ids": [["n"]], "documents": [["N"]], "distances": [[1.0]]}}
+    assert chunks_from_results(results) == [(0.03, "landmarks:x", "X"), (0.5, "news_articles:n", "N")]
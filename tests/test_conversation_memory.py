@@ -0,0 +1,76 @@
+from concurrent.futures import Future
+
+from conversation_memory import ConversationMemory
+
+SYSTEM_PROMPT = "You are a travel planner for Puerto Rico."
+
+
+class FakeService:
+    """Answers summary requests with a finished future, like ChatService.submit would once it completes."""
+
+    def __init__(self, summary="The traveler plans a week in Rincón.", error=None):
+        self.summary = summary
+        self.error = error
+        self.requests = []
+
+    def submit(self, messages, **params):
+        self.requests.append(messages)
+        future = Future()
+        if self.error is not None:
+            future.set_exception(self.error)
+        else:
+            future.set_result(self.summary)
+        return future
+
+
+def turn(i, words=5):
+    return f"Question {i} " + "beach " * words, f"Answer {i} " + "surf " * words
+
+
+def total_tokens(memory, messages):
+    return sum(memory._tokens(message) for message in messages)
+
+
+def test_turns_beyond_the_window_are_folded_into_the_summary():
+    service = FakeService()
+    memory = ConversationMemory(service, SYSTEM_PROMPT, keep_turns=2)
+    for i in range(3):
+        memory.add_turn(*turn(i))
+    memory.wait()
+    assert memory.summary == service.summary
+    assert memory.turns == [turn(1), turn(2)]
+    assert memory.stats()["summarized_turns"] == 1
+    assert "Question 0" in service.requests[0][1]["content"]
+
+    messages, _ = memory.build_messages("Where should we eat?")
+    assert service.summary in messages[0]["content"]
+    assert [message["content"] for message in messages[1:3]] == list(turn(1))
+
+
+def test_failed_summary_keeps_the_turns_verbatim():
+    memory = ConversationMemory(FakeService(error=RuntimeError("down")), SYSTEM_PROMPT, keep_turns=1)
+    for i in range(3):
+        memory.add_turn(*turn(i))
+    assert memory.summary == ""
+    assert len(memory.turns) == 3
+
+
+def test_summary_is_truncated_to_its_token_allowance():
+    service = FakeService(summary="sunny " * 500)
+    memory = ConversationMemory(service, SYSTEM_PROMPT, keep_turns=1, summary_tokens=20)
+    for i in range(2):
+        memory.add_turn(*turn(i))
+    assert memory.counter.count(memory.summary) <= 20
+
+
+def test_request_stays_under_the_token_ceiling():
+    memory = ConversationMemory(FakeService(), SYSTEM_PROMPT, keep_turns=50, token_ceiling=400, context_budget=100)
+    for i in range(20):
+        memory.turns.append(turn(i, words=30))
+    chunks = [(1.0 - i / 10, f"landmarks:{i}", f"Fact {i}: " + "lighthouse " * 40) for i in range(5)]
+    messages, context_ids = memory.build_messages("What should we see next?", chunks)
+    assert total_tokens(memory, messages) <= 400
+    assert context_ids
+    # The newest turns are kept, the oldest dropped first
+    assert messages[-2]["content"] == turn(19, words=30)[1]
+    assert all("Question 0 " not in message["content"] for message in messages)
@@ -0,0 +1,28 @@
+import os
+
+from itinerary import plan_itinerary
+from place_store import PlaceStore
+from poi_distances import DistanceMatrix
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+SAN_JUAN = (18.4655, -66.1057)
+
+
+def test_precomputed_distances_give_the_same_plan(tmp_path):
+    store = PlaceStore.load(DATA_DIR)
+    distances = DistanceMatrix.load(DATA_DIR, str(tmp_path))
+    stops = [(place.id,) + place.coordinates for place in store.landmarks if place.coordinates][:10]
+    try:
+        computed = plan_itinerary(SAN_JUAN, stops)
+        precomputed = plan_itinerary(SAN_JUAN, stops, distances=distances)
+    finally:
+        store.close()
+    assert precomputed["order"] == computed["order"]
+    assert abs(precomputed["total_distance_km"] - computed["total_distance_km"]) < 0.01
+
+
+def test_stops_missing_from_the_matrix_fall_back_to_haversine(tmp_path):
+    distances = DistanceMatrix.load(DATA_DIR, str(tmp_path))
+    stops = [("somewhere", 18.2, -66.5), ("elsewhere", 18.3, -65.8)]
+    plan = plan_itinerary(SAN_JUAN, stops, distances=distances)
+    assert sorted(plan["order"]) == ["elsewhere", "somewhere"]
@@ -0,0 +1,57 @@
+from lexical import BM25Index, matches_where, tokenize
+from retrieval import hybrid_retrieve, reciprocal_rank_fusion
+
+DOCUMENTS = {
+    "anasco": "Añasco is a town on the west coast, known for the Añasco River.",
+    "el_yunque": "El Yunque is the only tropical rain forest in the national forest system.",
+    "rincon": "Rincón has surf beaches and a lighthouse on the west coast.",
+}
+METADATAS = [{"municipality": "anasco"}, {"municipality": "rio grande"}, {"municipality": "rincon"}]
+
+
+def make_index():
+    return BM25Index(list(DOCUMENTS), list(DOCUMENTS.values()), METADATAS)
+
+
+class FakeCollection:
+    """Dense results in a fixed order, as Chroma would return them."""
+
+    def __init__(self, name, ranking):
+        self.name = name
+        self.ranking = ranking
+
+    def query(self, query_embeddings, n_results, where=None):
+        ids = self.ranking[:n_results]
+        return {"ids": [ids], "documents": [[DOCUMENTS[i] for i in ids]], "metadatas": [[{} for _ in ids]],
+                "distances": [[0.1 * rank for rank in range(len(ids))]]}
+
+
+def test_tokens_are_accent_folded_without_stopwords():
+    assert tokenize("El Añasco de la Costa") == ["anasco", "costa"]
+
+
+def test_bm25_matches_accentless_queries_and_filters():
+    index = make_index()
+    assert index.ids[index.search("anasco")[0][0]] == "anasco"
+    assert [index.ids[i] for i, _ in index.search("west coast", where={"municipality": "rincon"})] == ["rincon"]
+    assert index.search("volcano") == []
+
+
+def test_where_operators():
+    between = {"$and": [{"population": {"$gte": 1000}}, {"population": {"$lt": 5e4}}]}
+    assert matches_where({"population": 30000}, between)
+    assert not matches_where({"municipality": "ponce"}, {"municipality": {"$in": ["anasco", "rincon"]}})
+
+
+def test_rrf_rewards_agreement_between_rankings():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "c", "a"]], k=60)
+    assert [doc_id for doc_id, _ in fused] == ["b", "a", "c"]
+    assert fused[0][1] == 1 / 62 + 1 / 61
+
+
+def test_hybrid_lifts_the_exact_name_match():
+    collections = {"landmarks": FakeCollection("landmarks", ["el_yunque", "rincon", "anasco"])}
+    results, timings = hybrid_retrieve("Anasco", collections, {"landmarks": make_index()}, n_results=2,
+                                       query_embedding=[0.0, 1.0])
+    assert results["landmarks"]["ids"][0][0] == "anasco"
+    assert set(timings) == {"embed_ms", "dense_ms", "lexical_ms", "fusion_ms"}
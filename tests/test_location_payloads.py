@@ -0,0 +1,44 @@
+import gzip
+
+from location_payloads import DYNAMIC_GZIP_LEVEL, JsonPayload, PayloadCache, PrecompressedPayload
+
+DATA = {"landmarks": [{"name": f"Place {i}", "category": "Landmark"} for i in range(200)]}
+
+
+def test_dynamic_payload_is_gzipped_per_response():
+    payload = JsonPayload(DATA)
+    body, encoding = payload.encode({"gzip", "br"})
+    assert encoding == "gzip"
+    assert gzip.decompress(body) == payload.body
+    assert body == gzip.compress(payload.body, compresslevel=DYNAMIC_GZIP_LEVEL)
+    assert payload.encode(set()) == (payload.body, None)
+
+
+def test_precompressed_payload_counts_its_variants():
+    payload = PrecompressedPayload(DATA)
+    assert len(payload) > len(payload.body)
+    assert payload.encode({"gzip"}) == (payload.encoded["gzip"], "gzip")
+
+
+def test_cache_is_bounded_by_bytes():
+    size = len(JsonPayload(DATA))
+    cache = PayloadCache(max_bytes=size * 3)
+    builds = []
+
+    def build():
+        builds.append(1)
+        return JsonPayload(DATA)
+
+    for key in range(10):
+        cache.get_or_build(key, build)
+    assert len(cache) == 3 and cache.bytes <= cache.max_bytes
+    cache.get_or_build(9, build)
+    assert len(builds) == 10
+    cache.get_or_build(0, build)
+    assert len(builds) == 11
+
+
+def test_payload_larger_than_the_cache_is_not_kept():
+    cache = PayloadCache(max_bytes=10)
+    cache.get_or_build("big", lambda: JsonPayload(DATA))
+    assert len(cache) == 0 and cache.bytes == 0
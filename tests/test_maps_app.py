@@ -0,0 +1,93 @@
+import os
+
+import pytest
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+
+@pytest.fixture(scope="module")
+def client():
+    # maps_app refuses to start without a Maps key and reads data/ relative to src/
+    os.environ.setdefault("GOOGLE_API_KEY", "test")
+    cwd = os.getcwd()
+    os.chdir(SRC_DIR)
+    try:
+        import maps_app
+        # Let the warmup thread finish before the tests change the environment
+        for task in ("places", "payloads", "chat_service"):
+            try:
+                maps_app.startup.wait(task)
+            except maps_app.StartupNotReady:
+                pass
+    finally:
+        os.chdir(cwd)
+    return maps_app.app.test_client()
+
+
+TOKEN = "secret"
+AUTH = {"Authorization": f"Bearer {TOKEN}"}
+
+
+@pytest.fixture
+def chat_enabled(monkeypatch):
+    import maps_app
+
+    monkeypatch.setattr(maps_app, "CHAT_API_TOKEN", TOKEN)
+
+
+def test_chat_is_disabled_without_a_token(client):
+    assert client.post("/chat", json={"message": "hi"}, headers=AUTH).status_code == 503
+
+
+def test_chat_requires_the_token(client, chat_enabled):
+    assert client.post("/chat", json={"message": "hi"}).status_code == 401
+    assert client.post("/chat", json={"message": "hi"}, headers={"Authorization": "Bearer wrong"}).status_code == 401
+
+
+@pytest.mark.parametrize("body", [
+    {},
+    {"message": ""},
+    {"message": ["hello"]},
+    {"message": "x" * 5000},
+    {"messages": [{"role": "user", "content": "hi"}]},
+])
+def test_rejects_invalid_messages(client, chat_enabled, body):
+    assert client.post("/chat", json=body, headers=AUTH).status_code == 400
+
+
+def test_unconfigured_service_answers_503(client, chat_enabled, monkeypatch):
+    import chat_service
+
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    monkeypatch.setattr(chat_service, "_default_service", None)
+    response = client.post("/chat", json={"message": "hi"}, headers=AUTH)
+    assert response.status_code == 503
+    assert response.headers["Retry-After"]
+
+
+def test_chat_answers_through_the_pipeline(client, chat_enabled, monkeypatch):
+    import chat_service
+    import maps_app
+
+    class FakePipeline:
+        def chat(self, service, message):
+            return f"{message} -> with context"
+
+    monkeypatch.setattr(chat_service, "_default_service", object())
+    monkeypatch.setattr(maps_app.startup, "wait",
+                        lambda name, timeout=None: FakePipeline() if name == "chat_pipeline" else None)
+    response = client.post("/chat", json={"message": "Beaches in Rincón?"}, headers=AUTH)
+    assert response.status_code == 200
+    assert response.get_json() == {"reply": "Beaches in Rincón? -> with context"}
+
+
+def test_page_views_are_precompressed_and_slices_are_not(client):
+    import maps_app
+
+    markers = client.get("/get_locations?view=markers", headers={"Accept-Encoding": "gzip"})
+    assert markers.status_code == 200 and markers.headers["Content-Encoding"] == "gzip"
+    assert isinstance(maps_app.locations_payload("markers"), maps_app.PrecompressedPayload)
+    sliced = client.get("/get_locations?view=markers&bbox=18.0,-67.0,18.5,-66.0&limit=5")
+    assert sliced.status_code == 200 and "Content-Encoding" not in sliced.headers
+    assert not isinstance(maps_app.locations_payload("markers", None, (18.0, -67.0, 18.5, -66.0), 0, 5),
+                          maps_app.PrecompressedPayload)
@@ -0,0 +1,112 @@
+import json
+import math
+import os
+
+import pytest
+
+from place_snapshot import SNAPSHOT_VERSION, PlaceSnapshot, SnapshotError, source_fingerprint, write_snapshot
+from place_store import PlaceStore, snapshot_path, source_paths
+from places import LANDMARKS_FILE, MUNICIPALITIES_FILE
+
+LANDMARKS = [
+    {"name": "Castillo San Felipe del Morro", "category": "Landmark",
+     "description": ["A citadel in San Juan, Puerto Rico."],
+     "coordinates": {"latitude": 18.4709, "longitude": -66.1238}, "source_file": "el_morro.txt"},
+    {"name": "Cueva del Indio", "category": "Landmark", "description": ["Sea cave with petroglyphs."],
+     "coordinates": {"latitude": None, "longitude": None}, "source_file": "cueva_del_indio.txt"},
+]
+MUNICIPALITIES = [
+    {"name": "San Juan, Puerto Rico", "category": "Municipality", "description": ["The capital."],
+     "coordinates": {"latitude": 18.4655, "longitude": -66.1057}, "source_file": "San_Juan.txt"},
+    {"name": "Añasco, Puerto Rico", "category": "Municipality", "description": ["West coast town."],
+     "coordinates": {"latitude": 18.2827, "longitude": -67.1396}, "source_file": "Añasco.txt"},
+]
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    for name, records in ((LANDMARKS_FILE, LANDMARKS), (MUNICIPALITIES_FILE, MUNICIPALITIES)):
+        (tmp_path / name).write_text(json.dumps(records, ensure_ascii=False), encoding="utf-8")
+    return str(tmp_path)
+
+
+def test_snapshot_round_trip(data_dir, tmp_path):
+    store = PlaceStore.from_json(data_dir)
+    path = str(tmp_path / "places.snapshot")
+    fingerprint = source_fingerprint(source_paths(data_dir))
+    write_snapshot(path, store, fingerprint)
+
+    mapped = PlaceStore.from_snapshot(PlaceSnapshot(path, fingerprint))
+    try:
+        assert len(mapped) == len(store)
+        for original, loaded in zip(store, mapped):
+            assert (loaded.id, loaded.name, loaded.category) == (original.id, original.name, original.category)
+            assert loaded.municipality == original.municipality
+            assert loaded.description == original.description
+        assert mapped.get("el_morro").coordinates == pytest.approx((18.4709, -66.1238))
+        assert mapped.get("cueva_del_indio").coordinates is None
+        assert math.isnan(mapped.latitudes[1])
+        assert [place.name for place in mapped.find_by_name("anasco")] == ["Añasco, Puerto Rico"]
+    finally:
+        mapped.close()
+        store.close()
+
+
+def test_snapshot_with_another_fingerprint_is_stale(data_dir, tmp_path):
+    store = PlaceStore.from_json(data_dir)
+    path = str(tmp_path / "places.snapshot")
+    write_snapshot(path, store, b"a" * 16)
+    store.close()
+    with pytest.raises(SnapshotError, match="stale"):
+        PlaceSnapshot(path, b"b" * 16)
+
+
+def test_snapshot_from_another_version_is_rejected(data_dir, tmp_path):
+    store = PlaceStore.from_json(data_dir)
+    path = tmp_path / "places.snapshot"
+    write_snapshot(str(path), store, b"a" * 16)
+    store.close()
+    data = bytearray(path.read_bytes())
+    data[8:10] = (SNAPSHOT_VERSION + 1).to_bytes(2, "little")
+    path.write_bytes(bytes(data))
+    with pytest.raises(SnapshotError, match="format version"):
+        PlaceSnapshot(str(path))
+
+
+def test_corrupt_snapshot_fails_its_checksum(data_dir, tmp_path):
+    store = PlaceStore.from_json(data_dir)
+    path = tmp_path / "places.snapshot"
+    write_snapshot(str(path), store, b"a" * 16)
+    store.close()
+    data = bytearray(path.read_bytes())
+    data[-1] ^= 0xFF
+    path.write_bytes(bytes(data))
+    with pytest.raises(SnapshotError, match="checksum"):
+        PlaceSnapshot(str(path))
+
+
+def test_load_rebuilds_the_snapshot_when_the_json_changes(data_dir):
+    PlaceStore.load(data_dir).close()
+    path = snapshot_path(data_dir)
+    assert os.path.exists(path)
+    first = PlaceSnapshot(path)
+    first_fingerprint = first.fingerprint
+    first.close()
+
+    landmarks_path = os.path.join(data_dir, LANDMARKS_FILE)
+    edited = LANDMARKS + [{"name": "Playa Flamenco", "category": "Landmark", "description": ["Culebra beach."],
+                           "coordinates": {"latitude": 18.3297, "longitude": -65.3178},
+                           "source_file": "flamenco.txt"}]
+    with open(landmarks_path, "w", encoding="utf-8") as file:
+        json.dump(edited, file)
+    os.utime(landmarks_path, ns=(os.stat(landmarks_path).st_atime_ns, os.stat(landmarks_path).st_mtime_ns + 10**9))
+
+    store = PlaceStore.load(data_dir)
+    try:
+        assert store.get("flamenco") is not None
+        assert store.fingerprint == source_fingerprint(source_paths(data_dir)) != first_fingerprint
+    finally:
+        store.close()
+    rebuilt = PlaceSnapshot(path, source_fingerprint(source_paths(data_dir)))
+    assert len(rebuilt) == len(edited) + len(MUNICIPALITIES)
+    rebuilt.close()
@@ -0,0 +1,41 @@
+import os
+
+from place_store import PlaceStore, remove_stale_descriptions
+from places import unique_place_ids
+
+
+def record(source_file, category, latitude=None, longitude=None):
+    return {
+        "name": os.path.splitext(source_file)[0].title(),
+        "category": category,
+        "description": [f"About {source_file}."],
+        "coordinates": {"latitude": latitude, "longitude": longitude},
+        "source_file": source_file,
+    }
+
+
+def test_shared_source_file_names_get_category_ids():
+    records = [record("orocovis.txt", "Landmark"), record("Orocovis.txt", "Municipality", 18.23, -66.39),
+               record("el_yunque.txt", "Landmark", 18.3, -65.78)]
+    assert unique_place_ids(records) == ["landmark:orocovis", "orocovis", "el_yunque"]
+
+
+def test_store_keeps_every_place_by_id(tmp_path):
+    records = [record("orocovis.txt", "Landmark"), record("Orocovis.txt", "Municipality", 18.23, -66.39)]
+    store = PlaceStore.from_records(records, description_path=str(tmp_path / "descriptions.json.bin"))
+    try:
+        assert len(store.by_id) == 2
+        assert store.get("orocovis").category == "Municipality"
+        assert store.get("landmark:orocovis")["id"] == "landmark:orocovis"
+        assert store.get("landmark:orocovis").description == ["About orocovis.txt."]
+    finally:
+        store.close()
+
+
+def test_stale_descriptions_are_removed(tmp_path):
+    names = ["place_descriptions-old.json.bin", "place_descriptions-old.json.bin.offsets.npy",
+             "place_descriptions-new.json.bin", "place_descriptions-new.json.bin.offsets.npy", "places.snapshot"]
+    for name in names:
+        (tmp_path / name).write_bytes(b"")
+    remove_stale_descriptions(str(tmp_path / "place_descriptions-new.json.bin"))
+    assert sorted(os.listdir(tmp_path)) == names[2:]
@@ -0,0 +1,71 @@
+import threading
+
+import numpy as np
+import pytest
+
+import response_cache
+from response_cache import SemanticResponseCache
+
+PARAMS = {"model": "gpt-4o", "temperature": 0.5}
+CONTEXT = ["landmarks:el_yunque", "municipalities:rio_grande"]
+
+
+def rotated(vector, cosine):
+    """A unit vector at the given cosine similarity to `vector` (a unit vector along axis 0)."""
+    return [cosine, float(np.sqrt(1 - cosine ** 2))] + [0.0] * (len(vector) - 2)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = SemanticResponseCache(path=str(tmp_path / "cache.sqlite3"), similarity_threshold=0.95)
+    yield cache
+    cache.close()
+
+
+def test_hit_and_miss_around_the_threshold(cache):
+    query = [1.0, 0.0, 0.0, 0.0]
+    cache.put(query, CONTEXT, PARAMS, "Go hiking in El Yunque.")
+    assert cache.get(rotated(query, 0.96), CONTEXT, PARAMS) == "Go hiking in El Yunque."
+    assert cache.get(rotated(query, 0.94), CONTEXT, PARAMS) is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_context_and_params_must_match(cache):
+    query = [1.0, 0.0, 0.0, 0.0]
+    cache.put(query, CONTEXT, PARAMS, "reply")
+    assert cache.get(query, list(reversed(CONTEXT)), PARAMS) == "reply"
+    assert cache.get(query, CONTEXT[:1], PARAMS) is None
+    assert cache.get(query, CONTEXT, {**PARAMS, "temperature": 0.9}) is None
+
+
+def test_best_match_wins_and_other_sizes_are_skipped(cache):
+    query = [1.0, 0.0, 0.0, 0.0]
+    cache.put([1.0, 0.0], CONTEXT, PARAMS, "other model")
+    cache.put(rotated(query, 0.96), CONTEXT, PARAMS, "close")
+    cache.put(rotated(query, 0.99), CONTEXT, PARAMS, "closest")
+    assert cache.get(query, CONTEXT, PARAMS) == "closest"
+
+
+def test_only_the_most_recent_candidates_are_scored(tmp_path):
+    cache = SemanticResponseCache(path=str(tmp_path / "cache.sqlite3"), max_candidates=2)
+    try:
+        cache.put([1.0, 0.0, 0.0], CONTEXT, PARAMS, "oldest")
+        cache.put([0.0, 1.0, 0.0], CONTEXT, PARAMS, "newer")
+        cache.put([0.0, 0.0, 1.0], CONTEXT, PARAMS, "newest")
+        assert cache.get([1.0, 0.0, 0.0], CONTEXT, PARAMS) is None
+        assert cache.get([0.0, 0.0, 1.0], CONTEXT, PARAMS) == "newest"
+    finally:
+        cache.close()
+
+
+def test_singleton_is_created_once_across_threads(tmp_path, monkeypatch):
+    monkeypatch.setattr(response_cache, "_default_cache", None)
+    caches = []
+    threads = [threading.Thread(target=lambda: caches.append(
+        response_cache.get_response_cache(path=str(tmp_path / "shared.sqlite3")))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len({id(cache) for cache in caches}) == 1
+    caches[0].close()
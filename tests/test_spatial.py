@@ -0,0 +1,46 @@
+import random
+
+import pytest
+
+from spatial import SpatialIndex, haversine_km
+
+
+@pytest.fixture(scope="module")
+def points():
+    # Puerto Rico's bounding box, plus a few far-away points to cross the tree's splits
+    generator = random.Random(7)
+    points = [(generator.uniform(17.9, 18.5), generator.uniform(-67.3, -65.2), i) for i in range(300)]
+    points += [(40.7, -74.0, "new_york"), (-33.9, 151.2, "sydney"), (18.2, 179.9, "date_line")]
+    return points
+
+
+def brute_force(points, latitude, longitude):
+    return sorted((haversine_km(latitude, longitude, lat, lon), payload) for lat, lon, payload in points)
+
+
+@pytest.mark.parametrize("latitude,longitude", [(18.4655, -66.1057), (18.0, -67.1), (18.2, -179.9), (0.0, 0.0)])
+def test_nearest_matches_brute_force(points, latitude, longitude):
+    index = SpatialIndex(points)
+    expected = brute_force(points, latitude, longitude)[:10]
+    found = index.nearest(latitude, longitude, k=10)
+    assert [payload for _, _, _, payload in found] == [payload for _, payload in expected]
+    for (distance, _, _, _), (expected_distance, _) in zip(found, expected):
+        assert distance == pytest.approx(expected_distance, abs=1e-6)
+
+
+@pytest.mark.parametrize("radius_km", [0.5, 10.0, 40.0, 300.0])
+def test_within_matches_brute_force(points, radius_km):
+    index = SpatialIndex(points)
+    expected = [payload for distance, payload in brute_force(points, 18.2, -66.5) if distance <= radius_km]
+    assert [payload for _, _, _, payload in index.within(18.2, -66.5, radius_km)] == expected
+
+
+def test_from_records_skips_places_without_coordinates():
+    records = [
+        {"name": "Ponce", "coordinates": {"latitude": 18.01, "longitude": -66.61}},
+        {"name": "Somewhere", "coordinates": {"latitude": None, "longitude": None}},
+    ]
+    index = SpatialIndex.from_records(records)
+    assert len(index) == 1
+    assert index.nearest(18.0, -66.6, k=5)[0][3]["name"] == "Ponce"
+    assert index.nearest(18.0, -66.6, k=0) == []
@@ -0,0 +1,40 @@
+import pytest
+
+from text_normalization import (TextNormalizer, legacy_add_missing_characters, legacy_clean_text, normalize_text,
+                                normalize_texts)
+
+
+@pytest.mark.parametrize("raw,expected", [
+    ("Coraz\\xc3\\xb3n", "Corazón"),
+    ("A\\xc3\\xb1asco, Puerto Rico", "Añasco, Puerto Rico"),
+    ("Pe\\xC3\\xB1uelas", "Peñuelas"),
+    ("caf\\xe9 con leche", "café con leche"),  # not UTF-8, read as Latin-1
+    ("El Yunque\\nrainforest\\tand  beaches", "El Yunque rainforest and beaches"),
+    ("Puerto Rico\\'s capital", "Puerto Rico's capital"),
+    ("no escapes here", "no escapes here"),
+])
+def test_escapes_are_decoded(raw, expected):
+    assert normalize_text(raw) == expected
+
+
+@pytest.mark.parametrize("damaged,expected", [
+    ("Aasco, Puerto Rico", "Añasco, Puerto Rico"),
+    ("the CATAO ferry", "the Cataño ferry"),
+    ("Fiesta del Nio in Peuelas", "Fiesta del Niño in Peñuelas"),
+    ("Ninos and Niobe", "Ninos and Niobe"),  # only whole words are replaced
+])
+def test_missing_characters_are_restored(damaged, expected):
+    assert normalize_text(damaged) == expected
+
+
+def test_matches_the_notebook_functions_on_damaged_words():
+    text = "Visit Aasco and Catao"
+    assert normalize_text(text) == legacy_add_missing_characters(legacy_clean_text(text))
+
+
+def test_normalize_many_keeps_items_that_are_not_strings():
+    assert normalize_texts(["Coraz\\xc3\\xb3n", None, 3]) == ["Corazón", None, 3]
+
+
+def test_without_replacements_words_are_left_alone():
+    assert TextNormalizer(replacements={}).normalize("Aasco\\n") == "Aasco"